@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+"""
+Benchmark the contention on the lock of a kTBS resource.
+
+Several processes repeatedly lock the same base, holding the lock for a short
+time; exclusive locks are compared with shared locks.
+"""
+from argparse import ArgumentParser
+from multiprocessing import Process
+from time import sleep, time
+
+from ktbs.engine.lock import SHARED_LOCKS_SUPPORTED
+from ktbs.engine.service import make_ktbs
+
+
+ARGS = None
+
+def parse_args():
+    global ARGS
+    parser = ArgumentParser("kTBS lock contention benchmark")
+    parser.add_argument("-p", "--processes", type=int, default=4,
+                        help="the number of concurrent processes")
+    parser.add_argument("-i", "--iterations", type=int, default=10,
+                        help="the number of times each process locks the base")
+    parser.add_argument("-t", "--hold-time", type=float, default=0.01,
+                        help="the time (in seconds) each lock is held")
+    ARGS = parser.parse_args()
+
+def work(resource, shared):
+    for _ in range(ARGS.iterations):
+        with resource.lock(resource, 30, shared=shared):
+            sleep(ARGS.hold_time)
+
+def run_processes(resource, shared):
+    processes = [ Process(target=work, args=(resource, shared))
+                  for _ in range(ARGS.processes) ]
+    start = time()
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+    elapsed = time() - start
+    assert all( process.exitcode == 0 for process in processes )
+    return elapsed
+
+def main():
+    parse_args()
+    my_ktbs = make_ktbs()
+    base = my_ktbs.create_base("bench/")
+    modes = [False, True] if SHARED_LOCKS_SUPPORTED else [False]
+    for shared in modes:
+        elapsed = run_processes(base, shared)
+        print("%s locks:\t%.3fs for %s processes x %s iterations" % (
+            "shared" if shared else "exclusive", elapsed,
+            ARGS.processes, ARGS.iterations))
+    print("(minimum for exclusive locks: %.3fs)"
+          % (ARGS.processes * ARGS.iterations * ARGS.hold_time))
+
+if __name__ == "__main__":
+    main()
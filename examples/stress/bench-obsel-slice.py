@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+"""
+Benchmark the extraction of slices of an obsel collection
+(i.e. ``@obsels?limit=...`` and the like).
+
+The current implementation (a direct walk of the bounded description of each
+obsel) is compared with the former one (a VALUES-based SPARQL query).
+
+Results on a 1-CPU, 5 GB machine (in-memory store, ``-r 3``)::
+
+    10000 obsels, slice of 1000:    first:   0.861s
+    10000 obsels, slice of 1000:    current: 0.474s
+    10000 obsels, slice of 1000:    legacy:  10.917s
+    100000 obsels, slice of 1000:   first:   5.069s
+    100000 obsels, slice of 1000:   current: 0.571s
+    100000 obsels, slice of 1000:   legacy:  9.958s
+
+The first slice also builds the index of the obsel collection,
+hence its cost grows with the size of the trace.
+10^6 obsels could not be benchmarked on that machine:
+the process already peaks at 800 MB for 10^5 obsels,
+so about 8 GB would be needed for 10^6.
+"""
+from argparse import ArgumentParser
+from resource import getrusage, RUSAGE_SELF
+from timeit import timeit
+
+from rdflib import BNode, Graph, Literal, RDF, URIRef
+
+from ktbs.config import get_ktbs_configuration
+from ktbs.engine.service import KtbsService, make_ktbs
+from ktbs.namespace import KTBS
+
+
+ARGS = None
+
+LEGACY_QUERY = """PREFIX ktbs: <http://liris.cnrs.fr/silex/2009/ktbs#>
+    SELECT ?s ?p ?o ?strc ?otrc ?obs {
+      VALUES ?obs { %s }
+      {
+        ?obs ?p ?o.
+        BIND(?obs as ?s)
+        OPTIONAL { ?o ktbs:hasTrace ?otrc }
+      } UNION {
+        ?s ?p ?obs.
+        BIND(?obs as ?o)
+        OPTIONAL { ?s ktbs:hasTrace ?strc }
+      } UNION {
+        ?obs ?p1 ?s.
+        FILTER isBlank(?s)
+        ?s ?p ?o.
+      } UNION {
+        ?obs ?p1 ?b1.
+        FILTER isBlank(?b1)
+        ?b1 ?p2 ?s.
+        FILTER isBlank(?s)
+        ?s ?p ?o.
+      }
+    }
+"""
+
+def parse_args():
+    global ARGS
+    parser = ArgumentParser("kTBS obsel slice benchmark")
+    parser.add_argument("-n", "--nbobs", type=int, nargs="+",
+                        default=[10000, 100000],
+                        help="the sizes of the traces to benchmark "
+                             "(e.g. 10000 100000 1000000)")
+    parser.add_argument("-l", "--limit", type=int, default=1000,
+                        help="the number of obsels per slice")
+    parser.add_argument("-r", "--repeat", type=int, default=3,
+                        help="the number of times each extraction is run")
+    parser.add_argument("--no-legacy", action="store_true",
+                        help="if set, do not benchmark the former implementation")
+    parser.add_argument("--columnar", action="store_true",
+                        help="if set, use the columnar obsel store")
+    ARGS = parser.parse_args()
+
+def populate(trace, nbobs):
+    """Populate trace with nbobs obsels, each with a blank-node attribute
+    and a relation to the previous obsel.
+    """
+    trace_uri = trace.uri
+    model_uri = trace.model_uri
+    otype = URIRef("#OT", model_uri)
+    attr = URIRef("#attr", model_uri)
+    rel = URIRef("#previous", model_uri)
+    collection = trace.obsel_collection
+    prev = None
+    with collection.edit({"add_obsels_only":1}, _trust=True):
+        for i in range(nbobs):
+            obs = URIRef("o%s" % i, trace_uri)
+            graph = Graph()
+            add = graph.add
+            add((obs, KTBS.hasTrace, trace_uri))
+            add((obs, KTBS.hasBegin, Literal(i)))
+            add((obs, KTBS.hasEnd, Literal(i)))
+            add((obs, KTBS.hasSubject, Literal("Alice")))
+            add((obs, RDF.type, otype))
+            bnode = BNode()
+            add((obs, attr, bnode))
+            add((bnode, attr, Literal(i)))
+            if prev is not None:
+                add((obs, rel, prev))
+            collection.add_obsel_graph(graph)
+            prev = obs
+
+def legacy_slice(collection, matching_obsels):
+    graph = Graph()
+    graph_add = graph.add
+    values = ' '.join( obs.n3() for obs in matching_obsels ) or '<tag:>'
+    for s, p, o, strc, otrc, _ in collection.state.query(LEGACY_QUERY % values):
+        graph_add((s, p, o))
+        if strc is not None:
+            graph_add((s, KTBS.hasTrace, strc))
+        if otrc is not None:
+            graph_add((o, KTBS.hasTrace, otrc))
+    return graph
+
+def main():
+    parse_args()
+    if ARGS.columnar:
+        ktbs_config = get_ktbs_configuration()
+        ktbs_config.set('rdf_database', 'obsel-store', 'columnar')
+        service = KtbsService(ktbs_config)
+        my_ktbs = service.get(service.root_uri, [KTBS.KtbsRoot])
+    else:
+        my_ktbs = make_ktbs()
+    base = my_ktbs.create_base("bench/")
+    model = base.create_model("m")
+    for nbobs in ARGS.nbobs:
+        trace = base.create_stored_trace("t%s/" % nbobs, model,
+                                         "1970-01-01T00:00:00Z")
+        print("populating %s obsels..." % nbobs)
+        populate(trace, nbobs)
+        print("peak memory: %.0f MB"
+              % (getrusage(RUSAGE_SELF).ru_maxrss / 1024.0))
+        collection = trace.obsel_collection
+        params = { "minb": str(nbobs//2), "limit": str(ARGS.limit) }
+        # the first slice also builds the index of the obsel collection,
+        # so it is not included in the average
+        res = timeit(lambda: collection.get_state(dict(params)), number=1)
+        print("%s obsels, slice of %s:\tfirst:   %.3fs" % (
+            nbobs, ARGS.limit, res))
+        res = timeit(lambda: collection.get_state(dict(params)),
+                     number=ARGS.repeat) / ARGS.repeat
+        print("%s obsels, slice of %s:\tcurrent: %.3fs" % (
+            nbobs, ARGS.limit, res))
+        if not ARGS.no_legacy:
+            matching = collection.select_obsels(begin=nbobs//2,
+                                                limit=ARGS.limit)
+            res = timeit(lambda: legacy_slice(collection, matching),
+                         number=ARGS.repeat) / ARGS.repeat
+            print("%s obsels, slice of %s:\tlegacy:  %.3fs" % (
+                nbobs, ARGS.limit, res))
+
+if __name__ == "__main__":
+    main()
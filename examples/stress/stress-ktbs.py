@@ -7,7 +7,7 @@ from uuid import uuid4
 
 from os import fork
 
-from rdflib import Graph, BNode
+from rdflib import Graph, BNode, URIRef
 from rdflib import Literal
 from rdfrest.cores.http_client import set_http_option, add_http_credentials
 from ktbs.client import get_ktbs
@@ -37,6 +37,9 @@ def parse_args():
                         help="the number of obsels to send per post")
     parser.add_argument("-U", "--uuid", action="store_true",
                         help="generate UUID for obsels")
+    parser.add_argument("-b", "--bulk", action="store_true",
+                        help="if set, use bulk ingestion for multi-obsel posts "
+                             "(application/n-triples over HTTP)")
     parser.add_argument("-c", "--cold-start", type=int, default=0,
                         help="the number of iterations to ignore in the average")
     parser.add_argument("--no-clean", action="store_true",
@@ -65,8 +68,9 @@ def setUp():
 
 def task():
     trace = BASE.get("t/")
-    print("Stressing %s %s times with %sx%s obsels" % (
-        ARGS.ktbs, ARGS.iterations, ARGS.nbpost, ARGS.nbobs))
+    print("Stressing %s %s times with %sx%s obsels%s" % (
+        ARGS.ktbs, ARGS.iterations, ARGS.nbpost, ARGS.nbobs,
+        " (bulk)" if ARGS.bulk and ARGS.nbobs > 1 else ""))
     p = ARGS.nbpost*ARGS.nbobs
     results = []
     for i in range(ARGS.iterations):
@@ -89,7 +93,10 @@ def task():
                         g.add((obs, KTBS.hasTrace, trace.uri))
                         g.add((obs, KTBS.hasBegin, Literal(i*ARGS.nbpost + j*ARGS.nbobs + k)))
                         g.add((obs, KTBS.hasSubject, Literal("Alice")))
-                    trace.post_graph(g)
+                    if ARGS.bulk:
+                        post_bulk(trace, g)
+                    else:
+                        trace.post_graph(g)
 
         res = timeit(create_P_obsels, number=1)
         print("%.3fs  \t%.2f obs/s" % (res, p/res))
@@ -100,6 +107,20 @@ def task():
         (p*len(results)/sum(results)),
     ))
 
+def post_bulk(trace, graph):
+    """Post all the obsels of graph at once, with bulk ingestion."""
+    if hasattr(trace, "post_obsels_bulk"):
+        # local kTBS
+        trace.post_obsels_bulk(graph)
+    else:
+        # remote kTBS
+        data = graph.serialize(format="nt", encoding="utf-8")
+        headers = { "content-type": "application/n-triples" }
+        rheaders, rcontent = trace._http.request(str(trace.uri), "POST",
+                                                 data, headers=headers)
+        trace._http_to_exception(rheaders, rcontent)
+        trace.force_state_refresh()
+
 def tearDown():
     if not ARGS.no_clean:
         BASE.get("t/").delete()
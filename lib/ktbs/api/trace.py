@@ -36,6 +36,7 @@ from rdfrest.cores.factory import factory as universal_factory
 from rdfrest.exceptions import InvalidParametersError, MethodNotAllowedError
 from rdfrest.util.iso8601 import parse_date, ParseError, UTC
 from rdfrest.util import cache_result, coerce_to_node, coerce_to_uri
+from rdfrest.util.query_cache import prepare_query
 from .base import InBaseMixin
 from .method import WithParametersMixin
 from .obsel import ObselMixin, ObselProxy
@@ -149,9 +150,16 @@ class AbstractTraceMixin(InBaseMixin):
             # so we directly query the graph
             # (pylint does not know that, hence the directive below)
             obsels_graph = collection.state #pylint: disable=E1101
-            select = collection.build_select(begin, end, after, before, reverse, bgp,
-                                             limit, offset,
-                                             "DISTINCT ?obs" if bgp else "?obs")
+            # rely on the obsel index whenever possible
+            # (the collection falls back to SPARQL otherwise)
+            for obs_uri in collection.select_obsels(begin, end, after,
+                                                    before, reverse,
+                                                    limit, offset, bgp=bgp):
+                types = obsels_graph.objects(obs_uri, RDF.type)
+                cls = get_wrapped(ObselProxy, types)
+                yield cls(obs_uri, collection, obsels_graph,
+                          parameters or None)
+            return
         else:
             # we are remote,
             # so we push as much as possible of the parameters to the server
@@ -168,10 +176,11 @@ class AbstractTraceMixin(InBaseMixin):
             if offset is not None:
                 parameters['offset'] = offset
             obsels_graph = collection.get_state(parameters)
-            select = collection.build_select(
+            select, bindings = collection.build_select_template(
                 bgp=bgp, selected="DISTINCT ?obs" if bgp else "?obs")
         query_str = "PREFIX ktbs: <%s#> %s" % (KTBS_NS_URI, select)
-        tuples = list(obsels_graph.query(query_str, initNs={"m": self.model_prefix}))
+        query = prepare_query(query_str, {"m": self.model_prefix})
+        tuples = list(obsels_graph.query(query, initBindings=bindings))
         for obs_uri, in tuples:
             types = obsels_graph.objects(obs_uri, RDF.type)
             cls = get_wrapped(ObselProxy, types)
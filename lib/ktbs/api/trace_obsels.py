@@ -23,7 +23,8 @@ I provide the pythonic interface to kTBS obsel collections.
 """
 from datetime import datetime
 from numbers import Real
-from rdflib import RDF, URIRef
+from re import compile as Regexp
+from rdflib import Literal, RDF, URIRef
 
 from rdfrest.cores import ICore
 from rdfrest.util import cache_result
@@ -101,8 +102,34 @@ class AbstractTraceObselsMixin(ICore):
         amended, since collectors are not bound to respect the order in begin
         timestamps and identifiers.
         """
+        query_str, bindings = self.build_select_template(
+            begin, end, after, before, reverse, bgp, limit, offset, selected)
+        # inline the bindings, so that the query is self-contained
+        for var, val in bindings.items():
+            query_str = Regexp(r"\?%s\b" % var).sub(lambda _, n3=val.n3(): n3,
+                                                     query_str)
+        return query_str
+
+    def build_select_template(self, begin=None, end=None, after=None,
+                              before=None, reverse=False, bgp=None,
+                              limit=None, offset=None, selected="?obs"):
+        """
+        Build a SPARQL query template listing the obsels of this trace.
+
+        :rtype: a tuple (query_str, bindings)
+
+        I behave like `build_select`:meth:, except that the trace URI
+        and the values of `begin`, `end`, `after` and `before`
+        are not included in the query string, but in the returned bindings,
+        suitable for the ``initBindings`` parameter of
+        `rdflib.Graph.query`:meth:.
+        The query string is therefore the same across calls differing only
+        by those values, which allows to cache the prepared query
+        (see `rdfrest.util.query_cache`:mod:).
+        """
         filters = []
         postface = ""
+        bindings = { "_trace_": self.trace_uri }
         if bgp is None:
             bgp = ""
         else:
@@ -115,7 +142,8 @@ class AbstractTraceObselsMixin(ICore):
                     "datetime as begin is not implemented yet")
             else:
                 raise ValueError("Invalid value for `begin` (%r)" % begin)
-            filters.append("?b >= %s" % begin)
+            filters.append("?b >= ?_begin_")
+            bindings["_begin_"] = Literal(begin)
         if end is not None:
             if isinstance(end, Real):
                 pass # nothing else to do
@@ -124,33 +152,36 @@ class AbstractTraceObselsMixin(ICore):
                     "datetime as end is not implemented yet")
             else:
                 raise ValueError("Invalid value for `end` (%r)" % end)
-            filters.append("?e <= %s" % end)
+            filters.append("?e <= ?_end_")
+            bindings["_end_"] = Literal(end)
         if after is not None:
             if isinstance(after, URIRef):
-                bgp = "<{}> ktbs:hasBegin ?_ab;ktbs:hasEnd ?_ae. {}" \
-                       .format(after, bgp)
-                after_values = (after, "?_ab", "?_ae")
+                bgp = "?_after_ ktbs:hasBegin ?_ab;ktbs:hasEnd ?_ae. {}" \
+                       .format(bgp)
+                bindings["_after_"] = after
             elif isinstance(after, ObselMixin):
-                after_values = (after.uri, after.begin, after.end)
+                bindings["_after_"] = after.uri
+                bindings["_ab"] = Literal(after.begin)
+                bindings["_ae"] = Literal(after.end)
             else:
                 raise ValueError("Invalid value for `after` (%r)" % after)
-            filters.append("?e > {2} || "
-                           "?e = {2} && ?b > {1} || "
-                           "?e = {2} && ?b = {1} && str(?obs) > \"{0}\""
-                           .format(*after_values))
+            filters.append("?e > ?_ae || "
+                           "?e = ?_ae && ?b > ?_ab || "
+                           "?e = ?_ae && ?b = ?_ab && str(?obs) > str(?_after_)")
         if before is not None:
             if isinstance(before, URIRef):
-                bgp = "<{}> ktbs:hasBegin ?_bb;ktbs:hasEnd ?_be. {}" \
-                      .format(before, bgp)
-                before_values = (before, "?_bb", "?_be")
+                bgp = "?_before_ ktbs:hasBegin ?_bb;ktbs:hasEnd ?_be. {}" \
+                      .format(bgp)
+                bindings["_before_"] = before
             elif isinstance(before, ObselMixin):
-                before_values = (before.uri, before.begin, before.end)
+                bindings["_before_"] = before.uri
+                bindings["_bb"] = Literal(before.begin)
+                bindings["_be"] = Literal(before.end)
             else:
                 raise ValueError("Invalid value for `before` (%r)" % before)
-            filters.append("?e < {2} || "
-                           "?e = {2} && ?b < {1} || "
-                           "?e = {2} && ?b = {1} && str(?obs) < \"{0}\""
-                           .format(*before_values))
+            filters.append("?e < ?_be || "
+                           "?e = ?_be && ?b < ?_bb || "
+                           "?e = ?_be && ?b = ?_bb && str(?obs) < str(?_before_)")
         if reverse:
             postface += "ORDER BY DESC(?e) DESC(?b) DESC(?obs)"
         else:
@@ -160,18 +191,18 @@ class AbstractTraceObselsMixin(ICore):
         if offset is not None:
             postface += " OFFSET %s" % offset
         if filters:
-            filters = "FILTER(%s)" % (" && ".join(filters))
+            filters = "FILTER((%s))" % (") && (".join(filters))
         else:
             filters = ""
 
         query_str = (
             "SELECT %s WHERE {"
-                "?obs ktbs:hasTrace <%s>;ktbs:hasBegin ?b;ktbs:hasEnd ?e."
+                "?obs ktbs:hasTrace ?_trace_;ktbs:hasBegin ?b;ktbs:hasEnd ?e."
                 "%s "
                 "%s "
             "}%s"
-        ) % (selected, self.trace_uri, filters, bgp, postface)
-        return query_str
+        ) % (selected, filters, bgp, postface)
+        return query_str, bindings
 
 _TYPECONV = {
     KTBS.StoredTraceObsels: KTBS.StoredTrace,
@@ -39,6 +39,9 @@ def get_ktbs_configuration(configfile_handler=None):
     _set_default(ktbs_config, 'ns_prefix', '_', str(KTBS)),
     _set_default(ktbs_config, 'ns_prefix', 'skos', str(SKOS))
 
+    _set_default(ktbs_config, 'server', 'workers', '1')
+    _set_default(ktbs_config, 'rdf_database', 'obsel-store', 'triples')
+
     # plugins enabled by default for backward compatibility
     _set_default(ktbs_config, 'plugins', 'stats_per_type', 'true')
 
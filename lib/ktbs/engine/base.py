@@ -257,7 +257,10 @@ class Base(WithLockMixin, BaseMixin, KtbsPostableMixin, KtbsResource):
 
         That way, if a previous kTBS didn't clean up its semaphores,
         it won't block a new instance.
+        For the same reason,
+        the semaphores used for shared locks are reset.
         """
+        cls.unlink_rw_semaphores(uri)
         semaphore = super(Base, cls).create_lock(uri)
         if SEMAPHORE_VALUE_SUPPORTED:
             if semaphore.value == 0:
@@ -0,0 +1,411 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I provide an alternative storage for obsel collections.
+
+`ColumnarObselStore`:class: is an rdflib store wrapping another store.
+All named graphs are stored in the wrapped store,
+except for obsel collections (i.e. graphs whose URI ends with ``@obsels``),
+which are stored in `ObselColumns`:class:.
+
+In an `ObselColumns`:class:, every term is interned as an integer,
+and every subject (obsel) is a row in a set of arrays,
+one for each of the properties shared by all obsels
+(type, trace, begin, end, subject...).
+Other properties (attributes, source obsels...) are stored in one
+sparse column per property.
+The dense columns are much more compact than a general purpose triple store;
+the sparse columns are plain dictionaries, and only pay off
+when most obsels have few attributes.
+An index from objects to rows makes incoming arcs
+(e.g. relations to a given obsel) as cheap to find as outgoing ones.
+
+From the outside, obsel collections are still seen as graphs of triples,
+so that rdflib graphs and SPARQL queries work transparently.
+
+This storage is enabled by setting the ``obsel-store`` option
+of the ``rdf_database`` configuration section to ``columnar``.
+As obsel collections are only kept in memory,
+it requires an in-memory repository.
+"""
+from array import array
+
+from rdflib import Graph, RDF
+from rdflib.store import Store
+
+from ..namespace import KTBS
+
+_NONE = -1
+
+class ObselColumns(object):
+    """I store the triples of one obsel collection in columns.
+
+    :cvar COLUMNS: the properties stored in dense columns
+    """
+
+    COLUMNS = (RDF.type, KTBS.hasTrace, KTBS.hasBegin, KTBS.hasEnd,
+               KTBS.hasBeginDT, KTBS.hasEndDT, KTBS.hasSubject)
+
+    _COLUMN_INDEX = { prop: i for i, prop in enumerate(COLUMNS) }
+
+    def __init__(self):
+        self._terms = [] # term id -> term
+        self._ids = {} # term -> term id
+        self._rows = {} # subject id -> row
+        self._subjects = array('l') # row -> subject id
+        self._columns = [ array('l') for _ in self.COLUMNS ] # row -> term id
+        self._attributes = {} # predicate id -> { row -> [term id] }
+        self._object_rows = {} # object id -> { row -> number of triples }
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def add(self, triple):
+        """I add a triple.
+        """
+        s, p, o = triple
+        row = self._get_row(self._intern(s))
+        oid = self._intern(o)
+        col_index = self._COLUMN_INDEX.get(p)
+        if col_index is not None:
+            column = self._columns[col_index]
+            value = column[row]
+            if value == oid:
+                return
+            if value == _NONE:
+                # the value may already be in the sparse column,
+                # if the dense slot has been freed since it was added
+                pid = self._ids.get(p)
+                if pid is not None and \
+                oid in self._attributes.get(pid, {}).get(row, ()):
+                    return
+                column[row] = oid
+                self._index_object(oid, row)
+                self._len += 1
+                return
+            # else the dense column is already filled for this row,
+            # so the value goes to the sparse column of that property
+        values = self._attributes.setdefault(self._intern(p), {}) \
+                                 .setdefault(row, [])
+        if oid not in values:
+            values.append(oid)
+            self._index_object(oid, row)
+            self._len += 1
+
+    def remove(self, triple_pattern):
+        """I remove all the triples matching triple_pattern.
+        """
+        for triple in list(self.triples(triple_pattern)):
+            self._remove_triple(triple)
+
+    def triples(self, triple_pattern):
+        """I iter over all the triples matching triple_pattern.
+        """
+        s, p, o = triple_pattern
+        ids = self._ids
+        if o is None:
+            oid = None
+        else:
+            oid = ids.get(o)
+            if oid is None:
+                return
+        if s is not None:
+            sid = ids.get(s)
+            row = self._rows.get(sid)
+            if row is None:
+                return
+            for triple in self._row_triples(row, s, p, oid):
+                yield triple
+            return
+
+        terms = self._terms
+        subjects = self._subjects
+        if oid is not None:
+            # only visit the rows having oid as an object
+            for row in list(self._object_rows.get(oid, ())):
+                subj = terms[subjects[row]]
+                for triple in self._row_triples(row, subj, p, oid):
+                    yield triple
+            return
+
+        if p is None:
+            for row in list(self._rows.values()):
+                subj = terms[subjects[row]]
+                for triple in self._row_triples(row, subj, None, oid):
+                    yield triple
+            return
+
+        col_index = self._COLUMN_INDEX.get(p)
+        if col_index is not None:
+            # scan the dense column of p
+            for row, value in enumerate(self._columns[col_index]):
+                if value != _NONE:
+                    yield (terms[subjects[row]], p, terms[value])
+        # scan the sparse column of p
+        pid = ids.get(p)
+        if pid is None:
+            return
+        for row, values in list(self._attributes.get(pid, {}).items()):
+            subj = terms[subjects[row]]
+            for value in values:
+                yield (subj, p, terms[value])
+
+    def _row_triples(self, row, subj, p, oid):
+        """I iter over the triples of the given row matching p and oid.
+        """
+        terms = self._terms
+        for prop, column in zip(self.COLUMNS, self._columns):
+            if p is None or p == prop:
+                value = column[row]
+                if value != _NONE and (oid is None or value == oid):
+                    yield (subj, prop, terms[value])
+        if p is None:
+            attributes = list(self._attributes.items())
+        else:
+            pid = self._ids.get(p)
+            if pid is None:
+                return
+            attributes = [(pid, self._attributes.get(pid, {}))]
+        for pid, rows in attributes:
+            for value in rows.get(row, ()):
+                if oid is None or value == oid:
+                    yield (subj, terms[pid], terms[value])
+
+    def _remove_triple(self, triple):
+        """I remove a triple that is known to be present.
+        """
+        s, p, o = triple
+        ids = self._ids
+        row = self._rows[ids[s]]
+        oid = ids[o]
+        col_index = self._COLUMN_INDEX.get(p)
+        if col_index is not None and self._columns[col_index][row] == oid:
+            self._columns[col_index][row] = _NONE
+        else:
+            pid = ids[p]
+            rows = self._attributes[pid]
+            values = rows[row]
+            values.remove(oid)
+            if not values:
+                del rows[row]
+                if not rows:
+                    del self._attributes[pid]
+        self._unindex_object(oid, row)
+        self._len -= 1
+        if self._row_is_empty(row):
+            del self._rows[self._subjects[row]]
+            # NB: the row itself is not reused; this would require to also
+            # reclaim unused terms, which would not be worth the cost
+
+    def _index_object(self, oid, row):
+        """I record that row has one more triple with object oid.
+        """
+        rows = self._object_rows.setdefault(oid, {})
+        rows[row] = rows.get(row, 0) + 1
+
+    def _unindex_object(self, oid, row):
+        """I record that row has one less triple with object oid.
+        """
+        rows = self._object_rows[oid]
+        count = rows[row] - 1
+        if count:
+            rows[row] = count
+        else:
+            del rows[row]
+            if not rows:
+                del self._object_rows[oid]
+
+    def _row_is_empty(self, row):
+        """I check whether a row contains no triple.
+        """
+        for column in self._columns:
+            if column[row] != _NONE:
+                return False
+        for rows in self._attributes.values():
+            if row in rows:
+                return False
+        return True
+
+    def _intern(self, term):
+        """I return the id of term, creating it if needed.
+        """
+        ret = self._ids.get(term)
+        if ret is None:
+            ret = self._ids[term] = len(self._terms)
+            self._terms.append(term)
+        return ret
+
+    def _get_row(self, sid):
+        """I return the row of subject sid, creating it if needed.
+        """
+        ret = self._rows.get(sid)
+        if ret is None:
+            ret = self._rows[sid] = len(self._subjects)
+            self._subjects.append(sid)
+            for column in self._columns:
+                column.append(_NONE)
+        return ret
+
+
+def is_obsel_collection(identifier):
+    """I tell whether a graph identifier is that of an obsel collection.
+    """
+    return identifier.endswith("@obsels")
+
+
+class ColumnarObselStore(Store):
+    """I store obsel collections in `ObselColumns`:class:,
+    and delegate all other graphs to another store.
+
+    :param delegate: the store in which all other graphs are stored
+    :type  delegate: rdflib.store.Store
+    """
+    # pylint: disable=W0221
+    #   arguments number differ from overridden method
+
+    context_aware = True
+    formula_aware = False
+    graph_aware = False
+
+    def __init__(self, delegate):
+        super(ColumnarObselStore, self).__init__()
+        self.delegate = delegate
+        self.transaction_aware = delegate.transaction_aware
+        self._collections = {} # graph identifier -> (Graph, ObselColumns)
+
+    def _lookup(self, context, create=False):
+        """I return the identifier and the ObselColumns of context.
+
+        If context is not an obsel collection, I return (None, None).
+        If context is an empty obsel collection, and `create` is False,
+        the returned ObselColumns is None.
+        """
+        identifier = getattr(context, "identifier", context)
+        if not is_obsel_collection(identifier):
+            return None, None
+        ret = self._collections.get(identifier)
+        if ret is None:
+            if not create:
+                return identifier, None
+            ret = self._collections[identifier] = \
+                (Graph(self, identifier), ObselColumns())
+        return identifier, ret[1]
+
+    # delegated methods
+
+    def open(self, configuration, create=False):
+        return self.delegate.open(configuration, create)
+
+    def close(self, commit_pending_transaction=False):
+        return self.delegate.close(commit_pending_transaction)
+
+    def destroy(self, configuration):
+        self._collections.clear()
+        return self.delegate.destroy(configuration)
+
+    def gc(self):
+        return self.delegate.gc()
+
+    def commit(self):
+        return self.delegate.commit()
+
+    def rollback(self):
+        return self.delegate.rollback()
+
+    def bind(self, prefix, namespace):
+        return self.delegate.bind(prefix, namespace)
+
+    def prefix(self, namespace):
+        return self.delegate.prefix(namespace)
+
+    def namespace(self, prefix):
+        return self.delegate.namespace(prefix)
+
+    def namespaces(self):
+        return self.delegate.namespaces()
+
+    # RDF API
+
+    def add(self, triple, context, quoted=False):
+        identifier, columns = self._lookup(context, True)
+        if identifier is None:
+            self.delegate.add(triple, context, quoted)
+        else:
+            assert not quoted
+            columns.add(triple)
+
+    def addN(self, quads):
+        for s, p, o, c in quads:
+            self.add((s, p, o), c)
+
+    def remove(self, triple_pattern, context=None):
+        if context is None:
+            self.delegate.remove(triple_pattern, None)
+            for identifier in list(self._collections):
+                self._remove_from(identifier, triple_pattern)
+            return
+        identifier, columns = self._lookup(context)
+        if identifier is None:
+            self.delegate.remove(triple_pattern, context)
+        elif columns is not None:
+            self._remove_from(identifier, triple_pattern)
+
+    def _remove_from(self, identifier, triple_pattern):
+        """I remove triples from the given obsel collection.
+        """
+        columns = self._collections[identifier][1]
+        columns.remove(triple_pattern)
+        if len(columns) == 0:
+            del self._collections[identifier]
+
+    def triples(self, triple_pattern, context=None):
+        if context is None:
+            for ret in self.delegate.triples(triple_pattern, None):
+                yield ret
+            for graph, columns in list(self._collections.values()):
+                for triple in columns.triples(triple_pattern):
+                    yield triple, iter((graph,))
+            return
+        identifier, columns = self._lookup(context)
+        if identifier is None:
+            for ret in self.delegate.triples(triple_pattern, context):
+                yield ret
+        elif columns is not None:
+            contexts = (context,)
+            for triple in columns.triples(triple_pattern):
+                yield triple, iter(contexts)
+
+    def __len__(self, context=None):
+        if context is None:
+            return len(self.delegate) + sum(
+                len(columns) for _, columns in self._collections.values())
+        identifier, columns = self._lookup(context)
+        if identifier is None:
+            return self.delegate.__len__(context)
+        elif columns is None:
+            return 0
+        else:
+            return len(columns)
+
+    def contexts(self, triple=None):
+        for context in self.delegate.contexts(triple):
+            yield context
+        for graph, columns in list(self._collections.values()):
+            if triple is None or next(columns.triples(triple), None):
+                yield graph
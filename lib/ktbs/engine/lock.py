@@ -18,16 +18,45 @@
 """
 I provide a locking mechanism for resource that needs protection in the context of concurrency.
 
+Locks are either exclusive (the default) or shared.
+Exclusive locks are implemented by a single POSIX semaphore per resource.
+Shared locks (allowing concurrent readers) additionally use three semaphores,
+implementing the "lightswitch" pattern
+(see "The Little Book of Semaphores" by Allen B. Downey, section 4.2):
+
+* the main semaphore acts as a turnstile:
+  readers only hold it while entering,
+  so that a waiting writer prevents new readers from entering;
+* the "room" semaphore is held by writers,
+  and by the first reader entering until the last reader leaves;
+* the "mutex" semaphore protects the "readers" semaphore,
+  whose value is the number of readers.
+
+As the latter requires to get the value of a semaphore,
+shared locks are only supported if
+``posix_ipc.SEMAPHORE_VALUE_SUPPORTED`` is true;
+otherwise, shared locks are simply exclusive.
+
+Semaphore handles are kept open by a per-process `SemaphorePool`:class:,
+so that locking a resource does not require to open and close
+its semaphore(s) every time.
+
+The time spent waiting for locks, and holding them,
+as well as the number of failed attempts,
+is measured by `LockTimes`:class:, for the whole process
+and for each resource (see `get_lock_times`:func:
+and `get_lock_stats`:func:).
 """
 import posix_ipc
 import sys
 from hashlib import md5
+from time import time
 
 from logging import getLogger
-from threading import current_thread
+from threading import current_thread, Lock
 from contextlib import contextmanager
 
-from os import getpid, pathconf
+from os import getpid, pathconf, stat
 
 from rdfrest.cores.local import _DeletedCore
 from rdfrest.cores.local import ILocalCore
@@ -36,6 +65,11 @@ from rdfrest.cores.local import ILocalCore
 LOG = getLogger(__name__)
 PID = getpid()
 
+SHARED_LOCKS_SUPPORTED = posix_ipc.SEMAPHORE_VALUE_SUPPORTED
+
+_RW_SUFFIXES = ("#rw-room", "#rw-mutex", "#rw-readers")
+_RW_INITIAL_VALUES = (1, 1, 0)
+
 if sys.platform.lower().find('darwin') != -1:
     def get_semaphore_name(resource_uri):
         """Return a safe semaphore name for a resource.
@@ -66,6 +100,244 @@ else:
         return sem_name
 
 
+class SemaphorePool(object):
+    """I keep semaphore handles open, keyed by the URI of their resource.
+
+    Handles are opened (and the semaphores created if needed)
+    the first time they are requested, and then reused.
+
+    A pooled handle becomes stale if its semaphore is unlinked
+    (e.g. by another process deleting the resource),
+    and possibly re-created under the same name.
+    So before reusing a handle, I check that the semaphore file
+    in `SHM_DIR`:data: is still the one it was opened on (by its inode).
+    If this can not be checked (i.e. `SHM_DIR`:data: does not exist
+    on this platform), semaphores are re-opened by name every time.
+
+    The auxiliary semaphores of a resource (used for shared locks)
+    are unlinked together with its main semaphore,
+    so they are not checked themselves:
+    their handles are reused as long as the handle of the main semaphore
+    (their `parent`) has not been re-opened.
+    Hence locking a resource costs a single ``stat`` system call.
+
+    Note that handles are never closed, only forgotten
+    (see `discard`:meth:),
+    as other threads may still be using them.
+    """
+
+    def __init__(self):
+        self._handles = {} # key -> (handle, inode or parent handle)
+        self._lock = Lock()
+
+    def __len__(self):
+        return len(self._handles)
+
+    def get(self, key, initial_value=1, parent=None):
+        """I return the semaphore handle for key.
+
+        :param key: the URI of the resource, possibly with a suffix
+        :param int initial_value: the value of the semaphore if it is created
+        :param parent: for an auxiliary semaphore,
+                       the (freshly checked) handle of the main semaphore
+        :rtype: posix_ipc.Semaphore
+        """
+        name = get_semaphore_name(key)
+        pooled = self._handles.get(key)
+        if pooled is not None:
+            if parent is not None:
+                if pooled[1] is parent:
+                    return pooled[0]
+            elif pooled[1] is not None \
+            and pooled[1] == _get_semaphore_inode(name):
+                return pooled[0]
+        with self._lock:
+            ret = posix_ipc.Semaphore(name=name,
+                                      flags=posix_ipc.O_CREAT,
+                                      initial_value=initial_value)
+            if parent is None:
+                self._handles[key] = (ret, _get_semaphore_inode(name))
+            else:
+                self._handles[key] = (ret, parent)
+        return ret
+
+    def discard(self, key):
+        """I forget the semaphore handle for key, if any.
+
+        This should be called when the semaphore is unlinked,
+        so that the stale handle is released as soon as possible.
+        """
+        with self._lock:
+            self._handles.pop(key, None)
+
+#: The directory where named semaphores are stored (on Linux)
+SHM_DIR = "/dev/shm"
+
+def _get_semaphore_inode(name):
+    """Return the inode of the file of the semaphore with the given name,
+    or None if it can not be determined.
+    """
+    try:
+        return stat("%s/sem.%s" % (SHM_DIR, name[1:])).st_ino
+    except OSError:
+        return None
+
+_SEMAPHORE_POOL = SemaphorePool()
+
+def reset_lock(resource_uri):
+    """Reset all the semaphores of a resource to their initial values.
+
+    This includes the semaphores used for shared locks,
+    which are left inconsistent by a process killed while holding a shared lock.
+    The semaphores are reset in place (not unlinked),
+    so that handles pooled by other processes remain valid.
+
+    This MUST NOT be used while the resource may be locked by a live process
+    (see ``bin/ktbs-reset-locks``).
+
+    :param resource_uri: URI of the resource to reset.
+    :return: True if any semaphore has been reset, False otherwise.
+    """
+    reset = False
+    keys = [resource_uri] + [ resource_uri + suffix for suffix in _RW_SUFFIXES ]
+    for key, value in zip(keys, (1,) + _RW_INITIAL_VALUES):
+        try:
+            semaphore = posix_ipc.Semaphore(get_semaphore_name(key))
+        except posix_ipc.ExistentialError:
+            LOG.info("The lock <%s> doesn't appear to be locked "
+                     "(semaphore not found).", key)
+            continue
+        try:
+            old_value = semaphore.value
+            while semaphore.value < value:
+                semaphore.release()
+            while semaphore.value > value:
+                semaphore.acquire(0)
+        finally:
+            semaphore.close()
+        if old_value == value:
+            LOG.info("The lock <%s> doesn't appear to be locked "
+                     "(semaphore found).", key)
+        else:
+            LOG.info("The lock <%s> has been reset to %s (was %s).",
+                     key, value, old_value)
+            reset = True
+    return reset
+
+
+class LockTimes(object):
+    """I aggregate the times spent waiting for, and holding, locks.
+
+    All times are in seconds.
+    Failed attempts (raising a `posix_ipc.BusyError`)
+    are only counted in `busy`, not in the wait times.
+    """
+
+    def __init__(self):
+        self._lock = Lock()
+        self.reset()
+
+    def reset(self):
+        """I reset all my counters.
+        """
+        with self._lock:
+            self.acquisitions = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+            self.total_hold = 0.0
+            self.max_hold = 0.0
+            self.busy = 0
+
+    def record(self, wait, hold):
+        """I record a lock that was waited for `wait` seconds,
+        and held for `hold` seconds.
+        """
+        with self._lock:
+            self.acquisitions += 1
+            self.total_wait += wait
+            self.total_hold += hold
+            if wait > self.max_wait:
+                self.max_wait = wait
+            if hold > self.max_hold:
+                self.max_hold = hold
+
+    def record_busy(self):
+        """I record a failed attempt to acquire a lock.
+        """
+        with self._lock:
+            self.busy += 1
+
+    def as_dict(self):
+        """I return my counters as a dict.
+        """
+        with self._lock:
+            return {
+                "acquisitions": self.acquisitions,
+                "total_wait": self.total_wait,
+                "max_wait": self.max_wait,
+                "total_hold": self.total_hold,
+                "max_hold": self.max_hold,
+                "busy": self.busy,
+            }
+
+_LOCK_TIMES = LockTimes()
+_LOCK_TIMES_BY_URI = {}
+_LOCK_TIMES_BY_URI_LOCK = Lock()
+
+def get_lock_times(uri=None):
+    """I return the `LockTimes`:class: of the locks acquired by this process.
+
+    :param uri: if provided, only the locks of that resource are considered
+
+    NB: re-entrant locks (see `WithLockMixin.lock`:meth:) are not counted.
+    """
+    if uri is None:
+        return _LOCK_TIMES
+    ret = _LOCK_TIMES_BY_URI.get(uri)
+    if ret is None:
+        with _LOCK_TIMES_BY_URI_LOCK:
+            ret = _LOCK_TIMES_BY_URI.setdefault(uri, LockTimes())
+    return ret
+
+def get_lock_stats():
+    """I return the lock counters of every resource locked by this process.
+
+    :rtype: a dict mapping URIs to dicts (see `LockTimes.as_dict`:meth:)
+    """
+    with _LOCK_TIMES_BY_URI_LOCK:
+        items = list(_LOCK_TIMES_BY_URI.items())
+    return { uri: lock_times.as_dict() for uri, lock_times in items }
+
+def reset_lock_times():
+    """I reset all the lock counters of this process.
+    """
+    with _LOCK_TIMES_BY_URI_LOCK:
+        _LOCK_TIMES_BY_URI.clear()
+    _LOCK_TIMES.reset()
+
+def _forget_lock_times(uri):
+    """I forget the lock counters of `uri` (e.g. when it is deleted).
+    """
+    with _LOCK_TIMES_BY_URI_LOCK:
+        _LOCK_TIMES_BY_URI.pop(uri, None)
+
+def _record_lock(uri, wait, hold, deleted=False):
+    """I record a lock on `uri` in the process-wide and per-resource counters.
+
+    If the resource has been `deleted` while locked,
+    only the process-wide counters are updated.
+    """
+    _LOCK_TIMES.record(wait, hold)
+    if not deleted:
+        get_lock_times(uri).record(wait, hold)
+
+def _record_busy(uri):
+    """I record a failed attempt to lock `uri`.
+    """
+    _LOCK_TIMES.record_busy()
+    get_lock_times(uri).record_busy()
+
+
 class WithLockMixin(ILocalCore):
     """ I provide methods to lock a resource.
 
@@ -74,6 +346,7 @@ class WithLockMixin(ILocalCore):
     :type LOCK_DEFAULT_TIMEOUT: int or float
     """
     __locking_thread_id = None
+    __reading_threads = None
     LOCK_DEFAULT_TIMEOUT = 60  # TODO take this variable from the global kTBS conf file
 
     def _get_semaphore(self):
@@ -86,45 +359,108 @@ class WithLockMixin(ILocalCore):
         :return: semaphore for this resource.
         :rtype: posix_ipc.Semaphore
         """
-        return posix_ipc.Semaphore(name=get_semaphore_name(self.uri),
-                                   flags=posix_ipc.O_CREAT,
-                                   initial_value=1)
+        return _SEMAPHORE_POOL.get(self.uri)
+
+    def _get_rw_semaphores(self, count=3, semaphore=None):
+        """Return the additional semaphores used for shared locks.
+
+        :param int count: how many of them to return
+        :param semaphore: the semaphore of this resource,
+                          as returned by `_get_semaphore`:meth:
+                          (retrieved if not provided)
+        :return: the "room", "mutex" and "readers" semaphores
+                 (see `ktbs.engine.lock`:mod:)
+        :rtype: tuple of posix_ipc.Semaphore
+        """
+        uri = self.uri
+        if semaphore is None:
+            semaphore = self._get_semaphore()
+        return tuple(
+            _SEMAPHORE_POOL.get(uri + suffix, initial_value, semaphore)
+            for suffix, initial_value
+            in list(zip(_RW_SUFFIXES, _RW_INITIAL_VALUES))[:count]
+        )
+
+    def holds_shared_lock(self):
+        """Return whether the current thread holds a shared lock on this resource.
+
+        :rtype: bool
+        """
+        reading_threads = self.__reading_threads
+        return bool(reading_threads) \
+            and current_thread().ident in reading_threads
 
     @contextmanager
-    def lock(self, resource, timeout=None):
+    def lock(self, resource, timeout=None, shared=False):
         """Lock the current resource (self) with a semaphore.
 
         Currently, the resources locked are ktbs root and ktbs base. To change
         any other resources (traces, models, obsels, ...) requires getting a ktbs
         root or ktbs base semaphore.
 
+        Shared locks can be held by several threads or processes at the same
+        time, but not while an exclusive lock is held.
+        A thread holding a lock (shared or exclusive) can lock the resource
+        again in shared mode, but a thread holding only a shared lock
+        can not lock the resource in exclusive mode (that would deadlock).
+
         :param resource: the resource that asks for the lock.
         :param timeout: maximum time to wait on acquire() until a BusyError is raised.
         :type timeout: int or float
+        :param bool shared: whether to acquire a shared lock rather than an exclusive one.
         :raise TypeError: if `resource` no longer exists.
+        :raise ValueError: if the thread holds a shared lock and asks for an exclusive one.
         :raise posix_ipc.BusyError: if we fail to acquire the semaphore until timeout.
         """
         if timeout is None:
             timeout = self.LOCK_DEFAULT_TIMEOUT
+        thread_id = current_thread().ident
+        reading_threads = self.__reading_threads
 
         # If the current thread wants to access the locked resource it is good to go.
         # This should only happen when the thread wants to lock the resource further down the call stack.
-        if self.__locking_thread_id == current_thread().ident:
+        if self.__locking_thread_id == thread_id:
+            yield
+
+        elif reading_threads and thread_id in reading_threads:
+            if not shared:
+                raise ValueError("Can not upgrade a shared lock on <{uri}> "
+                                 "to an exclusive lock".format(uri=self.uri))
             yield
 
+        elif shared and SHARED_LOCKS_SUPPORTED:
+            with self._shared_lock(resource, timeout):
+                yield
+
         # Else, either another thread wants to access the resource (and it will wait until the lock is released),
         # or the current thread wants to access the resource and it is not locked yet.
         else:
+            uri = self.uri # as self may be deleted while locked
             semaphore = self._get_semaphore()
+            room = None
+            acquired = None
 
             try:  # acquire the lock, re-raise BusyError with info if it fails
+                start = time()
+                deadline = start + timeout
                 semaphore.acquire(timeout)
                 if posix_ipc.SEMAPHORE_VALUE_SUPPORTED:
                     assert semaphore.value == 0, "This lock is corrupted"
 
+                if SHARED_LOCKS_SUPPORTED:
+                    # wait for the readers (if any) to leave
+                    room, = self._get_rw_semaphores(1, semaphore)
+                    try:
+                        room.acquire(max(deadline - time(), 0))
+                    except:
+                        semaphore.release()
+                        raise
+
+                acquired = time()
                 try:  # catch exceptions occurring after the lock has been acquired
                     self.__locking_thread_id = thread_id = current_thread().ident
-                    LOG.debug("%s locked   by %s--%s", self, PID, thread_id)
+                    LOG.debug("%s locked   by %s--%s after %.6fs",
+                              self, PID, thread_id, acquired - start)
                     # make sure the resource still exists (it could have been deleted by a concurrent process).
                     if resource.__class__ is _DeletedCore:
                         raise TypeError('The resource <{uri}> no longer exists.'.format(uri=resource.get_uri()))
@@ -134,16 +470,79 @@ class WithLockMixin(ILocalCore):
                     raise
                 finally:  # make sure we exit properly by releasing the lock
                     self.__locking_thread_id = None
+                    if room is not None:
+                        room.release()
                     semaphore.release()
-                    semaphore.close()
-                    LOG.debug("%s released by %s--%s", self, PID, thread_id)
+                    released = time()
+                    _record_lock(uri, acquired - start, released - acquired,
+                                 self.__class__ is _DeletedCore)
+                    LOG.debug("%s released by %s--%s after %.6fs",
+                              self, PID, thread_id, released - acquired)
 
             except posix_ipc.BusyError:
+                if acquired is None:
+                    _record_busy(uri)
                 thread_id = self.__locking_thread_id if self.__locking_thread_id else 'Unknown'
                 error_msg = 'The resource <{res_uri}> is locked by thread {thread_id}.'.format(res_uri=self.uri,
                                                                                                thread_id=thread_id)
                 raise posix_ipc.BusyError(error_msg)
 
+    @contextmanager
+    def _shared_lock(self, resource, timeout):
+        """Lock the current resource (self) in shared mode.
+
+        See `lock`:meth: and `ktbs.engine.lock`:mod:.
+        """
+        thread_id = current_thread().ident
+        uri = self.uri # as self may be deleted while locked
+        semaphore = self._get_semaphore()
+        room, mutex, readers = self._get_rw_semaphores(3, semaphore)
+        try:  # enter (re-raise BusyError with info if it fails)
+            start = time()
+            deadline = start + timeout
+            semaphore.acquire(timeout)
+            try:
+                mutex.acquire(max(deadline - time(), 0))
+                try:
+                    if readers.value == 0:
+                        # first reader: wait for the writer (if any) to leave
+                        room.acquire(max(deadline - time(), 0))
+                    readers.release()
+                finally:
+                    mutex.release()
+            finally:
+                semaphore.release()
+        except posix_ipc.BusyError:
+            _record_busy(uri)
+            error_msg = 'The resource <{res_uri}> is locked by another thread.'.format(res_uri=self.uri)
+            raise posix_ipc.BusyError(error_msg)
+
+        acquired = time()
+        reading_threads = self.__dict__.setdefault(
+            "_WithLockMixin__reading_threads", set())
+        reading_threads.add(thread_id)
+        LOG.debug("%s shared   by %s--%s after %.6fs",
+                  self, PID, thread_id, acquired - start)
+        try:
+            # make sure the resource still exists (it could have been deleted by a concurrent process).
+            if resource.__class__ is _DeletedCore:
+                raise TypeError('The resource <{uri}> no longer exists.'.format(uri=resource.get_uri()))
+            yield
+        finally:  # leave
+            reading_threads.discard(thread_id)
+            mutex.acquire()
+            try:
+                readers.acquire(0)
+                if readers.value == 0:
+                    # last reader: let writers in
+                    room.release()
+            finally:
+                mutex.release()
+            released = time()
+            _record_lock(uri, acquired - start, released - acquired)
+            LOG.debug("%s unshared by %s--%s after %.6fs",
+                      self, PID, thread_id, released - acquired)
+
     @contextmanager
     def edit(self, parameters=None, clear=None, _trust=False):
         """I override :meth:`rdfrest.cores.ICore.edit`.
@@ -170,6 +569,9 @@ class WithLockMixin(ILocalCore):
         """
         super(WithLockMixin, self).ack_delete(parameters)
         self._get_semaphore().unlink()  # remove the semaphore from this resource as it no longer exists
+        _SEMAPHORE_POOL.discard(self.uri)
+        self.unlink_rw_semaphores(self.uri)
+        _forget_lock_times(self.uri)
 
     @classmethod
     def create(cls, service, uri, new_graph):
@@ -222,7 +624,20 @@ class WithLockMixin(ILocalCore):
             # that everything is fine --
             # there could be a 2nd "token" being held at the moment.
             # But this test is better than nothing...
-        sem.close()
+
+    @classmethod
+    def unlink_rw_semaphores(cls, uri):
+        """ I remove the semaphores used for shared locks
+        of the resource with the given uri, if they exist.
+
+        They will be re-created with their initial values when needed.
+        """
+        for suffix in _RW_SUFFIXES:
+            _SEMAPHORE_POOL.discard(uri + suffix)
+            try:
+                posix_ipc.unlink_semaphore(get_semaphore_name(uri + suffix))
+            except posix_ipc.ExistentialError:
+                pass
 
     @classmethod
     def create_lock(cls, uri):
@@ -231,7 +646,7 @@ class WithLockMixin(ILocalCore):
         :param uri: the URI of the resource owning the lock
         :return: the created semaphore
         """
-        semaphore = posix_ipc.Semaphore(name=get_semaphore_name(uri),
-                                        flags=posix_ipc.O_CREAT,
-                                        initial_value=1) # if it doesn't exist
-        return semaphore
+        # a pooled handle may refer to a semaphore that was unlinked
+        # (e.g. by another process), so always re-open it
+        _SEMAPHORE_POOL.discard(uri)
+        return _SEMAPHORE_POOL.get(uri) # creates it if it doesn't exist
@@ -0,0 +1,135 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I provide a notification bus for computed traces needing recomputation,
+and a way to wait for changes in obsel collections.
+
+Whenever the obsel collection of a computed trace is marked as dirty
+(see `ktbs.engine.trace.ComputedTrace._mark_dirty`:meth:,
+which is called, among others, when the obsels of a source trace change),
+all registered listeners are called with the URI of that obsel collection.
+
+Listeners are only called once the corresponding changes are commited,
+and at most once per transaction for a given obsel collection.
+
+Listeners are in-process;
+see `ktbs.plugins.notification_queue`:mod: for a listener
+forwarding the notifications to other processes (e.g. ``bgcompute``).
+
+Threads can also wait for an obsel collection to change
+(see `wait_for_change`:func:), which is used to implement long-polling
+on obsel collections.
+Obsel collections notify such changes with `notify_changed`:func:;
+dirty obsel collections (see above) are also considered as changed.
+"""
+from logging import getLogger
+from threading import Condition, Lock
+
+LOG = getLogger(__name__)
+
+_LISTENERS = []
+
+_WAITERS_LOCK = Lock()
+_CONDITIONS = {} # URI -> [Condition, number of waiting threads]
+
+def add_listener(func):
+    """I register a function to be called with the URI of dirty obsel
+    collections.
+    """
+    _LISTENERS.append(func)
+
+def remove_listener(func):
+    """I unregister a function previously registered with `add_listener`.
+    """
+    _LISTENERS.remove(func)
+
+def notify_dirty(obsels):
+    """I notify all listeners that the given obsel collection is dirty.
+
+    :param obsels: the `ktbs.engine.trace_obsels.ComputedTraceObsels`:class:
+                   that needs to be recomputed
+    """
+    notify_changed(obsels)
+    if not _LISTENERS:
+        return
+    uri = obsels.uri
+    obsels.service.call_on_commit(("notify_dirty", uri),
+                                  lambda: _fire(uri))
+
+def notify_changed(obsels):
+    """I wake up the threads waiting for the given obsel collection to change.
+
+    :param obsels: the `ktbs.engine.trace_obsels.AbstractTraceObsels`:class:
+                   that changed
+
+    NB: threads are only woken up once the changes are commited.
+    """
+    uri = obsels.uri
+    if uri not in _CONDITIONS:
+        # nobody is waiting;
+        # NB: this unlocked test may miss a thread starting to wait,
+        # but waiting threads periodically check for changes anyway
+        return
+    obsels.service.call_on_commit(("notify_changed", uri),
+                                  lambda: _wake_up(uri))
+
+def wait_for_change(uri, timeout):
+    """I block until the obsel collection identified by uri changes
+    (see `notify_changed`:func:), or timeout seconds have elapsed.
+
+    I return True if a change was notified, False on timeout.
+
+    Note that only changes made by this process are notified;
+    also, changes commited just before the call are *not* notified,
+    so callers should wait with a reasonably short timeout,
+    and check for changes themselves between calls.
+    """
+    with _WAITERS_LOCK:
+        entry = _CONDITIONS.get(uri)
+        if entry is None:
+            entry = _CONDITIONS[uri] = [Condition(), 0]
+        entry[1] += 1
+    condition = entry[0]
+    try:
+        with condition:
+            return condition.wait(timeout)
+    finally:
+        with _WAITERS_LOCK:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del _CONDITIONS[uri]
+
+def _wake_up(uri):
+    """I wake up all threads waiting for a change in the given URI.
+    """
+    with _WAITERS_LOCK:
+        entry = _CONDITIONS.get(uri)
+    if entry is not None:
+        condition = entry[0]
+        with condition:
+            condition.notify_all()
+
+def _fire(uri):
+    """I call all listeners with the given URI.
+    """
+    for listener in list(_LISTENERS):
+        try:
+            listener(uri)
+        except BaseException as ex:
+            LOG.error("Error while notifying <%s>", uri)
+            LOG.exception(ex)
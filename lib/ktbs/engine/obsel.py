@@ -30,7 +30,8 @@ from rdfrest.util.iso8601 import UTC
 from rdfrest.cores.local import ILocalCore
 from rdfrest.cores.mixins import WithCardinalityMixin, WithReservedNamespacesMixin, \
     WithTypedPropertiesMixin
-from rdfrest.util import bounded_description, Diagnosis, make_fresh_uri, parent_uri
+from rdfrest.util import bounded_description, check_new, Diagnosis, make_fresh_uri, \
+    parent_uri, random_token
 from ..api.obsel import ObselMixin
 from ..namespace import KTBS, RDF
 from ..utils import SKOS
@@ -266,11 +267,39 @@ class _ObselImpl(ILocalCore):
         basename.
         """
         # Do NOT call super method, as this is the base implementation.
-        label = (new_graph.value(created, SKOS.prefLabel)
-                 or basename).lower()
-        prefix = "%s%s-" % (target.uri, _NON_ALPHA.sub("-", label))
+        prefix = cls._get_uri_prefix(target, new_graph, created, basename)
         return make_fresh_uri(target.obsel_collection.state, prefix, suffix)
 
+    @classmethod
+    def mint_uris(cls, target, new_graph, created_nodes, basename="o",
+                  suffix=""):
+        """I mint URIs for several obsels at once.
+
+        :return: a dict mapping each node of `created_nodes` to its new URI
+
+        Contrarily to calling `mint_uri`:meth: repeatedly,
+        I ensure that the minted URIs are distinct from each other,
+        although none of them is in the obsel collection yet.
+        """
+        state = target.obsel_collection.state
+        # make tokens long enough for collisions to be unlikely
+        min_length = 2
+        while 10 * 36**(min_length-1) < 4 * len(created_nodes):
+            min_length += 1
+        ret = {}
+        minted = set()
+        for node in created_nodes:
+            prefix = cls._get_uri_prefix(target, new_graph, node, basename)
+            length = min_length
+            while True:
+                uri = URIRef("%s%s%s" % (prefix, random_token(length), suffix))
+                if uri not in minted and check_new(state, uri):
+                    break
+                length += 1
+            minted.add(uri)
+            ret[node] = uri
+        return ret
+
     @classmethod
     def create(cls, service, uri, new_graph):
         """I implement :meth:`ILocalCore.create`.
@@ -284,6 +313,14 @@ class _ObselImpl(ILocalCore):
 
     ######## Private methods ########
 
+    @classmethod
+    def _get_uri_prefix(cls, target, new_graph, created, basename):
+        """I return the prefix of the URIs minted for `created`.
+        """
+        label = (new_graph.value(created, SKOS.prefLabel)
+                 or basename).lower()
+        return "%s%s-" % (target.uri, _NON_ALPHA.sub("-", label))
+
     @classmethod
     def _get_trace_from_uri(cls, service, obsel_uri):
         """I return the trace owning a given obsel.
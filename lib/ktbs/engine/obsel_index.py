@@ -0,0 +1,300 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I provide a time-interval index for obsel collections.
+
+The index keeps the obsels of a collection sorted by (end, begin, uri),
+which is the order used by `~ktbs.api.trace.AbstractTraceMixin.iter_obsels`:meth:.
+Range, after/before and limit/offset queries can then be answered
+in O(log n + k) instead of a SPARQL query sorting the whole collection.
+
+The index is not stored as such:
+it is built from the RDF store the first time it is needed,
+and tagged with the etag of the obsel collection at that time.
+Whenever the etag of the collection does not match the one of the index
+(e.g. because the collection was modified by another process),
+the index is considered stale and rebuilt.
+That way, the index can not diverge from the content of the store,
+even across restarts.
+
+The index also keeps, for each obsel type, the sorted list of the keys of
+the obsels having that type, so that selecting the obsels of a few types
+(see `parse_type_test`:func:) costs time proportional to the matching obsels,
+rather than to the size of the collection.
+"""
+from bisect import bisect_left, bisect_right, insort
+from itertools import chain
+import re
+from threading import RLock
+from weakref import WeakKeyDictionary
+
+from rdflib import RDF, URIRef
+
+from ..namespace import KTBS
+
+_INF = float("inf")
+
+class ObselIndex(object):
+    """I keep the obsels of a collection sorted by (end, begin, uri).
+
+    :param etag: the etag of the obsel collection that this index reflects
+    :param keys: an iterable of (end, begin, uri) tuples
+
+    NB: URIs are stored as plain `str`, so that they are compared in the same
+    way as ``str(?obs)`` in the SPARQL queries built by
+    `~ktbs.api.trace_obsels.AbstractTraceObselsMixin.build_select`:meth:.
+    """
+
+    def __init__(self, etag, keys=(), types=None):
+        self.etag = etag
+        self._keys = sorted(keys)
+        self._by_uri = { key[2]: key for key in self._keys }
+        self._types = {} # uri -> tuple of types
+        self._by_type = {} # type -> sorted list of keys
+        if types:
+            by_type = self._by_type
+            for key in self._keys:
+                obs_types = types.get(key[2])
+                if obs_types:
+                    obs_types = tuple(sorted(set(obs_types)))
+                    self._types[key[2]] = obs_types
+                    for otype in obs_types:
+                        # as self._keys is sorted, so are the appended lists
+                        by_type.setdefault(otype, []).append(key)
+        self._lock = RLock()
+
+    @classmethod
+    def build(cls, state, trace_uri, etag):
+        """I build an index from the state of an obsel collection.
+
+        :param state: the graph of the obsel collection
+        :param trace_uri: the URI of the trace owning the obsels
+        :param etag: the current etag of the obsel collection
+        """
+        triples = state.triples
+        begins = { s: o for s, _, o in triples((None, KTBS.hasBegin, None)) }
+        ends = { s: o for s, _, o in triples((None, KTBS.hasEnd, None)) }
+        types = {}
+        for obs, _, otype in triples((None, RDF.type, None)):
+            types[str(obs)] = types.get(str(obs), ()) + (str(otype),)
+        keys = []
+        for obs, _, _ in triples((None, KTBS.hasTrace, trace_uri)):
+            begin = begins.get(obs)
+            end = ends.get(obs)
+            if begin is None or end is None:
+                continue # not an obsel, or not a well-formed one
+            keys.append((int(end), int(begin), str(obs)))
+        return cls(etag, keys, types)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def get_key(self, uri):
+        """I return the (end, begin, uri) key of the given obsel, or None.
+        """
+        return self._by_uri.get(str(uri))
+
+    def get_last_key(self):
+        """I return the greatest key of this index, or None if it is empty.
+        """
+        with self._lock:
+            if self._keys:
+                return self._keys[-1]
+            return None
+
+    def add(self, uri, begin, end, types=()):
+        """I add (or update) an obsel in this index.
+
+        :param types: the URIs of the types of the obsel
+        """
+        uri = str(uri)
+        key = (int(end), int(begin), uri)
+        types = tuple(sorted(set( str(i) for i in types )))
+        with self._lock:
+            old_key = self._by_uri.get(uri)
+            if old_key == key and self._types.get(uri, ()) == types:
+                return
+            if old_key is not None:
+                self._remove_key(old_key)
+            insort(self._keys, key)
+            self._by_uri[uri] = key
+            if types:
+                self._types[uri] = types
+                by_type = self._by_type
+                for otype in types:
+                    insort(by_type.setdefault(otype, []), key)
+
+    def discard(self, uri):
+        """I remove an obsel from this index, if present.
+        """
+        with self._lock:
+            old_key = self._by_uri.pop(str(uri), None)
+            if old_key is not None:
+                self._remove_key(old_key)
+
+    def count_type(self, otype):
+        """I return the number of obsels having the given type.
+        """
+        return len(self._by_type.get(str(otype), ()))
+
+    def select(self, begin=None, end=None, after=None, before=None,
+               reverse=False, limit=None, offset=None, maxb=None, mine=None,
+               otypes=None):
+        """I return the URIs (as `str`) of the obsels matching the criteria.
+
+        The semantics of the parameters are the same as in
+        `~ktbs.api.trace_obsels.AbstractTraceObselsMixin.build_select`:meth:,
+        except that `after` and `before` must be (end, begin, uri) keys.
+        Additionally, `maxb` (resp. `mine`) constrains the begin (resp. end)
+        timestamp of the obsels to be lower (resp. greater) or equal to it,
+        and `otypes`, if not None, is a list of type URIs;
+        only obsels having (at least) one of these types are then returned.
+        """
+        with self._lock:
+            if otypes is None:
+                keys = self._keys
+            else:
+                by_type = self._by_type
+                lists = [ by_type[i] for i in set( str(j) for j in otypes )
+                          if i in by_type ]
+                if len(lists) == 1:
+                    keys = lists[0]
+                else:
+                    # an obsel may have several of the requested types
+                    keys = sorted(set(chain(*lists)))
+            low = 0
+            high = len(keys)
+            # as begin <= end for every obsel, a lower bound on the begin
+            # is also a lower bound on the end
+            for minval in (begin, mine):
+                if minval is not None:
+                    low = max(low, bisect_left(keys, (minval,)))
+            if end is not None:
+                high = min(high, bisect_right(keys, (end, _INF)))
+            if after is not None:
+                low = max(low, bisect_right(keys, after))
+            if before is not None:
+                high = min(high, bisect_left(keys, before))
+
+            if reverse:
+                indexes = range(high-1, low-1, -1)
+            else:
+                indexes = range(low, high)
+            to_skip = offset or 0
+            ret = []
+            if limit is not None and limit <= 0:
+                return ret
+            for i in indexes:
+                _, obs_begin, uri = keys[i]
+                if begin is not None and obs_begin < begin:
+                    continue
+                if maxb is not None and obs_begin > maxb:
+                    continue
+                if to_skip:
+                    to_skip -= 1
+                    continue
+                ret.append(uri)
+                if limit is not None and len(ret) >= limit:
+                    break
+            return ret
+
+    def _remove_key(self, key):
+        """I remove a key from the sorted lists (lock must be held).
+        """
+        _remove_from(self._keys, key)
+        by_type = self._by_type
+        for otype in self._types.pop(key[2], ()):
+            keys = by_type[otype]
+            _remove_from(keys, key)
+            if not keys:
+                del by_type[otype]
+
+
+def _remove_from(keys, key):
+    """I remove a key from a sorted list of keys, if present.
+    """
+    i = bisect_left(keys, key)
+    if i < len(keys) and keys[i] == key:
+        del keys[i]
+
+
+_TYPE_TERM = r"(?:<([^<>\s]*)>|m:((?:[\w-]|\.(?=[\w-]))*))"
+# NB: a local name can contain dots, but can not end with a dot
+_TYPE_TEST = re.compile(
+    r"\s*\?obs\s+(?:a|rdf:type|<%s>)\s+%s\s*\.?\s*$"
+    % (re.escape(str(RDF.type)), _TYPE_TERM))
+_TYPE_FILTER = re.compile(
+    r"\s*\?obs\s+(?:a|rdf:type|<%s>)\s+\?(\w+)\s*\.\s*"
+    r"FILTER\s*\(\s*\?(\w+)\s+in\s*\(([^()]*)\)\s*\)\s*\.?\s*$"
+    % re.escape(str(RDF.type)), re.IGNORECASE)
+_TYPE_TERM_ITEM = re.compile(r"\s*%s\s*$" % _TYPE_TERM)
+
+def parse_type_test(bgp, model_prefix=None):
+    """I check whether `bgp` is a plain type test on ``?obs``.
+
+    Plain type tests are either of the form ``?obs a <type>``
+    or of the form ``?obs a ?t. FILTER(?t in (<type1>, <type2>...))``
+    (where ``a`` can also be written ``rdf:type``,
+    and types can also be prefixed with ``m:``, the prefix of the model).
+
+    :param bgp: a SPARQL basic graph pattern, as passed to
+      `~ktbs.api.trace.AbstractTraceMixin.iter_obsels`:meth:
+    :param model_prefix: the URI for the ``m:`` prefix, if any
+
+    :return: the list of type URIs, or None if `bgp` is not a type test
+    """
+    def make_uri(iri, local_name):
+        if local_name is None:
+            return URIRef(iri)
+        elif model_prefix is not None:
+            return URIRef(model_prefix + local_name)
+        else:
+            return None
+
+    match = _TYPE_TEST.match(bgp)
+    if match:
+        ret = [ make_uri(*match.groups()) ]
+    else:
+        match = _TYPE_FILTER.match(bgp)
+        if not match or match.group(1) != match.group(2):
+            return None
+        ret = []
+        for item in match.group(3).split(","):
+            item_match = _TYPE_TERM_ITEM.match(item)
+            if not item_match:
+                return None
+            ret.append(make_uri(*item_match.groups()))
+    if None in ret:
+        return None
+    return ret
+
+
+def get_index_registry(store):
+    """I return the dict of obsel indexes associated to the given store.
+
+    The dict maps URIs of obsel collections to `ObselIndex`:class: instances.
+    As resources are not kept alive between requests by
+    `rdfrest.cores.local.Service`:class:, indexes can not be stored in the
+    resources themselves.
+    """
+    ret = _REGISTRY.get(store)
+    if ret is None:
+        ret = _REGISTRY[store] = {}
+    return ret
+
+_REGISTRY = WeakKeyDictionary()
@@ -26,6 +26,7 @@ import urllib.parse
 from rdfrest.cores.local import Service
 from rdfrest.util import parent_uri
 from .builtin_method import get_builtin_method_impl, iter_builtin_method_impl
+from .columnar_store import ColumnarObselStore
 from .base import Base
 from .data_graph import DataGraph
 from .ktbs_root import KtbsRoot
@@ -143,6 +144,24 @@ class KtbsService(Service):
                        KTBS.hasVersion,
                        Literal("%s%s" % (ktbs_version, ktbs_commit))))
 
+    def make_store(self, store_type, config_str):
+        """I override `rdfrest.cores.local.Service.make_store`.
+
+        If the ``obsel-store`` option of the ``rdf_database`` section
+        is ``columnar``, I wrap the store in a
+        `~.columnar_store.ColumnarObselStore`:class:.
+        """
+        obsel_store = self.config.get('rdf_database', 'obsel-store')
+        if obsel_store not in ('triples', 'columnar'):
+            raise ValueError("Unsupported obsel-store %r" % obsel_store)
+        if obsel_store == 'columnar' and store_type != 'IOMemory':
+            raise ValueError("obsel-store = columnar requires "
+                             "an in-memory repository")
+        store = super(KtbsService, self).make_store(store_type, config_str)
+        if obsel_store == 'columnar':
+            store = ColumnarObselStore(store)
+        return store
+
     def get(self, uri, rdf_types=None, _no_spawn=False):
         """I override :meth:`rdfrest.cores.local.Service.get`
 
@@ -20,6 +20,7 @@ I provide the implementation of ktbs:StoredTrace and ktbs:ComputedTrace .
 """
 import traceback
 from datetime import datetime
+from itertools import chain
 from logging import getLogger
 
 from rdflib import BNode, Graph, Literal, URIRef, XSD
@@ -29,12 +30,13 @@ from ktbs.engine.trace_stats import TraceStatistics
 from ktbs.time import lit2datetime, get_converter_to_unit
 from rdfrest.exceptions import InvalidDataError
 from rdfrest.cores.factory import factory as universal_factory
-from rdfrest.cores.local import compute_added_and_removed
+from rdfrest.cores.local import check_delta_only
 from rdfrest.cores.mixins import FolderishMixin
 from rdfrest.util import bounded_description, cache_result, random_token, replace_node_sparse, \
     Diagnosis
 from .base import InBase
 from .builtin_method import get_builtin_method_impl
+from .notification import notify_dirty
 from .obsel import Obsel
 from .resource import KtbsPostableMixin, METADATA
 from .trace_obsels import ComputedTraceObsels, StoredTraceObsels
@@ -96,11 +98,8 @@ class AbstractTrace(AbstractTraceMixin, InBase):
         diag = super(AbstractTrace, cls).check_new_graph(
             service, uri, parameters, new_graph, resource, added, removed)
 
-        if resource is not None:
-            old_graph = resource.get_state()
-            added, removed = compute_added_and_removed(new_graph, old_graph,
-                                                       added, removed)
-            src_graph = added
+        if check_delta_only(resource, added, removed):
+            src_graph = added # only check new sources
         else:
             src_graph = new_graph
 
@@ -320,7 +319,13 @@ class StoredTrace(StoredTraceMixin, KtbsPostableMixin, AbstractTrace):
         """I override :meth:`rdfrest.util.GraphPostableMixin.post_graph`.
 
         I allow for multiple obsels to be posted at the same time.
+
+        If `graph` has a true ``bulk`` attribute
+        (as set by `ktbs.serpar.bulk_parser`:mod:),
+        I rely on `post_obsels_bulk`:meth:.
         """
+        if getattr(graph, "bulk", False):
+            return self.post_obsels_bulk(graph, parameters, _trust)
         base = self.get_base()
         post_single_obsel = super(StoredTrace, self).post_graph
         binding = { "trace": self.uri }
@@ -357,6 +362,87 @@ class StoredTrace(StoredTraceMixin, KtbsPostableMixin, AbstractTrace):
             stats.metadata.set((stats.uri, METADATA.dirty, YES))
         return ret
 
+    def post_obsels_bulk(self, graph, parameters=None, _trust=False):
+        """I post all the obsels described in `graph` at once.
+
+        :return: the list of the URIs of the created obsels
+
+        This is functionally equivalent to `post_graph`:meth:,
+        but much more efficient for large numbers of obsels.
+        Rather than processing obsels one by one,
+        I extract their descriptions, mint their URIs
+        and replace blank nodes in a single pass over `graph`,
+        and I check all of them before inserting any
+        (so either all obsels are created, or none).
+        They are then inserted with a single ``addN``.
+        """
+        self.check_parameters(parameters, parameters, "post_graph")
+        trace_uri = self.uri
+        obsels = list(set(graph.subjects(KTBS.hasTrace, trace_uri)))
+        if not obsels:
+            raise InvalidDataError("No obsel found in posted graph")
+
+        diag = Diagnosis("post_obsels_bulk")
+        # checks, minting and insertion must happen in the same edit context,
+        # so that concurrent posts can not mint the same URIs
+        with self.obsel_collection.edit({"add_obsels_only":1}, _trust=True):
+            if not _trust:
+                for obs in obsels:
+                    diag &= self.check_posted_graph(parameters, obs, graph)
+                if not diag:
+                    raise InvalidDataError(str(diag))
+
+            # extract the bounded descriptions of all obsels,
+            # replacing their blank nodes with minted URIs
+            minted = Obsel.mint_uris(self, graph, [ i for i in obsels
+                                                    if isinstance(i, BNode) ])
+            minted_get = minted.get
+            new_graph = Graph()
+            add = new_graph.add
+            triples = graph.triples
+            waiting = set(obsels)
+            seen = set()
+            while waiting:
+                node = waiting.pop()
+                seen.add(node)
+                for s, p, o in triples((node, None, None)):
+                    add((minted_get(s, s), p, minted_get(o, o)))
+                    if isinstance(o, BNode) and o not in seen:
+                        waiting.add(o)
+                for s, p, o in triples((None, None, node)):
+                    add((minted_get(s, s), p, minted_get(o, o)))
+                    if isinstance(s, BNode) and s not in seen:
+                        waiting.add(s)
+            obsels = [ minted_get(i, i) for i in obsels ]
+
+            service = self.service
+            if not _trust:
+                for obs in obsels:
+                    Obsel.complete_new_graph(service, obs, parameters, new_graph)
+                # only check the arcs of each obsel, which is what
+                # Obsel.check_new_graph is concerned with
+                for obs in obsels:
+                    obs_graph = Graph()
+                    obs_graph.addN( (s, p, o, obs_graph) for s, p, o in chain(
+                        new_graph.triples((obs, None, None)),
+                        new_graph.triples((None, None, obs)),
+                    ))
+                    diag &= Obsel.check_new_graph(service, obs, None, obs_graph)
+                if not diag:
+                    raise InvalidDataError(str(diag))
+
+            self.obsel_collection.add_obsels_graph(new_graph, obsels)
+
+        stats = self.trace_statistics
+        if stats:
+            # Traces created before @stats was introduced have no trace_statistics
+            stats.metadata.set((stats.uri, METADATA.dirty, YES))
+
+        new_graph_value = new_graph.value
+        obsels.sort(key=lambda obs: (int(new_graph_value(obs, KTBS.hasBegin)),
+                                     int(new_graph_value(obs, KTBS.hasEnd))))
+        return obsels
+
     def get_created_class(self, rdf_type):
         """I override
         :class:`rdfrest.cores.mixins.GraphPostableMixin.get_created_class`
@@ -469,6 +555,16 @@ class ComputedTrace(ComputedTraceMixin, FolderishMixin, AbstractTrace):
         self.force_state_refresh(parameters)
         return super(ComputedTrace, self).get_state(parameters)
 
+    def iter_etags(self, parameters=None):
+        """I override
+        :meth:`rdfrest.cores.mixins.BookkeepingMixin.iter_etags`
+
+        I first update my data if needed (see `get_state`:meth:),
+        so that my etags reflect my up-to-date state.
+        """
+        self.force_state_refresh(parameters)
+        return super(ComputedTrace, self).iter_etags(parameters)
+
     def force_state_refresh(self, parameters=None):
         """I override `~rdfrest.cores.ICore.force_state_refresh`:meth:
 
@@ -555,13 +651,16 @@ class ComputedTrace(ComputedTraceMixin, FolderishMixin, AbstractTrace):
         """Notify me that my source(s) have changed.
 
         Note that the resulting recomputation will only occur when my state
-        (or the state of my obsel collection) is required.
+        (or the state of my obsel collection) is required,
+        unless some process (e.g. ``bgcompute``) listens to the notifications
+        of `ktbs.engine.notification`:mod:.
         """
         if metadata:
             self.metadata.add((self.uri, METADATA.dirty, YES))
         if obsels:
             obsels = self.obsel_collection
             obsels.metadata.add((obsels.uri, METADATA.dirty, YES))
+            notify_dirty(obsels)
 
     __method_impl = None
     # do NOT use @cache_result here, as the result may change over time
@@ -21,23 +21,37 @@ I provide the implementation of kTBS obsel collections.
 import traceback
 from itertools import chain
 from logging import getLogger
+from numbers import Real
+from time import time
 import sys
 
-from rdflib import Graph, Literal, RDF
+from rdflib import BNode, Graph, Literal, RDF, URIRef
 from rdflib.plugins.sparql.processor import prepareQuery
 
 from rdfrest.exceptions import CanNotProceedError, InvalidParametersError, \
     MethodNotAllowedError
 from rdfrest.cores.local import NS as RDFREST
 from rdfrest.util import Diagnosis, coerce_to_uri
+from rdfrest.util.query_cache import prepare_query
 from .lock import WithLockMixin
+from .notification import notify_changed, wait_for_change
+from .obsel_index import get_index_registry, parse_type_test, \
+    ObselIndex
 from .resource import KtbsResource, METADATA
+from ..api.obsel import ObselMixin
 from ..api.trace_obsels import AbstractTraceObselsMixin
-from ..namespace import KTBS
+from ..namespace import KTBS, KTBS_NS_URI
 
 
 LOG = getLogger(__name__)
 
+MAX_WAIT = 60
+"""The maximum value of the 'wait' parameter, in seconds."""
+
+WAIT_POLL_PERIOD = 1
+"""The period (in seconds) at which waiting requests check for changes,
+in case they were not notified (e.g. changes made by another process)."""
+
 class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource):
     """I provide the implementation of ktbs:AbstractTraceObsels
     """
@@ -150,6 +164,105 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
             editable.addN( (s, p, o, editable) for (s, p, o) in graph)
 
             self._detect_mon_change(graph, prepared)
+            prepared.new_obsels.update(
+                graph.subjects(KTBS.hasTrace, self.trace_uri))
+
+    def add_obsels_graph(self, graph, new_obsels, _trust=True):
+        """Add several obsels, all described in `graph`, at once.
+
+        :param graph: a graph containing the description of all new obsels
+        :param new_obsels: the URIs of the new obsels
+
+        This is equivalent to calling `add_obsel_graph`:meth: with the
+        description of each obsel, but much more efficient for large numbers
+        of obsels: all triples are inserted with a single ``addN``,
+        and monotonicity is computed in a single pass.
+        """
+        ectx = self._edit_context
+        assert ectx is None or ectx[0], \
+            "No point in calling add_obsels_graph inside an untrusted edit context"
+
+        with self.edit({"add_obsels_only": 1}, _trust=_trust) \
+        as editable:
+            prepared = self._edit_context[2]
+            editable.addN( (s, p, o, editable) for (s, p, o) in graph)
+
+            self._detect_mon_change_bulk(graph, new_obsels, prepared)
+            prepared.new_obsels.update(new_obsels)
+
+    def select_obsels(self, begin=None, end=None, after=None, before=None,
+                      reverse=False, limit=None, offset=None,
+                      maxb=None, mine=None, bgp=None):
+        """Return the URIs of the obsels of this collection matching the criteria.
+
+        :rtype: list of `rdflib.URIRef`:class:
+
+        The parameters have the same meaning as in `build_select`:meth:;
+        additionally, `maxb` (resp. `mine`) is an upper bound for the begin
+        (resp. a lower bound for the end) timestamp of the obsels.
+        As in `~ktbs.api.trace.AbstractTraceMixin.iter_obsels`:meth:,
+        the ``m:`` prefix can be used in `bgp` for the model of the trace.
+
+        The obsels are sorted by their end timestamp, then their begin
+        timestamp, then their identifier (unless `reverse` is true).
+
+        Whenever possible, I rely on the time-interval index of this collection
+        (see `.obsel_index`:mod:) rather than on a SPARQL query.
+        This includes the case where `bgp` is a plain type test
+        (see `.obsel_index.parse_type_test`:func:).
+        """
+        if not (isinstance(begin, (Real, type(None)))
+                and isinstance(end, (Real, type(None)))):
+            self.build_select(begin, end) # raises the appropriate exception
+
+        otypes = None
+        model_prefix = None
+        if bgp:
+            model_prefix = self.trace.model_prefix
+            otypes = parse_type_test(bgp, model_prefix)
+        else:
+            bgp = None
+
+        index = None
+        if bgp is None or otypes is not None:
+            index = self._get_index()
+        if index is None:
+            query_filter = []
+            if maxb is not None:
+                query_filter.append("?b <= ?_maxb_")
+            if mine is not None:
+                query_filter.append("?e >= ?_mine_")
+            if query_filter:
+                query_filter = "FILTER((%s))" % (") && (".join(query_filter))
+            else:
+                query_filter = None
+            if bgp is not None:
+                query_filter = "%s %s" % (bgp, query_filter or "")
+            select, bindings = self.build_select_template(
+                begin, end, after, before, reverse, query_filter, limit, offset,
+                "DISTINCT ?obs" if bgp else "?obs")
+            if maxb is not None:
+                bindings["_maxb_"] = Literal(maxb)
+            if mine is not None:
+                bindings["_mine_"] = Literal(mine)
+            query = prepare_query("PREFIX ktbs: <%s#> %s" % (KTBS_NS_URI, select),
+                                  model_prefix and {"m": model_prefix})
+            return [ row[0] for row in self.state.query(query,
+                                                        initBindings=bindings) ]
+
+        after_key = before_key = None
+        if after is not None:
+            after_key = self._get_index_key(index, after, "after")
+            if after_key is None:
+                return []
+        if before is not None:
+            before_key = self._get_index_key(index, before, "before")
+            if before_key is None:
+                return []
+        return [ URIRef(uri) for uri in index.select(begin, end,
+                                                     after_key, before_key,
+                                                     reverse, limit, offset,
+                                                     maxb, mine, otypes) ]
 
 
     ######## ICore implementation  ########
@@ -163,6 +276,12 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         the slicing parameters are not supported by
         `~rdfrest.cores.ICore.force_state_refresh`:meth.
 
+        Parameter 'wait' (a number of seconds, at most `MAX_WAIT`:data:)
+        makes me block until the slice contains at least one obsel,
+        which allows clients to long-poll for new obsels
+        (typically with ``after`` set to the last obsel they know).
+        See `_wait_for_slice`:meth: for more details.
+
         I consider an empty dict as equivalent to no dict.
         """
         # TODO LATER find a way to generate dynamic slices?
@@ -174,134 +293,60 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
             return super(AbstractTraceObsels, self).get_state(None)
         else:
             self.check_parameters(parameters, parameters, "get_state")
-            graph = Graph(identifier=self.uri)
-            graph_add = graph.add
-
-            # fill graph with data about the obsel collection
-            for triple in self.state.triples((self.uri, None, None)):
-                graph_add(triple)
-            for triple in self.state.triples((None, None, self.uri)):
-                graph_add(triple)
-
-            # build SPARQL query to retrieve matching obsels
-            # NB: not sure if caching the parsed query would be beneficial here
-            query_filter = []
-            minb = parameters.get("minb")
-            maxb = parameters.get("maxb")
-            if maxb is not None:
-                query_filter.append("?b <= %s" % maxb)
-            mine = parameters.get("mine")
-            if mine is not None:
-                query_filter.append("?e >= %s" % mine)
-            maxe = parameters.get("maxe")
-            after = parameters.get("after")
-            if after is not None:
-                after = coerce_to_uri(after)
-            before = parameters.get("before")
-            if before is not None:
-                before = coerce_to_uri(before)
-            if query_filter:
-                query_filter = "FILTER((%s))" % (") && (".join(query_filter))
-            else:
-                query_filter = ""
-
-            reverse = (parameters.get("reverse", "no").lower()
-                       not in ("false", "no", "0"))
-            limit = parameters.get("limit")
-            offset = parameters.get("offset")
-
-            matching_obsels = [
-                row[0].n3() for row in self.state.query(
-                    self.build_select(minb, maxe, after, before, reverse,
-                                      query_filter, limit, offset),
-                    initNs={
-                        "ktbs": "http://liris.cnrs.fr/silex/2009/ktbs#"
-                    },
-                )
-            ]
-
+            selection = self._get_slice_selection(parameters)
+            if parameters.get("wait"):
+                self._wait_for_slice(selection, parameters["wait"])
+            matching_obsels = self.select_obsels(**selection)
             LOG.debug("%s matching obsels", len(matching_obsels))
-            if len(matching_obsels) == 0:
-                matching_obsels.append('<tag:>')
-                # this is a hack because rdflib 4.2.2 does not support an empty VALUES list
-                # but it should not match anything
-
-            query_str = """PREFIX ktbs: <http://liris.cnrs.fr/silex/2009/ktbs#>
-                SELECT ?s ?p ?o ?strc ?otrc ?obs {
-                  VALUES ?obs { %s }
-                  {
-                    ?obs ?p ?o.
-                    BIND(?obs as ?s)
-                    OPTIONAL { ?o ktbs:hasTrace ?otrc }
-                  } UNION {
-                    ?s ?p ?obs.
-                    BIND(?obs as ?o)
-                    OPTIONAL { ?s ktbs:hasTrace ?strc }
-                  } UNION {
-                    ?obs ?p1 ?s.
-                    FILTER isBlank(?s)
-                    ?s ?p ?o.
-                  } UNION {
-                    ?obs ?p1 ?b1.
-                    FILTER isBlank(?b1)
-                    ?b1 ?p2 ?s.
-                    FILTER isBlank(?s)
-                    ?s ?p ?o.
-                  }
-                }
-                """% (' '.join(matching_obsels))
-
-            results = self.state.query(query_str)
-            LOG.debug("described by %s triples", len(results))
+            if matching_obsels:
+                # matching_obsels is sorted by end, begin and URI
+                maxobs = matching_obsels[0 if selection["reverse"] else -1]
+            else:
+                maxobs = None
+            graph = self._make_slice_graph(parameters, selection, maxobs)
 
             # add description of all matching obsels
             old_graph_len = len(graph)
+            triples = self.state.triples
             graph_add = graph.add
-            for s, p, o, strc, otrc, obs in results:
-                graph_add((s, p, o))
-                if strc is not None:
-                    graph_add((s, KTBS.hasTrace, strc))
-                if otrc is not None:
-                    graph_add((o, KTBS.hasTrace, otrc))
-
-            if len(graph) > old_graph_len:
-                maxe_triple = max(( t for t in graph.triples((None, KTBS.hasEnd, None)) ),
-                                  key=lambda t: t[2].toPython() )
-                maxobs = maxe_triple[0]
-                maxobs_end = maxe_triple[2].toPython()
-            else:
-                maxobs = maxobs_end = None
-
-            # canonical link
-            graph.links = links = [{
-                'uri': self.uri,
-                'rel': 'canonical',
-                'etag': next(iter(self.iter_etags())),
-                'mstable-etag': self.get_str_mon_tag(),
-            }]
-            # link to next page
-            if limit and maxobs:
-                obs_id = maxobs.rsplit("/", 1)[1]
-                if reverse:
-                    qstr = "?reverse&limit=%s&before=%s" % (limit, obs_id)
-                else:
-                    qstr = "?limit=%s&after=%s" % (limit, obs_id)
-                if minb:
-                    qstr += "&minb=%s" % minb
-                if maxb:
-                    qstr += "&maxb=%s" % maxb
-                if mine:
-                    qstr += "&mine=%s" % mine
-                if maxe:
-                    qstr += "&maxe=%s" % maxe
-                graph.link = self.uri + qstr
-                links.append({'uri': self.uri + qstr, 'rel': 'next'})
-
-            # compute etags
-            graph.etags = list(self.iter_etags({'maxe': maxobs_end, 'before': before}))
+            for obs in matching_obsels:
+                _describe_obsel(obs, triples, graph_add)
+            LOG.debug("described by %s triples", len(graph) - old_graph_len)
 
             return graph
 
+    def get_streamed_state(self, parameters=None, chunk_size=1000):
+        """I return the state of this obsel collection, as a streamed graph.
+
+        The returned graph only contains the description of the obsel
+        collection itself, and has the same additional attributes
+        (``links``, ``etags``) as the graph returned by `get_state`:meth:
+        for the same parameters.
+
+        The description of the obsels is provided by its ``iter_chunks``
+        method, which iters over graphs describing at most `chunk_size` obsels
+        each. The chunks are produced lazily, in the order of the obsels,
+        so that serializing a large collection requires a bounded amount of
+        memory. ``iter_chunks`` can be called several times.
+
+        :see-also: `rdfrest.serializers.iter_graph_chunks`:func:
+        """
+        if (not parameters # empty dict is equivalent to no dict
+            or "refresh" in parameters and len(parameters) == 1):
+            parameters = None
+            selection = self._get_slice_selection({})
+            graph = self._make_slice_graph(None, selection, None)
+        else:
+            self.check_parameters(parameters, parameters, "get_state")
+            selection = self._get_slice_selection(parameters)
+            if parameters.get("wait"):
+                self._wait_for_slice(selection, parameters["wait"])
+            maxobs = self._find_slice_maxobs(selection)
+            graph = self._make_slice_graph(parameters, selection, maxobs)
+        graph.iter_chunks = lambda: self._iter_slice_chunks(selection,
+                                                            chunk_size)
+        return graph
+
 
     ######## ILocalCore (and mixins) implementation  ########
 
@@ -341,6 +386,16 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
                                 "(got %s)" % (key, val))
                     elif key == "reverse":
                         pass
+                    elif key == "wait":
+                        try:
+                            wait = float(val)
+                        except ValueError:
+                            wait = None
+                        if wait is None or not wait >= 0:
+                            raise InvalidParametersError(
+                                "wait should be a positive number "
+                                "(got %s)" % val)
+                        parameters[key] = min(wait, MAX_WAIT)
                     else:
                         if to_check_again is None:
                             to_check_again = []
@@ -373,6 +428,8 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
             ret.last_end = int(self.state.value(obs, KTBS.hasEnd))
         ret.str_mon = ret.pse_mon = ret.log_mon = (
             parameters and "add_obsels_only" in parameters)
+        ret.old_etag = self.etag
+        ret.new_obsels = set()
         return ret
 
     def ack_edit(self, parameters, prepared):
@@ -405,11 +462,33 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         else:
             self.metadata.remove((self.uri, METADATA.last_obsel, None))
 
+        # maintain the time-interval index
+        registry = get_index_registry(self.service.store)
+        index = registry.get(self.uri)
+        if index is not None:
+            if (parameters and "add_obsels_only" in parameters
+                and index.etag == prepared.old_etag):
+                state_value = self.state.value
+                state_objects = self.state.objects
+                for obs in prepared.new_obsels:
+                    begin = state_value(obs, KTBS.hasBegin)
+                    end = state_value(obs, KTBS.hasEnd)
+                    if begin is not None and end is not None:
+                        index.add(obs, begin, end,
+                                  state_objects(obs, RDF.type))
+                index.etag = self.etag
+            else:
+                # the edit may have changed anything, so rebuild lazily
+                del registry[self.uri]
+
         # force transformed traces to refresh
         trace = self.trace
         for ttr in trace.iter_transformed_traces():
             ttr._mark_dirty(False, True)
 
+        # wake up long-polling requests
+        notify_changed(self)
+
     def delete(self, parameters=None, _trust=False):
         """I override :meth:`.KtbsResource.delete`.
 
@@ -425,6 +504,14 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
                 editable.remove((None, None, None))
                 self.init_graph(editable, self.uri, self.trace_uri)
 
+    def ack_delete(self, parameters):
+        """I override :meth:`rdfrest.cores.local.EditableCore.ack_delete`.
+
+        I drop the time-interval index of this collection.
+        """
+        super(AbstractTraceObsels, self).ack_delete(parameters)
+        get_index_registry(self.service.store).pop(self.uri, None)
+
     # TODO SOON implement check_new_graph on ObselCollection?
     # we should check that the graph only contains well formed obsels
 
@@ -440,7 +527,12 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         Note however that get_state() does use this method with an accurate
         'maxe' value (based on the actual obsels rather than on paremeters),
         in order to precisely get etags.
+
+        Finally, no etag is returned for long-polling parameters ('wait'),
+        as the representation can not be known before waiting.
         """
+        if parameters is not None and parameters.get("wait"):
+            return
         yield self.etag
         if parameters is not None:
             last_obsel = self.metadata.value(self.uri, METADATA.last_obsel)
@@ -448,6 +540,8 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
                 last_end = int(self.state.value(last_obsel, KTBS.hasEnd))
                 maxe = parameters.get("maxe")
                 before = parameters.get("before")
+                if before is not None:
+                    before = coerce_to_uri(before)
                 if before == last_obsel:
                     yield self.str_mon_tag
                 elif maxe is not None or before is not None:
@@ -462,6 +556,19 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
                         if maxe < pse_mon_limit:
                             yield self.pse_mon_tag
 
+    def get_representation_etag(self, parameters=None):
+        """I override
+        :meth:`rdfrest.cores.mixins.BookkeepingMixin.get_representation_etag`
+
+        Whatever the parameters, my representations only depend on my state
+        (which changes my etag) and on the description of my trace
+        (which some serializers use).
+        Long-polling representations ('wait') are never cached, though.
+        """
+        if parameters is not None and parameters.get("wait"):
+            return None
+        return "%s %s" % (self.etag, next(self.trace.iter_etags()))
+
     ######## Private methods ########
 
     @classmethod
@@ -480,6 +587,289 @@ class AbstractTraceObsels(AbstractTraceObselsMixin, WithLockMixin, KtbsResource)
         if prepared is None  or  not prepared.log_mon:
             graph.set((uri, METADATA.log_mon_tag, Literal(token+"l")))
 
+    def _get_index(self):
+        """Return the time-interval index of this collection, or None.
+
+        The index is (re)built if it does not exist yet, or if it is stale
+        (i.e. its etag differs from the etag of this collection).
+
+        None is returned while this collection is being edited,
+        as the index is only updated in `ack_edit`:meth:.
+        """
+        if self._edit_context is not None:
+            return None
+        registry = get_index_registry(self.service.store)
+        etag = self.etag
+        index = registry.get(self.uri)
+        if index is None  or  index.etag != etag:
+            LOG.debug("building obsel index for <%s>", self.uri)
+            index = ObselIndex.build(self.state, self.trace_uri, etag)
+            registry[self.uri] = index
+        return index
+
+    def _get_index_key(self, index, obs, param_name):
+        """Return the (end, begin, uri) key of obsel `obs` for `index`.
+
+        If `obs` is not in this collection, the key is computed from the obsel
+        itself if it is an `~..api.obsel.ObselMixin`:class:, else None is
+        returned (in accordance with `build_select`:meth:).
+        """
+        if isinstance(obs, URIRef):
+            return index.get_key(obs)
+        elif isinstance(obs, ObselMixin):
+            return (index.get_key(obs.uri)
+                    or (obs.end, obs.begin, str(obs.uri)))
+        else:
+            raise ValueError("Invalid value for `%s` (%r)" % (param_name, obs))
+
+    def _get_slice_selection(self, parameters):
+        """I convert get_state parameters to `select_obsels`:meth: arguments.
+
+        NB: `parameters` must have been checked by `check_parameters`:meth:.
+        """
+        after = parameters.get("after")
+        if after is not None:
+            after = coerce_to_uri(after)
+        before = parameters.get("before")
+        if before is not None:
+            before = coerce_to_uri(before)
+        return {
+            "begin": parameters.get("minb"),
+            "end": parameters.get("maxe"),
+            "after": after,
+            "before": before,
+            "reverse": (parameters.get("reverse", "no").lower()
+                        not in ("false", "no", "0")),
+            "limit": parameters.get("limit"),
+            "offset": parameters.get("offset"),
+            "maxb": parameters.get("maxb"),
+            "mine": parameters.get("mine"),
+        }
+
+    def _wait_for_slice(self, selection, timeout):
+        """I block until some obsel matches `selection`,
+        or `timeout` seconds have elapsed.
+
+        I also return as soon as my strictly monotonic tag changes,
+        as clients following this collection must then re-synchronize
+        anyway (the ``mstable-etag`` of the canonical link in the response
+        lets them detect it).
+        On the other hand, as long as it does not change,
+        new obsels can only be appended after the existing ones,
+        so waiting for the slice to be non-empty is enough.
+
+        Changes are notified by `ack_edit`:meth:
+        (see `ktbs.engine.notification.wait_for_change`:func:),
+        and also polled every `WAIT_POLL_PERIOD`:data: seconds,
+        in case they are made by another process.
+        """
+        deadline = time() + timeout
+        str_mon_tag = self.str_mon_tag
+        etag = None
+        while True:
+            self.force_state_refresh()
+            new_etag = self.etag
+            if new_etag != etag:
+                etag = new_etag
+                if (self.str_mon_tag != str_mon_tag
+                    or self._find_slice_maxobs(selection) is not None):
+                    return
+            remaining = deadline - time()
+            if remaining <= 0:
+                return
+            wait_for_change(self.uri, min(remaining, WAIT_POLL_PERIOD))
+
+    def _find_slice_maxobs(self, selection):
+        """I return the matching obsel with the greatest end, or None.
+
+        This is equivalent to looking for it in the result of
+        `select_obsels`:meth:, without retrieving all the matching obsels.
+        """
+        select_obsels = self.select_obsels
+        if selection["reverse"]:
+            # the obsel with the greatest end comes first
+            found = select_obsels(**dict(selection, limit=1))
+        else:
+            limit = selection["limit"]
+            offset = selection["offset"] or 0
+            found = None
+            if limit is not None:
+                if limit <= 0:
+                    return None
+                found = select_obsels(**dict(selection,
+                                             offset=offset+limit-1, limit=1))
+            if not found and select_obsels(**dict(selection, limit=1)):
+                # less than offset+limit matching obsels,
+                # so the last matching obsel is the last one without offset
+                found = select_obsels(**dict(selection, reverse=True,
+                                             offset=None, limit=1))
+        return found[0] if found else None
+
+    def _make_slice_graph(self, parameters, selection, maxobs):
+        """I return a graph describing this obsel collection (without obsels).
+
+        If `parameters` is not None, the graph is also given the ``links``
+        and ``etags`` attributes expected from slices.
+
+        :param parameters: the (checked) parameters passed to get_state
+        :param selection: the result of `_get_slice_selection`:meth:
+        :param maxobs: the URI of the matching obsel with the greatest end
+        """
+        graph = Graph(identifier=self.uri)
+        graph_add = graph.add
+
+        # fill graph with data about the obsel collection
+        for triple in self.state.triples((self.uri, None, None)):
+            graph_add(triple)
+        for triple in self.state.triples((None, None, self.uri)):
+            graph_add(triple)
+
+        if parameters is None:
+            return graph
+
+        if maxobs is not None:
+            maxobs_end = self.state.value(maxobs, KTBS.hasEnd).toPython()
+        else:
+            maxobs_end = None
+
+        # canonical link
+        graph.links = links = [{
+            'uri': self.uri,
+            'rel': 'canonical',
+            'etag': self.etag,
+            'mstable-etag': self.get_str_mon_tag(),
+        }]
+        # link to next page
+        limit = selection["limit"]
+        if limit and maxobs:
+            obs_id = maxobs.rsplit("/", 1)[1]
+            if selection["reverse"]:
+                qstr = "?reverse&limit=%s&before=%s" % (limit, obs_id)
+            else:
+                qstr = "?limit=%s&after=%s" % (limit, obs_id)
+            for key in ("minb", "maxb", "mine", "maxe"):
+                val = parameters.get(key)
+                if val:
+                    qstr += "&%s=%s" % (key, val)
+            graph.link = self.uri + qstr
+            links.append({'uri': self.uri + qstr, 'rel': 'next'})
+
+        # compute etags
+        # (bypassing overridden versions of iter_etags,
+        # as the state is already up to date)
+        graph.etags = list(AbstractTraceObsels.iter_etags(self, {
+            'maxe': maxobs_end,
+            'before': selection["before"],
+        }))
+        return graph
+
+    def _iter_slice_chunks(self, selection, chunk_size):
+        """I iter over graphs describing the obsels matching `selection`.
+
+        Each graph describes at most `chunk_size` obsels.
+        Obsels are retrieved one chunk at a time,
+        resuming after the last obsel of the previous chunk.
+        """
+        selection = dict(selection)
+        remaining = selection.pop("limit")
+        resume_key = "before" if selection["reverse"] else "after"
+        triples = self.state.triples
+        while remaining is None or remaining > 0:
+            size = chunk_size if remaining is None \
+                   else min(chunk_size, remaining)
+            matching_obsels = self.select_obsels(limit=size, **selection)
+            if not matching_obsels:
+                return
+            chunk = Graph(identifier=self.uri)
+            chunk_add = chunk.add
+            for obs in matching_obsels:
+                _describe_obsel(obs, triples, chunk_add)
+            yield chunk
+            if len(matching_obsels) < size:
+                return
+            if remaining is not None:
+                remaining -= size
+            selection["offset"] = None
+            selection[resume_key] = matching_obsels[-1]
+
+    def _detect_mon_change_bulk(self, graph, new_obsels, prepared):
+        """Detect monotonicity changes induced by adding `new_obsels` at once.
+
+        This is equivalent to calling `_detect_mon_change`:meth: for each new
+        obsel, in the order of their (end, begin, uri) key.
+
+        Note that this is called after graph has been added to self.state,
+        so all arcs from graph are also in state.
+        """
+        trace_uri = self.trace_uri
+        self_state_value = self.state.value
+        def get_key(obs):
+            "return the (end, begin, uri) key of obs, or None"
+            if not obs.startswith(trace_uri):
+                return None # not an obsel of this trace
+            end = self_state_value(obs, KTBS.hasEnd)
+            if end is None:
+                return None # not an obsel
+            return (int(end), int(self_state_value(obs, KTBS.hasBegin)), obs)
+
+        new_keys = {}
+        for obs in new_obsels:
+            new_keys[obs] = get_key(obs)
+        if prepared.last_obsel is None:
+            last = None
+        else:
+            last = (prepared.last_end, prepared.last_begin,
+                    prepared.last_obsel)
+
+        # previous[obs] is the last obsel at the time obs would have been added
+        previous = {}
+        for key in sorted(new_keys.values()):
+            previous[key[2]] = last
+            if last is None or key > last:
+                last = key
+        if last is not None:
+            prepared.last_end, prepared.last_begin, prepared.last_obsel = last
+
+        pseudomon_range = self.trace.pseudomon_range
+        str_mon = True
+        pse_mon = True
+        for obs, key in new_keys.items():
+            # check the new obsel, but also its *related* obsels
+            # (as the relation changes *both* obsels)
+            for other in chain([obs],
+                               graph.objects(obs, None),
+                               graph.subjects(None, obs)):
+                if other is obs:
+                    checked, newer = key, obs
+                else:
+                    checked = new_keys.get(other) or get_key(other)
+                    if checked is None:
+                        continue
+                    if other in new_keys and checked > key:
+                        # this relation is checked when 'other' is added
+                        continue
+                    newer = obs
+                old_last = previous[newer]
+                if old_last is None:
+                    continue
+                end, begin, uri = checked
+                old_last_end, old_last_begin, old_last_obsel = old_last
+                if end < old_last_end:
+                    str_mon = False
+                    if end < old_last_end - pseudomon_range:
+                        pse_mon = False
+                elif end == old_last_end:
+                    if begin < old_last_begin:
+                        str_mon = False
+                        if begin < old_last_begin - pseudomon_range:
+                            pse_mon = False
+                    elif begin == old_last_begin:
+                        if uri <= old_last_obsel:
+                            str_mon = False
+
+        prepared.str_mon = prepared.str_mon and str_mon
+        prepared.pse_mon = prepared.pse_mon and pse_mon
+
     def _detect_mon_change(self, graph, prepared):
         """Detect monotonicity changed induced by 'graph', and update `prepared` accordingly.
 
@@ -569,15 +959,62 @@ class ComputedTraceObsels(AbstractTraceObsels):
         self.force_state_refresh(parameters)
         return super(ComputedTraceObsels, self).get_state(parameters)
 
+    def get_streamed_state(self, parameters=None, chunk_size=1000):
+        """I override `AbstractTraceObsels.get_streamed_state`:meth:
+
+        As computed obsels may be recomputed from scratch at any time,
+        they could change between two chunks;
+        so I return the same graph as `get_state`:meth:,
+        which is not actually streamed.
+        """
+        return self.get_state(parameters)
+
+    def iter_etags(self, parameters=None):
+        """I override :meth:`AbstractTraceObsels.iter_etags`
+
+        I first update the obsels if needed (see `get_state`:meth:),
+        so that my etags reflect my up-to-date state.
+        """
+        self.force_state_refresh(parameters)
+        return super(ComputedTraceObsels, self).iter_etags(parameters)
+
+    def get_representation_etag(self, parameters=None):
+        """I override
+        :meth:`AbstractTraceObsels.get_representation_etag`
+
+        I first update the obsels if needed (see `get_state`:meth:).
+        Representations forcing a recomputation are never cached.
+        """
+        if parameters and \
+           _REFRESH_VALUES.get(parameters.get("refresh"), 1) >= 2:
+            return None
+        self.force_state_refresh(parameters)
+        return super(ComputedTraceObsels, self) \
+            .get_representation_etag(parameters)
+
     def force_state_refresh(self, parameters=None):
         """I override `~rdfrest.cores.ICore.force_state_refresh`:meth:
 
         I recompute the obsels if needed.
+
+        Whether a recomputation is needed is first checked under a shared
+        lock, so that concurrent readers do not block each other;
+        the exclusive lock is only acquired to recompute the obsels.
         """
         refresh_param = (_REFRESH_VALUES[parameters.get("refresh")]
                          if parameters else 1)
         if refresh_param == 0 or self.__forcing_state_refresh:
             return
+        if self.holds_shared_lock():
+            # recursive call (e.g. through self.trace) while checking below
+            return
+        if refresh_param < 2:
+            super(ComputedTraceObsels, self).force_state_refresh(parameters)
+            with self.lock(self, shared=True):
+                for src in self.trace._iter_effective_source_traces():
+                    src.obsel_collection.force_state_refresh(parameters)
+                if self.metadata.value(self.uri, METADATA.dirty, None) is None:
+                    return
         with self.lock(self):
             self.__forcing_state_refresh = True
             try:
@@ -669,3 +1106,43 @@ _REFRESH_VALUES = {
     "recursive": 3,
     None: 1,
 }
+
+def _describe_obsel(obs, triples, add):
+    """I add to a graph the description of `obs` in an obsel collection.
+
+    :param obs: the URI of the obsel to describe
+    :param triples: the `triples` method of the obsel collection's graph
+    :param add: the `add` method of the graph to fill
+
+    The description contains all the triples having `obs` as their subject or
+    object, the ``ktbs:hasTrace`` of the related nodes (so that related obsels
+    can be recognized as such), and the closure of all the blank nodes
+    reachable from `obs`.
+
+    This is equivalent to (but much faster than) the SPARQL query that was
+    previously used to extract slices of obsel collections.
+    """
+    has_trace = KTBS.hasTrace
+    bnodes = []
+    for triple in triples((obs, None, None)):
+        add(triple)
+        other = triple[2]
+        if isinstance(other, BNode):
+            bnodes.append(other)
+        elif isinstance(other, URIRef):
+            for triple2 in triples((other, has_trace, None)):
+                add(triple2)
+    for triple in triples((None, None, obs)):
+        add(triple)
+        for triple2 in triples((triple[0], has_trace, None)):
+            add(triple2)
+
+    seen = set(bnodes)
+    while bnodes:
+        bnode = bnodes.pop()
+        for triple in triples((bnode, None, None)):
+            add(triple)
+            other = triple[2]
+            if isinstance(other, BNode) and other not in seen:
+                seen.add(other)
+                bnodes.append(other)
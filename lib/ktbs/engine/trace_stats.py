@@ -68,30 +68,58 @@ class TraceStatistics(TraceStatisticsMixin, WithLockMixin, KtbsResource):
         self.force_state_refresh(parameters)
         return super(TraceStatistics, self).get_state(parameters)
 
+    def get_representation_etag(self, parameters=None):
+        """I override
+        :meth:`rdfrest.cores.mixins.BookkeepingMixin.get_representation_etag`
+
+        I first update the statistics if needed (see `get_state`:meth:).
+        Representations forcing a recomputation are never cached.
+        """
+        if parameters and \
+           _REFRESH_VALUES.get(parameters.get("refresh"), 1) >= 2:
+            return None
+        return "%s %s" % (next(self.iter_etags(parameters)),
+                          next(self.trace.iter_etags()))
+
+    def iter_etags(self, parameters=None):
+        """I override
+        :meth:`rdfrest.cores.mixins.BookkeepingMixin.iter_etags`
+
+        I first update the statistics if needed (see `get_state`:meth:),
+        so that my etags reflect my up-to-date state.
+        """
+        self.force_state_refresh(parameters)
+        return super(TraceStatistics, self).iter_etags(parameters)
+
     def force_state_refresh(self, parameters=None):
         """I override `~rdfrest.cores.ICore.force_state_refresh`:meth:
 
         I recompute the obsels if needed.
+
+        Whether a recomputation is needed is first checked under a shared
+        lock, so that concurrent readers do not block each other;
+        the exclusive lock is only acquired to recompute the statistics.
         """
         refresh_param = (_REFRESH_VALUES[parameters.get("refresh")]
                          if parameters else 1)
         if refresh_param == 0 or self.__forcing_state_refresh:
             return
+        if self.holds_shared_lock():
+            # recursive call (e.g. through self.trace) while checking below
+            return
+        if refresh_param < 2:
+            with self.lock(self, shared=True):
+                dirty, _, _ = self._check_dirty(parameters)
+                if not dirty:
+                    return
 
         with self.lock(self):
             self.__forcing_state_refresh = True
             try:
                 LOG.debug('refreshing <{}>'.format(self.uri))
                 trace = self.trace
-                trace.force_state_refresh()
-                trace.obsel_collection.force_state_refresh(parameters)
-
-                metadata = self.metadata
-                seen_trc_etag = metadata.value(self.uri, METADATA.traceEtag, None)
-                seen_obs_etag = metadata.value(self.uri, METADATA.obselsEtag, None)
-                last_trc_etag = next(self.trace.iter_etags())
-                last_obs_etag = self.trace.obsel_collection.get_etag()
-                dirty =  seen_trc_etag != last_trc_etag  or  seen_obs_etag != last_obs_etag
+                dirty, last_trc_etag, last_obs_etag = \
+                    self._check_dirty(parameters)
 
                 if not dirty and refresh_param < 2:
                     return
@@ -106,6 +134,25 @@ class TraceStatistics(TraceStatisticsMixin, WithLockMixin, KtbsResource):
             finally:
                 del self.__forcing_state_refresh
 
+    def _check_dirty(self, parameters):
+        """I refresh my trace and its obsels,
+        and check whether I need to be recomputed.
+
+        :return: a boolean (whether I am dirty),
+                 and the current etags of my trace and of its obsels
+        """
+        trace = self.trace
+        trace.force_state_refresh()
+        trace.obsel_collection.force_state_refresh(parameters)
+
+        metadata = self.metadata
+        seen_trc_etag = metadata.value(self.uri, METADATA.traceEtag, None)
+        seen_obs_etag = metadata.value(self.uri, METADATA.obselsEtag, None)
+        last_trc_etag = next(trace.iter_etags())
+        last_obs_etag = trace.obsel_collection.get_etag()
+        dirty =  seen_trc_etag != last_trc_etag  or  seen_obs_etag != last_obs_etag
+        return dirty, last_trc_etag, last_obs_etag
+
     def edit(self, parameters=None, clear=False, _trust=False):
         """I override :meth:`.KtbsResource.edit`.
         """
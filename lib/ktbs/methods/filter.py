@@ -23,9 +23,8 @@ import logging
 
 from rdflib import Literal, URIRef
 from rdfrest.util.iso8601 import parse_date
-from rdfrest.util import check_new
 from .abstract import AbstractMonosourceMethod, NOT_MON, PSEUDO_MON, STRICT_MON
-from .utils import copy_obsel, translate_node
+from .utils import copy_obsels, iter_chunks, translate_node
 from ..engine.builtin_method import register_builtin_method_impl
 from ..namespace import KTBS
 from ..time import get_converter_to_unit, lit2datetime #pylint: disable=E0611
@@ -156,28 +155,33 @@ class _FilterMethod(AbstractMonosourceMethod):
 
         source_uri = source.uri
         target_uri = computed_trace.uri
-        source_state = source_obsels.state
         target_contains = target_obsels.state.__contains__
-        target_add_graph = target_obsels.add_obsel_graph
-        check_new_obs = lambda uri, g=target_obsels.state: check_new(g, uri)
         source_obsels = source.iter_obsels(after=after, begin=begin,
                                            end=maxtime, bgp=bgp, refresh="no")
 
         with target_obsels.edit({"add_obsels_only":1}, _trust=True):
-            for obs in source_obsels:
-                new_obs_uri = translate_node(obs.uri, computed_trace,
-                                             source_uri, False)
-                if monotonicity is not STRICT_MON\
-                and target_contains((new_obs_uri, KTBS.hasTrace, target_uri)):
-                    LOG.debug("--- already seen %s", new_obs_uri)
-                    continue # already added
-
-                LOG.debug("--- keeping %s", obs)
-                new_obs_graph = copy_obsel(obs.uri, computed_trace, source,
-                                           new_obs_uri=new_obs_uri,
-                                           check_new_obs=check_new_obs,
+            # obsels are copied by chunks, each chunk being inserted at once
+            for chunk in iter_chunks(source_obsels):
+                obs_uris = []
+                new_obs_uris = []
+                for obs in chunk:
+                    new_obs_uri = translate_node(obs.uri, computed_trace,
+                                                 source_uri, False)
+                    if monotonicity is not STRICT_MON\
+                    and target_contains((new_obs_uri, KTBS.hasTrace, target_uri)):
+                        LOG.debug("--- already seen %s", new_obs_uri)
+                        continue # already added
+
+                    LOG.debug("--- keeping %s", obs)
+                    obs_uris.append(obs.uri)
+                    new_obs_uris.append(new_obs_uri)
+                if not obs_uris:
+                    continue
+                new_obs_graph = copy_obsels(obs_uris, computed_trace, source,
+                                            new_obs_uris=new_obs_uris,
+                                            check_new_obs=True,
                 )
-                target_add_graph(new_obs_graph)
+                target_obsels.add_obsels_graph(new_obs_graph, new_obs_uris)
 
         for obs in source.iter_obsels(begin=begin, reverse=True, limit=1):
             # iter only once on the last obsel, if any
@@ -19,12 +19,16 @@
 Implementation of the fsa builtin methods.
 """
 import logging
+import re
+from functools import lru_cache
 
 from fsa4streams import FSA
 from fsa4streams.matcher import DIRECTORY as matcher_directory
 from fsa4streams.state import State
 from json import dumps
 from rdflib import Literal, RDF, URIRef, Graph
+from rdflib.store import Store
+from rdfrest.util.query_cache import DEFAULT_MAXSIZE, prepare_query
 from .abstract import AbstractMonosourceMethod, NOT_MON, PSEUDO_MON, STRICT_MON
 from .utils import boolean_parameter, translate_node
 from ..engine.builtin_method import register_builtin_method_impl
@@ -57,8 +61,17 @@ def match_sparql_ask(transition, event, token, fsa):
     where variable ?obs is bound to the considered obsel,
     and prefix m: is bound to the source trace URI.
 
+    Variables ?pred and ?first are bound to the last and first obsels
+    of the token history, respectively (or to an empty string).
 
+    Whenever the source obsels are evaluated locally,
+    each condition is parsed only once
+    (see `rdfrest.util.query_cache`:mod:),
+    and the result of conditions not using ?pred or ?first
+    is memoized for the current event,
+    as it does not depend on the transition or token.
     """
+    graph = fsa.source_obsels_graph
     m_ns = fsa.source.model_uri
     if m_ns[-1] != '/' and m_ns[-1] != '#':
         m_ns += '#'
@@ -70,6 +83,36 @@ def match_sparql_ask(transition, event, token, fsa):
         pred = None
         first = None
     condition = transition['condition']
+
+    memo_event, memo = getattr(fsa, 'sparql_ask_memo', (None, None))
+    if memo is None or type(graph.store).query is not Store.query:
+        # the store evaluates queries by itself (e.g. a SPARQL endpoint)
+        return _query_sparql_ask(graph, condition, m_ns, event, pred, first)
+
+    prepared = prepare_query("ASK { %s }" % condition,
+                             {"": KTBS, "m": m_ns})
+    uses_history = _uses_history(condition)
+    if not uses_history:
+        if memo_event != event:
+            memo = {}
+            fsa.sparql_ask_memo = (event, memo)
+        ret = memo.get(condition)
+        if ret is not None:
+            return ret
+    bindings = {
+        "obs": URIRef(event),
+        "pred": pred or Literal(""), # simulating NULL
+        "first": first or Literal(""), # simulating NULL
+    }
+    ret = graph.query(prepared, initBindings=bindings).askAnswer
+    if not uses_history:
+        memo[condition] = ret
+    return ret
+
+def _query_sparql_ask(graph, condition, m_ns, event, pred, first):
+    """
+    I evaluate a sparql-ask condition as a textual query.
+    """
     ## this would be the correct way to do it
     # initBindings = { "obs": URIRef(event), "pred": pred, "first": first }
     ## unfortunately, Virtuoso does not support VALUES clauses after the ASK clause,
@@ -86,12 +129,22 @@ def match_sparql_ask(transition, event, token, fsa):
     ) + condition
     ## thank you for nothing Virtuoso :-(
 
-    return fsa.source_obsels_graph.query(
+    return graph.query(
         "ASK { %s }" % condition,
         initNs={"": KTBS, "m": m_ns},
         # initBindings=initBindings, # not supported by Virtuoso :-(
     ).askAnswer
 
+#: matches the variables of sparql-ask conditions depending on the token
+_HISTORY_VARIABLES = re.compile(r'[?$](pred|first)\b')
+
+@lru_cache(maxsize=DEFAULT_MAXSIZE)
+def _uses_history(condition):
+    """
+    I check whether a sparql-ask condition uses ?pred or ?first.
+    """
+    return _HISTORY_VARIABLES.search(condition) is not None
+
 matcher_directory['sparql-ask'] = match_sparql_ask
 
 
@@ -135,6 +188,7 @@ class _FSAMethod(AbstractMonosourceMethod):
         fsa.source = source
         fsa.target = computed_trace
         fsa.source_obsels_graph = source_obsels.state
+        fsa.sparql_ask_memo = (None, {})
 
         if monotonicity is STRICT_MON:
             LOG.debug("strictly temporally monotonic %s, reloading state", computed_trace)
@@ -151,6 +205,7 @@ class _FSAMethod(AbstractMonosourceMethod):
         source_model_uri = source.model_uri
         source_state = source_obsels.state
         source_value = source_state.value
+        source_objects = source_state.objects
         target_uri = computed_trace.uri
         target_model_uri = computed_trace.model_uri
         target_add_graph = target_obsels.add_obsel_graph
@@ -183,34 +238,17 @@ class _FSAMethod(AbstractMonosourceMethod):
                         new_obs_add((new_obs_uri, KTBS.hasSourceObsel, source_obsel))
 
                     attributes = state.get_attributes()
-                    if attributes:
-                        qvars = []
-                        qwhere = [ '?obs <{}> ?end .'.format(KTBS.hasEnd) ]
-                        for i, triple in enumerate(attributes):
-                            var = '?v{}'.format(i)
-                            qvars.append(var)
-                            qwhere.append('OPTIONAL {{?obs <{}> {} .}}'
-                                          .format(triple[1], var))
-                        query = ('SELECT {} {{'
-                                 '\nVALUES (?obs) {{\n(<{}>)\n}}'
-                                 '\n{}\n'
-                                 '}} ORDER BY ?end')\
-                            .format(
-                            ' '.join(qvars),
-                            '>)\n(<'.join(source_obsels),
-                            '\n'.join(qwhere),
-                            )
-                        results = source_state.query(query)
-                        for i, triple in enumerate(attributes):
-                            target_attr, _, aggr_func = triple
-                            try:
-                                val = aggr_func(results, i)
-                                if val is not None:
-                                    new_obs_add((new_obs_uri, target_attr, val))
-                            except Exception as ex:
-                                LOG.warn(ex.args[0])
-
-
+                    for target_attr, source_attr, aggr_func in attributes:
+                        # NB: source obsels are in chronological order
+                        values = [ val for source_obsel in source_obsels
+                                   for val in source_objects(source_obsel,
+                                                             source_attr) ]
+                        try:
+                            val = aggr_func(values)
+                            if val is not None:
+                                new_obs_add((new_obs_uri, target_attr, val))
+                        except Exception as ex:
+                            LOG.warn(ex.args[0])
 
                     target_add_graph(new_obs_graph)
 
@@ -258,26 +296,26 @@ def _split_source_attribute(source_attribute, source_model_uri):
     )
 
 
-def _last(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        return lst[-1]
+# aggregate functions receive the list of all the values of an attribute
+# in the source obsels of a match, in chronological order
+
+def _last(values):
+    if values:
+        return values[-1]
     else:
         return None
 
-def _first(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        return lst[0]
+def _first(values):
+    if values:
+        return values[0]
     else:
         return None
 
-def _count(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    return Literal(len(lst))
+def _count(values):
+    return Literal(len(values))
 
-def _sum(data, index):
-    lst = [ tpl[index].toPython() for tpl in data if tpl[index] is not None ]
+def _sum(values):
+    lst = [ val.toPython() for val in values ]
     if lst:
         try:
             return Literal(sum(lst))
@@ -286,8 +324,8 @@ def _sum(data, index):
     else:
         return None
 
-def _avg(data, index):
-    lst = [ tpl[index].toPython() for tpl in data if tpl[index] is not None ]
+def _avg(values):
+    lst = [ val.toPython() for val in values ]
     if lst:
         try:
             sumval = sum(lst)
@@ -300,25 +338,22 @@ def _avg(data, index):
     else:
         return None
 
-def _min(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        return min(lst)
+def _min(values):
+    if values:
+        return min(values)
     else:
         return None
 
-def _max(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        return max(lst)
+def _max(values):
+    if values:
+        return max(values)
     else:
         return None
 
-def _span(data, index):
-    lst = [ tpl[index] for tpl in data if tpl[index] is not None ]
-    if lst:
-        minval = min(lst).toPython()
-        maxval = max(lst).toPython()
+def _span(values):
+    if values:
+        minval = min(values).toPython()
+        maxval = max(values).toPython()
         try:
             val = maxval - minval
         except TypeError:
@@ -327,10 +362,9 @@ def _span(data, index):
     else:
         return None
 
-def _concat(data, index):
-    lst = [ str(tpl[index]) for tpl in data if tpl[index] is not None ]
-    if lst:
-        return Literal(" ".join(lst))
+def _concat(values):
+    if values:
+        return Literal(" ".join( str(val) for val in values ))
     else:
         return None
 
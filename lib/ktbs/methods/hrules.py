@@ -21,12 +21,13 @@ Implementation of the filter builtin methods.
 import logging
 
 import json
+from operator import eq as operator_eq, ge as operator_ge, gt as operator_gt, \
+    le as operator_le, lt as operator_lt
 from rdflib import Literal, RDF, URIRef, XSD
-from rdfrest.util import check_new
 from .abstract import AbstractMonosourceMethod, NOT_MON, PSEUDO_MON, STRICT_MON
-from .utils import copy_obsel, translate_node
+from .utils import copy_obsels, iter_chunks, translate_node
 from ..engine.builtin_method import register_builtin_method_impl
-from ..namespace import KTBS, KTBS_NS_URI
+from ..namespace import KTBS
 
 LOG = logging.getLogger(__name__)
 
@@ -44,6 +45,14 @@ class _HRulesMethod(AbstractMonosourceMethod):
 
     def init_state(self, computed_trace, params, cstate, diag):
         """I implement :meth:`.abstract.AbstractMonosourceMethod.init_state
+
+        The rules are compiled into a list of subrules, sorted by precedence,
+        each subrule being a JSON-compatible list
+        ``[new_type, old_type, constraints]``,
+        where ``old_type`` may be null,
+        and each constraint is a list
+        ``[attribute_type, operator, lexical_value, datatype]``.
+        See `compile_subrule`:func: for how subrules are evaluated.
         """
         domains = {}
         src_model = computed_trace.source_traces[0].model
@@ -53,19 +62,18 @@ class _HRulesMethod(AbstractMonosourceMethod):
                 domains[str(atype.uri)] = dtypes[0]
 
         rules = params['rules']
-        bgps = []
+        subrules = []
         for rulepos, rule in enumerate(rules):
             if not rule.get('visible', True):
                 continue
             new_type = rule["id"]
             for subrule in rule['rules']:
                 rank = 0
-                bgp = []
-                old_type = subrule.get("type", "")
+                old_type = subrule.get("type", "") or None
                 if old_type:
                     rank += 1000000
-                    bgp.append("?obs a <%s>." % old_type)
-                for attno, att in enumerate(subrule.get("attributes", ())):
+                constraints = []
+                for att in subrule.get("attributes", ()):
                     rank += 1000
                     if isinstance(att['value'], str):
                         dtype = domains.get(att['uri'], XSD.string)
@@ -73,22 +81,19 @@ class _HRulesMethod(AbstractMonosourceMethod):
                     else:
                         dtype = att['value'].get('@datatype', XSD.string)
                         value = Literal(att['value']['@value'], datatype=dtype)
-                    att['sparql_value'] = value.n3()
-                    if att['operator'] == '==':
-                        att['sparql_op'] = '='
-                    else:
-                        att['sparql_op'] = att['operator']
-                    att['var'] = '?att%s' % attno
-                    bgp.append('?obs <%(uri)s> %(var)s. '
-                               'FILTER(%(var)s %(sparql_op)s %(sparql_value)s).'
-                               % att)
-                bgp = "".join(bgp)
+                    operator = att['operator']
+                    if operator not in _OPERATORS:
+                        diag.append("Unsupported operator %r in rule <%s>"
+                                    % (operator, new_type))
+                        continue
+                    constraints.append([att['uri'], operator,
+                                        str(value), str(value.datatype)])
                 rank -= rulepos
-                bgps.append([rank, new_type, bgp])
-        bgps.sort(reverse=True)
+                subrules.append([rank, [new_type, old_type, constraints]])
+        subrules.sort(key=lambda item: item[0], reverse=True)
 
         cstate.update([
-            ("bgps", bgps),
+            ("subrules", [ item[1] for item in subrules ]),
             ("last_seen_u", None),
             ("last_seen_b", None),
         ])
@@ -96,11 +101,24 @@ class _HRulesMethod(AbstractMonosourceMethod):
 
     def do_compute_obsels(self, computed_trace, cstate, monotonicity, diag):
         """I implement :meth:`.abstract.AbstractMonosourceMethod.do_compute_obsels
+
+        Every new source obsel is evaluated once against the compiled subrules
+        (in order of precedence), in a single pass over the source trace.
         """
+        if "subrules" not in cstate:
+            # cstate of an older version of 'hrules'; compile the rules again
+            params = self._prepare_params(computed_trace, diag)
+            if params is None:
+                return
+            cstate.clear()
+            self.init_state(computed_trace, params, cstate, diag)
+            monotonicity = NOT_MON
+
         source = computed_trace.source_traces[0]
         source_obsels = source.obsel_collection
         target_obsels = computed_trace.obsel_collection
-        bgps = cstate["bgps"]
+        subrules = [ compile_subrule(*subrule)
+                     for subrule in cstate["subrules"] ]
         last_seen_u = cstate["last_seen_u"]
         if last_seen_u:
             last_seen_u = URIRef(last_seen_u)
@@ -125,37 +143,49 @@ class _HRulesMethod(AbstractMonosourceMethod):
 
         source_uri = source.uri
         target_uri = computed_trace.uri
-        source_state = source_obsels.state
+        source_triples = source_obsels.state.triples
         target_contains = target_obsels.state.__contains__
-        target_add_graph = target_obsels.add_obsel_graph
-        check_new_obs = lambda uri, g=target_obsels.state: check_new(g, uri)
 
-        inserted = set()
         with target_obsels.edit({"add_obsels_only":1}, _trust=True):
-            for _rank, new_type, bgp in bgps:
-                new_type = URIRef(new_type)
-                select = source_obsels.build_select(after=after, bgp=bgp)
-                query_str = "PREFIX ktbs: <%s#> %s" % (KTBS_NS_URI, select)
-                tuples = list(source_obsels.state.query(query_str))
+            all_obs_uris = source_obsels.select_obsels(begin=begin, after=after)
 
-                for obs_uri, in tuples:
+            # obsels are copied by chunks, each chunk being inserted at once
+            for chunk in iter_chunks(all_obs_uris):
+                obs_uris = []
+                new_obs_uris = []
+                new_types = []
+                for obs_uri in chunk:
                     new_obs_uri = translate_node(obs_uri, computed_trace,
                                                  source_uri, False)
-                    if monotonicity is PSEUDO_MON\
-                    and target_contains((new_obs_uri, KTBS.hasTrace, target_uri))\
-                    or new_obs_uri in inserted:
-                        # could be either because of pseudo-monotony,
-                        # or because a BGP with higher priority already matched
+                    if monotonicity is not STRICT_MON\
+                    and target_contains((new_obs_uri, KTBS.hasTrace, target_uri)):
                         LOG.debug("--- already seen %s", new_obs_uri)
                         continue # already added
 
-                    new_obs_graph = copy_obsel(obs_uri, computed_trace, source,
-                                               new_obs_uri=new_obs_uri,
-                                               check_new_obs=check_new_obs,
-                    )
-                    new_obs_graph.set((new_obs_uri, RDF.type, new_type))
-                    target_add_graph(new_obs_graph)
-                    inserted.add(new_obs_uri)
+                    values = {}
+                    for _, pred, obj in source_triples((obs_uri, None, None)):
+                        values.setdefault(pred, []).append(obj)
+                    for new_type, matches in subrules:
+                        if matches(values):
+                            break
+                    else:
+                        continue # no rule matches this obsel
+
+                    LOG.debug("--- %s matches <%s>", obs_uri, new_type)
+                    obs_uris.append(obs_uri)
+                    new_obs_uris.append(new_obs_uri)
+                    new_types.append(new_type)
+                if not obs_uris:
+                    continue
+
+                new_obs_graph = copy_obsels(obs_uris, computed_trace, source,
+                                            new_obs_uris=new_obs_uris,
+                                            check_new_obs=True,
+                )
+                new_obs_set = new_obs_graph.set
+                for new_obs_uri, new_type in zip(new_obs_uris, new_types):
+                    new_obs_set((new_obs_uri, RDF.type, new_type))
+                target_obsels.add_obsels_graph(new_obs_graph, new_obs_uris)
 
         for obs in source.iter_obsels(begin=begin, reverse=True, limit=1):
             # iter only once on the last obsel, if any
@@ -167,4 +197,103 @@ class _HRulesMethod(AbstractMonosourceMethod):
         cstate["last_seen_u"] = last_seen_u
         cstate["last_seen_b"] = last_seen_b
 
+
+def compile_subrule(new_type, old_type, constraints):
+    """
+    I compile a subrule, as stored in the computation state,
+    into a pair ``(new_type, matches)``.
+
+    ``matches`` is a function accepting a dict mapping each property
+    of an obsel to the list of its values,
+    and returning True if the obsel matches the subrule.
+
+    Attribute values are compared as SPARQL would:
+    numbers, strings, booleans and dates are compared by value,
+    and values of incompatible types never match
+    (except for ``==``, which also holds for identical terms).
+    """
+    new_type = URIRef(new_type)
+    checks = []
+    if old_type:
+        checks.append((RDF.type, URIRef(old_type).__eq__))
+    for att_uri, operator, lexical, datatype in constraints:
+        value = Literal(lexical, datatype=URIRef(datatype))
+        checks.append((URIRef(att_uri), _make_test(operator, value)))
+
+    def matches(values):
+        "check whether the given obsel values match all the constraints"
+        for prop, test in checks:
+            for obj in values.get(prop, ()):
+                if test(obj):
+                    break
+            else:
+                return False
+        return True
+
+    return new_type, matches
+
+_OPERATORS = {
+    "==": operator_eq,
+    "<": operator_lt,
+    ">": operator_gt,
+    "<=": operator_le,
+    ">=": operator_ge,
+}
+
+_NUMERIC_TYPES = frozenset([
+    XSD.integer, XSD.decimal, XSD.float, XSD.double,
+    XSD.int, XSD.long, XSD.short, XSD.byte,
+    XSD.nonNegativeInteger, XSD.positiveInteger,
+    XSD.nonPositiveInteger, XSD.negativeInteger,
+    XSD.unsignedLong, XSD.unsignedInt, XSD.unsignedShort, XSD.unsignedByte,
+])
+
+def _make_test(operator, value):
+    """
+    I return a function checking that a node satisfies ``operator value``.
+    """
+    compare = _OPERATORS[operator]
+    category, pyvalue = _comparable(value)
+    def test(node):
+        "check whether node satisfies the constraint"
+        if operator == "==" and node == value:
+            return True
+        if not isinstance(node, Literal):
+            return False
+        node_category, node_pyvalue = _comparable(node)
+        if node_category is None or node_category != category:
+            return False
+        try:
+            return compare(node_pyvalue, pyvalue)
+        except TypeError: # e.g. naive and aware datetimes
+            return False
+    return test
+
+def _comparable(literal):
+    """
+    I return the comparison category of a literal, and its python value.
+
+    The category is None if the literal can not be compared.
+    """
+    datatype = literal.datatype
+    if datatype is None:
+        if literal.language:
+            return None, None
+        return "string", str(literal)
+    elif datatype == XSD.string:
+        return "string", str(literal)
+    pyvalue = literal.toPython()
+    if pyvalue is literal:
+        return None, None # ill-typed or unknown datatype
+    if datatype in _NUMERIC_TYPES:
+        return "numeric", pyvalue
+    elif datatype == XSD.boolean:
+        return "boolean", pyvalue
+    elif datatype == XSD.dateTime:
+        return "dateTime", pyvalue
+    elif datatype == XSD.date:
+        return "date", pyvalue
+    else:
+        return None, None
+
 register_builtin_method_impl(_HRulesMethod())
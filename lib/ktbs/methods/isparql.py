@@ -23,7 +23,7 @@ import logging
 from rdflib import Literal, RDF, URIRef, Graph
 from rdfrest.util import check_new
 from .abstract import AbstractMonosourceMethod, NOT_MON, PSEUDO_MON, STRICT_MON
-from .utils import translate_node
+from .utils import iter_chunks, translate_node
 from ..engine.builtin_method import register_builtin_method_impl
 from ..namespace import KTBS, KTBS_NS_URI
 
@@ -112,26 +112,33 @@ class _ISparqlMethod(AbstractMonosourceMethod):
         source_uri = source.uri
         target_uri = computed_trace.uri
         target_contains = target_obsels.state.__contains__
-        target_add_graph = target_obsels.add_obsel_graph
         with target_obsels.edit({"add_obsels_only":1}, _trust=True):
-            for row in rows:
-                sourceObsel = row[i_sourceObsel]
-
-                new_obs_uri = translate_node(sourceObsel, computed_trace,
-                                             source_uri, False)
-                if monotonicity is not STRICT_MON\
-                and target_contains((new_obs_uri, KTBS.hasTrace, target_uri)):
-                    LOG.debug("--- already seen %s", new_obs_uri)
-                    continue # already added
-
-                LOG.debug("--- transforming %s", sourceObsel)
+            # obsels are created by chunks, each chunk being inserted at once
+            for chunk in iter_chunks(rows):
                 new_obs_graph = Graph()
                 add = new_obs_graph.add
-                add((new_obs_uri, KTBS.hasTrace, target_uri))
-                for pred, obj in zip(columns, row):
-                    if obj is not None:
-                        add((new_obs_uri, pred, obj))
-                target_add_graph(new_obs_graph)
+                new_obs_uris = []
+                for row in chunk:
+                    sourceObsel = row[i_sourceObsel]
+
+                    new_obs_uri = translate_node(sourceObsel, computed_trace,
+                                                 source_uri, False)
+                    has_trace = (new_obs_uri, KTBS.hasTrace, target_uri)
+                    in_chunk = has_trace in new_obs_graph
+                    if monotonicity is not STRICT_MON\
+                    and (in_chunk or target_contains(has_trace)):
+                        LOG.debug("--- already seen %s", new_obs_uri)
+                        continue # already added
+
+                    LOG.debug("--- transforming %s", sourceObsel)
+                    if not in_chunk:
+                        add(has_trace)
+                        new_obs_uris.append(new_obs_uri)
+                    for pred, obj in zip(columns, row):
+                        if obj is not None:
+                            add((new_obs_uri, pred, obj))
+                if new_obs_uris:
+                    target_obsels.add_obsels_graph(new_obs_graph, new_obs_uris)
 
         for obs in source.iter_obsels(begin=begin, reverse=True, limit=1):
             # iter only once on the last obsel, if any
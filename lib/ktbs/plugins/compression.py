@@ -0,0 +1,236 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This kTBS plugin compresses HTTP responses,
+according to the Accept-Encoding header field of the request.
+
+The gzip encoding is always available;
+the br (brotli) encoding is available if the ``brotli`` module is installed,
+and preferred over gzip.
+
+Responses are compressed chunk by chunk, as they are produced,
+so that streaming serializers are not forced to buffer the whole body.
+
+The etags of compressed responses are suffixed with the encoding
+(e.g. ``W/"...-gzip"``), like Apache's mod_deflate does,
+so that caches do not mix the compressed and uncompressed representations.
+`rdfrest.http_server.etag_variants`:func: accepts these suffixed etags
+in If-Match header fields, and this middleware removes the suffix from
+If-None-Match header fields, so that conditional requests keep working.
+"""
+import logging
+import zlib
+from webob import Request
+
+from rdfrest.http_server import \
+    register_middleware, unregister_middleware, TOP
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_GZIP_LEVEL = 6
+DEFAULT_BROTLI_QUALITY = 4
+DEFAULT_MIN_SIZE = 1024
+
+#: The content types that are worth compressing
+#: (in addition to all text/* types)
+COMPRESSIBLE_TYPES = {
+    "application/json",
+    "application/ld+json",
+    "application/javascript",
+    "application/n-quads",
+    "application/n-triples",
+    "application/rdf+xml",
+    "application/sparql-results+json",
+    "application/sparql-results+xml",
+    "application/trig",
+    "application/xhtml+xml",
+    "application/xml",
+}
+
+GZIP_LEVEL = DEFAULT_GZIP_LEVEL
+BROTLI_QUALITY = DEFAULT_BROTLI_QUALITY
+MIN_SIZE = DEFAULT_MIN_SIZE
+
+class CompressionMiddleware(object):
+    #pylint: disable=R0903
+    #  too few public methods
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        encoding = negotiate_encoding(environ.get("HTTP_ACCEPT_ENCODING"))
+        matched_suffix = False
+        if encoding is not None:
+            # etags sent back by the client are those of the compressed
+            # representation; the wrapped application does not know them
+            suffix = '-%s"' % encoding
+            if_none_match = environ.get("HTTP_IF_NONE_MATCH")
+            if if_none_match and suffix in if_none_match:
+                environ["HTTP_IF_NONE_MATCH"] = \
+                    if_none_match.replace(suffix, '"')
+                matched_suffix = True
+
+        req = Request(environ)
+        resp = req.get_response(self.app)
+
+        if encoding is not None:
+            if resp.status_int == 304:
+                if matched_suffix:
+                    _suffix_etags(resp, encoding)
+            elif _is_compressible(resp):
+                _suffix_etags(resp, encoding)
+                resp.headers["content-encoding"] = encoding
+                del resp.content_length
+                if req.method != "HEAD":
+                    resp.app_iter = CompressingIter(resp.app_iter, encoding)
+        if encoding is not None or _is_compressible(resp):
+            _add_vary(resp)
+
+        return resp(environ, start_response)
+
+def negotiate_encoding(accept_encoding):
+    """I return the best content-coding acceptable according to
+    the given Accept-Encoding header field, or None.
+
+    If there is no Accept-Encoding header field, I return None,
+    as compressing is not worth the risk of confusing the client.
+    """
+    if not accept_encoding:
+        return None
+    qvalues = {}
+    for item in accept_encoding.split(","):
+        parts = item.strip().split(";")
+        coding = parts[0].strip().lower()
+        qvalue = 1.0
+        for param in parts[1:]:
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    qvalue = float(value)
+                except ValueError:
+                    qvalue = 0.0
+        qvalues[coding] = qvalue
+    default = qvalues.get("*", 0.0)
+    available = ["br", "gzip"] if brotli is not None else ["gzip"]
+    best = None
+    best_qvalue = 0.0
+    for coding in available:
+        qvalue = qvalues.get(coding, default)
+        if qvalue > best_qvalue:
+            best, best_qvalue = coding, qvalue
+    return best
+
+class CompressingIter(object):
+    """I compress the chunks of another WSGI application iterator
+    as they are produced.
+
+    :param app_iter: the WSGI application iterator to compress
+    :param encoding: the content-coding to use (``gzip`` or ``br``)
+    """
+
+    def __init__(self, app_iter, encoding):
+        self.app_iter = app_iter
+        if encoding == "br":
+            compressor = brotli.Compressor(quality=BROTLI_QUALITY)
+            self._compress = compressor.process
+            self._finish = compressor.finish
+        else:
+            assert encoding == "gzip", encoding
+            compressor = zlib.compressobj(GZIP_LEVEL, zlib.DEFLATED,
+                                          16 + zlib.MAX_WBITS)
+            self._compress = compressor.compress
+            self._finish = compressor.flush
+
+    def __iter__(self):
+        compress = self._compress
+        for chunk in self.app_iter:
+            if chunk:
+                compressed = compress(chunk)
+                if compressed:
+                    yield compressed
+        yield self._finish()
+
+    def close(self):
+        """Honnor the WSGI protocol, by closing the wrapped iterator."""
+        close = getattr(self.app_iter, "close", None)
+        if close is not None:
+            close()
+
+def _is_compressible(resp):
+    """I check whether the given response is worth compressing.
+    """
+    if resp.status_int < 200 or resp.status_int in (204, 206, 304):
+        return False
+    if "content-encoding" in resp.headers:
+        return False
+    ctype = resp.content_type
+    if not ctype or not (ctype.startswith("text/")
+                         or ctype in COMPRESSIBLE_TYPES):
+        return False
+    length = resp.content_length
+    if length is not None and length < MIN_SIZE:
+        return False
+    return True
+
+def _suffix_etags(resp, encoding):
+    """I suffix the etags of the given response with the given encoding.
+    """
+    suffix = '-%s"' % encoding
+    for header in ("etag", "x-etags"):
+        value = resp.headers.get(header)
+        if value:
+            # NB: value is a space separated list of etags for x-etags
+            resp.headers[header] = " ".join(
+                etag[:-1] + suffix if etag.endswith('"') else etag
+                for etag in value.split(" ")
+            )
+
+def _add_vary(resp):
+    """I add 'accept-encoding' to the Vary header of the given response.
+    """
+    vary = resp.headers.get("vary")
+    if vary is None:
+        resp.headerlist.append(("vary", "accept-encoding"))
+    elif "accept-encoding" not in vary.lower():
+        resp.headers["vary"] = vary + ", accept-encoding"
+
+def start_plugin(config):
+    #pylint: disable=W0603
+    global GZIP_LEVEL, BROTLI_QUALITY, MIN_SIZE
+    GZIP_LEVEL = DEFAULT_GZIP_LEVEL
+    BROTLI_QUALITY = DEFAULT_BROTLI_QUALITY
+    MIN_SIZE = DEFAULT_MIN_SIZE
+    if config is not None and config.has_section('compression'):
+        if config.has_option('compression', 'gzip-level'):
+            GZIP_LEVEL = config.getint('compression', 'gzip-level')
+        if config.has_option('compression', 'brotli-quality'):
+            BROTLI_QUALITY = config.getint('compression', 'brotli-quality')
+        if config.has_option('compression', 'min-size'):
+            MIN_SIZE = config.getint('compression', 'min-size')
+    if brotli is None:
+        LOG.info("brotli module not found; only gzip compression available")
+    register_middleware(TOP, CompressionMiddleware)
+
+def stop_plugin():
+    unregister_middleware(CompressionMiddleware)
@@ -0,0 +1,77 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This kTBS plugin exposes the lock counters of the kTBS process
+(see `ktbs.engine.lock.get_lock_stats`:func:).
+
+To get them, GET the kTBS root with the 'lock-stats' URL parameter;
+the result is a JSON object, with the counters of the whole process
+in the 'process' entry, and the counters of each resource
+in the 'resources' entry (keyed by URI).
+Adding 'reset' as another URL parameter resets all counters
+after returning them.
+
+Note that the counters are per process;
+if kTBS runs in several processes,
+each request only reports the counters of the process that handled it.
+
+As it is registered at the bottom of the middleware stack,
+access to this information is subject to the authorization plugins, if any.
+"""
+from json import dumps
+from os import getpid
+from webob import Request
+
+from rdfrest.http_server import \
+    register_middleware, unregister_middleware, MyResponse, BOTTOM
+from ktbs.engine.lock import get_lock_stats, get_lock_times, reset_lock_times
+
+class LockStatsMiddleware(object):
+    #pylint: disable=R0903
+    #  too few public methods
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, environ, start_response):
+        req = Request(environ)
+        params = environ['rdfrest.parameters']
+        resource = environ['rdfrest.resource']
+        if req.method != "GET" or "lock-stats" not in params \
+        or resource is None or resource.uri != resource.service.root_uri:
+            resp = req.get_response(self.app)
+        else:
+            stats = {
+                "pid": getpid(),
+                "process": get_lock_times().as_dict(),
+                "resources": get_lock_stats(),
+            }
+            if "reset" in params:
+                reset_lock_times()
+            resp = MyResponse(dumps(stats, sort_keys=True, indent=1),
+                              status="200 Ok",
+                              content_type="application/json",
+                              cache_control="no-cache",
+                              request=req)
+        return resp(environ, start_response)
+
+def start_plugin(_config):
+    register_middleware(BOTTOM, LockStatsMiddleware)
+
+def stop_plugin():
+    unregister_middleware(LockStatsMiddleware)
@@ -0,0 +1,132 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+This kTBS plugin forwards the notifications of `ktbs.engine.notification`:mod:
+to a POSIX message queue,
+so that other processes (typically ``bgcompute``) know which computed traces
+need to be recomputed.
+
+Each message is the UTF-8 encoded URI of a dirty obsel collection.
+Every message is received by exactly one consumer,
+so several ``bgcompute`` processes can share the same queue.
+
+Sending never blocks: if the queue is full, the notification is dropped
+(consumers are expected to periodically scan the whole kTBS,
+to recover from lost notifications).
+
+Configuration (section ``[notification_queue]``):
+
+* ``name``: the name of the message queue (default ``/ktbs-notification``);
+  each kTBS running on the same host should use a different name;
+* ``max-messages``: the capacity of the queue (default 10, which is the
+  maximum allowed to unprivileged users by most Linux systems).
+"""
+import logging
+
+import posix_ipc
+
+from ktbs.engine.notification import add_listener, remove_listener
+
+LOG = logging.getLogger(__name__)
+
+DEFAULT_NAME = "/ktbs-notification"
+DEFAULT_MAX_MESSAGES = 10
+
+_QUEUE = None
+
+def open_queue(config):
+    """I open (and create if needed) the message queue configured in config.
+
+    :rtype: posix_ipc.MessageQueue
+    """
+    name = DEFAULT_NAME
+    max_messages = DEFAULT_MAX_MESSAGES
+    if config.has_section('notification_queue'):
+        if config.has_option('notification_queue', 'name'):
+            name = config.get('notification_queue', 'name')
+        if config.has_option('notification_queue', 'max-messages'):
+            max_messages = config.getint('notification_queue', 'max-messages')
+    return posix_ipc.MessageQueue(name, posix_ipc.O_CREAT,
+                                  max_messages=max_messages)
+
+def receive_notifications(queue, timeout=None):
+    """I return the list of URIs received from queue in a burst.
+
+    I wait at most `timeout` seconds for a first message (forever if None),
+    then read all pending messages, without blocking.
+    Each URI is returned only once.
+    If no message is received in `timeout` seconds, I return an empty list.
+    """
+    try:
+        message, _ = queue.receive(timeout)
+    except posix_ipc.BusyError:
+        return []
+    burst = [message]
+    while True:
+        try:
+            message, _ = queue.receive(0)
+        except posix_ipc.BusyError:
+            break
+        if message not in burst:
+            burst.append(message)
+    return [ message.decode('utf-8') for message in burst ]
+
+def iter_notifications(queue, timeout=None):
+    """I iter over the URIs received from queue.
+
+    If no message is received in `timeout` seconds, None is yielded.
+
+    Messages received in a burst are coalesced
+    (see `receive_notifications`:func:).
+    """
+    while True:
+        burst = receive_notifications(queue, timeout)
+        if not burst:
+            yield None
+        for uri in burst:
+            yield uri
+
+def send_notification(uri):
+    """I send uri to the message queue, without blocking.
+    """
+    message = str(uri).encode('utf-8')
+    if len(message) > _QUEUE.max_message_size:
+        LOG.warning("URI too long to be notified: <%s>", uri)
+        return
+    try:
+        _QUEUE.send(message, 0)
+    except posix_ipc.BusyError:
+        LOG.warning("notification queue full; dropping <%s>", uri)
+
+def start_plugin(config):
+    #pylint: disable=W0603
+    global _QUEUE
+    if not posix_ipc.MESSAGE_QUEUES_SUPPORTED:
+        LOG.warning("POSIX message queues are not supported on this platform; "
+                    "notification_queue disabled")
+        return
+    _QUEUE = open_queue(config)
+    add_listener(send_notification)
+
+def stop_plugin():
+    #pylint: disable=W0603
+    global _QUEUE
+    if _QUEUE is not None:
+        remove_listener(send_notification)
+        _QUEUE.close()
+        _QUEUE = None
@@ -23,3 +23,4 @@ from . import jsonld_parser
 from . import jsonld_serializers
 from . import csv_serializers
 from . import geojson_serializers
+from . import bulk_parser
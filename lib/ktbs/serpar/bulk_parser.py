@@ -0,0 +1,39 @@
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I provide a parser for bulk obsel ingestion.
+
+Content posted to a stored trace with the ``application/n-triples``
+content-type is parsed as N-Triples, and the obsels it contains are created
+with `~ktbs.engine.trace.StoredTrace.post_obsels_bulk`:meth:
+rather than one by one.
+"""
+from rdfrest.parsers import parse_ntriples, register_parser
+
+BULK_NT = "application/n-triples"
+
+@register_parser(BULK_NT, None, 40)
+def parse_ntriples_bulk(content, base_uri=None, encoding="utf-8", graph=None):
+    """I parse N-Triples, and flag the result for bulk obsel ingestion.
+
+    See :func:`rdfrest.parse.parse_rdf_xml` for prototype
+    documentation.
+    """
+    graph = parse_ntriples(content, base_uri, encoding, graph)
+    graph.bulk = True
+    return graph
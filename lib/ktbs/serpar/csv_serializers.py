@@ -22,7 +22,8 @@ from io import StringIO
 from csv import writer as csv_writer
 from itertools import groupby
 from rdflib import RDF
-from rdfrest.serializers import register_serializer, SerializeError
+from rdfrest.serializers import iter_graph_chunks, register_serializer, \
+    SerializeError, streaming_serializer
 from rdfrest.util import wrap_exceptions
 from re import compile as Regexp
 
@@ -34,16 +35,17 @@ CSV = "text/csv"
 
 @register_serializer(CSV, "csv", 85, KTBS.ComputedTraceObsels)
 @register_serializer(CSV, "csv", 85, KTBS.StoredTraceObsels)
+@streaming_serializer
 @wrap_exceptions(SerializeError)
 def serialize_csv_trace_obsels(graph, resource, bindings=None):
     sio = StringIO()
     csvw = csv_writer(sio)
     for row in iter_csv_rows(resource.trace.uri, graph):
-        csvw.writerow([ i.encode('utf-8') for i in row ])
+        csvw.writerow(row)
         # immediately yield each line
-        yield sio.getvalue()
+        yield sio.getvalue().encode('utf-8')
         # then empty sio before writing next line
-        sio.reset()
+        sio.seek(0)
         sio.truncate()
 
 def iter_csv_rows(trace_uri, graph, sep=' | '):
@@ -51,23 +53,29 @@ def iter_csv_rows(trace_uri, graph, sep=' | '):
     Convert obsels in graph to a tabular form, an iterable of unicode strings.
 
     NB: the first yielded table contains column names.
-    """
 
-    results0 = graph.query("""
-        PREFIX : <{0}#>
-        SELECT DISTINCT ?attr
-        {{
-            ?obs :hasTrace <{1}> ; ?attr [].
-        }}
-    """.format(KTBS_NS_URI, trace_uri))
+    If graph is a streamed graph
+    (see `rdfrest.serializers.streaming_serializer`:func:),
+    its chunks are iterated twice:
+    once to determine the columns, and once to produce the rows.
+    """
+    attrs = set()
+    for chunk in iter_graph_chunks(graph):
+        attrs.update( i[0] for i in chunk.query("""
+            PREFIX : <{0}#>
+            SELECT DISTINCT ?attr
+            {{
+                ?obs :hasTrace <{1}> ; ?attr [].
+            }}
+        """.format(KTBS_NS_URI, trace_uri)) )
 
-    if len(results0) == 0:
+    if len(attrs) == 0:
         # no obsel, yield minimal column header and stop
         yield ['id', 'type', 'begin', 'end']
         return
 
-    ktbs_props = [ i[0] for i in results0 if i[0].startswith(KTBS.uri) ]
-    other_props = [ i[0] for i in results0 if not i[0].startswith(KTBS.uri) ]
+    ktbs_props = [ i for i in attrs if i.startswith(KTBS.uri) ]
+    other_props = [ i for i in attrs if not i.startswith(KTBS.uri) ]
     ktbs_props.sort()
     other_props.sort()
 
@@ -106,14 +114,15 @@ def iter_csv_rows(trace_uri, graph, sep=' | '):
                trace_uri,
                '\n'.join(where_parts))
 
-    results = graph.query(obs_query)
-    for obsel_id, tuples in groupby(results, lambda tpl: tpl[0]):
-        sets = [ set() for i in vars ]
-        for tuple in tuples:
-            for val, valset in zip(tuple[1:], sets):
-                if val is not None:
-                    valset.add(val)
-        yield [obsel_id] + [ sep.join(valset) for valset in sets ]
+    for chunk in iter_graph_chunks(graph):
+        results = chunk.query(obs_query)
+        for obsel_id, tuples in groupby(results, lambda tpl: tpl[0]):
+            sets = [ set() for i in vars ]
+            for tuple in tuples:
+                for val, valset in zip(tuple[1:], sets):
+                    if val is not None:
+                        valset.add(val)
+            yield [obsel_id] + [ sep.join(valset) for valset in sets ]
 
 
 def make_var_name(uri, vars):
@@ -25,7 +25,8 @@ from json import dumps
 from rdflib import BNode, Literal, RDF, RDFS, URIRef, XSD
 from rdflib.plugins.sparql.processor import prepareQuery
 from pyld.jsonld import compact
-from rdfrest.serializers import register_serializer, SerializeError
+from rdfrest.serializers import register_serializer, SerializeError, \
+    streaming_serializer
 from rdfrest.util import coerce_to_uri, wrap_exceptions
 
 from ..namespace import KTBS, KTBS_NS_URI
@@ -845,6 +846,7 @@ _KTBS_HAS_SOURCE_OBSEL = KTBS.hasSourceObsel
 @register_serializer(JSONLD, "jsonld", 85, KTBS.StoredTraceObsels)
 @register_serializer(JSON, "json", 60, KTBS.ComputedTraceObsels)
 @register_serializer(JSON, "json", 60, KTBS.StoredTraceObsels)
+@streaming_serializer
 @wrap_exceptions(SerializeError)
 @encode_unicodes
 def serialize_json_trace_obsels(graph, tobsels, bindings=None):
@@ -855,10 +857,32 @@ def serialize_json_trace_obsels(graph, tobsels, bindings=None):
     :param tobsels:
     :param bindings:
     :return:
+
+    Streamed graphs are serialized one chunk at a time,
+    producing the same output as the equivalent non-streamed graph.
     """
     tobsels_dict = trace_obsels_to_json(graph, tobsels, bindings)
-
-    yield dumps(tobsels_dict, ensure_ascii=False, indent=4)
+    if getattr(graph, "iter_chunks", None) is None:
+        yield dumps(tobsels_dict, ensure_ascii=False, indent=4)
+        return
+
+    # mimic the output of dumps, with the obsels list generated chunk by chunk
+    del tobsels_dict['obsels']
+    header = dumps(tobsels_dict, ensure_ascii=False, indent=4)
+    yield header[:-2] # strip closing '\n}'
+    yield ',\n    "obsels": ['
+    sep = '\n        '
+    for chunk in graph.iter_chunks():
+        obsel_list = trace_obsels_to_json(chunk, tobsels, bindings)['obsels']
+        for obs_dict in obsel_list:
+            yield sep
+            yield dumps(obs_dict, ensure_ascii=False, indent=4) \
+                .replace('\n', '\n        ')
+            sep = ',\n        '
+    if sep == '\n        ':
+        yield ']\n}' # empty list
+    else:
+        yield '\n    ]\n}'
 
 def trace_stats_to_json(graph, tstats, bindings=None):
     """
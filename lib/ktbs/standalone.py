@@ -21,16 +21,24 @@ This is a standalone version of an HTTP-based KTBS.
 import logging
 import signal
 import os
+import sys
 from optparse import OptionParser, OptionGroup
-from socket import getaddrinfo, AF_INET6, AF_INET, SOCK_STREAM
+from socket import getaddrinfo, socket, AF_INET6, AF_INET, SOCK_STREAM, \
+    IPPROTO_IPV6, IPV6_V6ONLY, SOL_SOCKET, SO_REUSEADDR
+from time import sleep, time
 from waitress import serve
+from waitress.adjustments import Adjustments
 
-from rdfrest.util.config import apply_global_config
+from rdflib import ConjunctiveGraph
+
+from rdfrest.cores.factory import unregister_service
+from rdfrest.util.config import apply_global_config, build_service_root_uri
 from rdfrest.util.wsgi import SimpleRouter
 from rdfrest.http_server import HttpFrontend
 from .config import get_ktbs_configuration
 
-#from .namespace import KTBS
+from .namespace import KTBS
+from .engine.lock import reset_lock
 from .engine.service import KtbsService
 
 LOG = logging.getLogger("ktbs.server")
@@ -45,6 +53,14 @@ def convert_sigterm_to_sigint(_signum, _frame):
     os.kill(os.getpid(), signal.SIGINT)
 signal.signal(signal.SIGTERM, convert_sigterm_to_sigint)
 
+#: If a worker dies sooner than that (in s) after being started,
+#: the supervisor waits that long before restarting it
+WORKER_MIN_LIFETIME = 1.0
+
+#: When restarting all the workers, the supervisor waits that long (in s)
+#: for each of them to exit, before killing it
+WORKER_STOP_GRACE = 5.0
+
 def main():
     """I launch KTBS as a standalone HTTP server.
     """
@@ -54,22 +70,25 @@ def main():
     # or command line configuration OPTIONS
     ktbs_config = parse_configuration_options(cmdline_options)
 
+    if ktbs_config.getint('server', 'workers') > 1:
+        supervise_workers(ktbs_config)
+        return
+
     apply_global_config(ktbs_config)
 
     LOG.info("PID: %d", os.getpid())
 
-    ktbs_service = KtbsService(ktbs_config)  #.service
+    serve_ktbs(ktbs_config, **get_listen_kwargs(ktbs_config))
 
-    application = RequestLogger(HttpFrontend(ktbs_service, ktbs_config))
+def serve_ktbs(ktbs_config, **kwargs):
+    """I create a kTBS service, and serve it over HTTP until interrupted.
 
-    kwargs = {
-        'host': ktbs_config.get('server', 'host-name', raw=1),
-        'port': ktbs_config.getint('server', 'port'),
-        'threads': ktbs_config.getint('server', 'threads'),
-    }
+    :param ktbs_config: the configuration of the kTBS
+    :param kwargs: where to listen, passed to `waitress.serve`
+    """
+    ktbs_service = KtbsService(ktbs_config)  #.service
 
-    if ktbs_config.getboolean('server', 'force-ipv4'):
-        kwargs['ipv6'] = False
+    application = RequestLogger(HttpFrontend(ktbs_service, ktbs_config))
 
     if ktbs_config.has_option('server', 'base-path'):
         base_path = ktbs_config.get('server', 'base-path')
@@ -80,9 +99,220 @@ def main():
     serve(
         application,
         _quiet=True, # prevent waitress from re-configuring logging
+        threads=ktbs_config.getint('server', 'threads'),
         **kwargs
     )
 
+def get_listen_kwargs(ktbs_config):
+    """I return the waitress parameters describing where to listen.
+    """
+    kwargs = {
+        'host': ktbs_config.get('server', 'host-name', raw=1),
+        'port': ktbs_config.getint('server', 'port'),
+    }
+    if ktbs_config.getboolean('server', 'force-ipv4'):
+        kwargs['ipv6'] = False
+    return kwargs
+
+def supervise_workers(ktbs_config):
+    """I launch KTBS as several worker processes sharing the same sockets.
+
+    The listening sockets are created once, by this (supervisor) process;
+    then each worker process opens the repository, loads the plugins,
+    and serves the requests it accepts on the shared sockets.
+    Consistency between workers is ensured by the locks of the kTBS
+    (see `ktbs.engine.lock`:mod:),
+    so the repository must be persistent and support concurrent access
+    from several processes.
+
+    Workers that die unexpectedly are restarted;
+    the supervisor stops all the workers when it is interrupted
+    (SIGINT or SIGTERM).
+
+    A worker exiting on an uncaught exception has released its locks,
+    so it is simply restarted.
+    But a worker killed by a signal may have died while holding locks,
+    and there is no way to know which ones.
+    In that case, all the workers are stopped,
+    the locks of the kTBS root and of all its bases are reset
+    (see `ktbs.engine.lock.reset_lock`:func:),
+    then all the workers are restarted.
+    NB: this assumes that no other process (e.g. ``bgcompute``)
+    holds a lock of this kTBS at that time.
+    """
+    # plugins are only loaded in the workers
+    apply_global_config(ktbs_config, ns_prefix=False, plugins=False)
+
+    workers = ktbs_config.getint('server', 'workers')
+    if not ktbs_config.get('rdf_database', 'repository', raw=1):
+        sys.exit("ktbs: %s workers can not share an in-memory repository; "
+                 "please specify a repository" % workers)
+
+    LOG.info("supervisor PID: %d", os.getpid())
+
+    # initialize the repository (if needed) in a separate process,
+    # so that neither the supervisor nor the workers inherit its store
+    status = _wait_for(_fork(_init_repository, ktbs_config))
+    if status != 0:
+        sys.exit("ktbs: could not open the repository")
+    ktbs_config.set('rdf_database', 'force-init', 'false')
+
+    sockets = create_sockets(**get_listen_kwargs(ktbs_config))
+
+    running = {} # pid -> start time
+    try:
+        for _ in range(workers):
+            pid = _fork(_run_worker, ktbs_config, sockets)
+            running[pid] = time()
+        while True:
+            pid, status = os.wait()
+            started = running.pop(pid, None)
+            if started is None:
+                continue
+            if time() - started < WORKER_MIN_LIFETIME:
+                sleep(WORKER_MIN_LIFETIME)
+            if not os.WIFSIGNALED(status):
+                LOG.warning("worker %d died (status %d); restarting it",
+                            pid, status)
+                pid = _fork(_run_worker, ktbs_config, sockets)
+                running[pid] = time()
+                continue
+            LOG.warning("worker %d killed by signal %d; "
+                        "resetting locks and restarting all workers",
+                        pid, os.WTERMSIG(status))
+            _stop_workers(running, WORKER_STOP_GRACE)
+            running.clear()
+            if _wait_for(_fork(_reset_locks, ktbs_config)) != 0:
+                LOG.error("could not reset the locks; "
+                          "see bin/ktbs-reset-locks")
+            for _ in range(workers):
+                pid = _fork(_run_worker, ktbs_config, sockets)
+                running[pid] = time()
+    except KeyboardInterrupt:
+        LOG.info("stopping %d workers", len(running))
+        _stop_workers(running)
+    finally:
+        for sock in sockets:
+            sock.close()
+
+def _stop_workers(pids, grace=None):
+    """I stop the given worker processes, and wait for them to exit.
+
+    If `grace` is not None, the workers still running after `grace` seconds
+    (e.g. waiting for a lock) are killed.
+    """
+    for pid in pids:
+        try:
+            os.kill(pid, signal.SIGTERM)
+        except OSError:
+            pass # already dead
+    if grace is not None:
+        deadline = time() + grace
+        remaining = set(pids)
+        while remaining and time() < deadline:
+            for pid in list(remaining):
+                try:
+                    if os.waitpid(pid, os.WNOHANG)[0]:
+                        remaining.discard(pid)
+                except ChildProcessError:
+                    remaining.discard(pid)
+            sleep(0.1)
+        for pid in remaining:
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass # already dead
+        pids = remaining
+    for pid in pids:
+        _wait_for(pid)
+
+def create_sockets(**kwargs):
+    """I create and bind the listening sockets to be shared by the workers.
+
+    :param kwargs: where to listen, as accepted by `waitress.serve`
+    """
+    adj = Adjustments(**kwargs)
+    sockets = []
+    for family, socktype, proto, sockaddr in adj.listen:
+        sock = socket(family, socktype, proto)
+        sock.setsockopt(SOL_SOCKET, SO_REUSEADDR, 1)
+        if family == AF_INET6:
+            sock.setsockopt(IPPROTO_IPV6, IPV6_V6ONLY, 1)
+        sock.bind(sockaddr)
+        sock.set_inheritable(True)
+        sockets.append(sock)
+    return sockets
+
+def _fork(function, *args):
+    """I call function(*args) in a child process, and return its PID.
+
+    The child process exits when the function returns,
+    with status 0, or 1 if the function raised an exception.
+    """
+    pid = os.fork()
+    if pid:
+        return pid
+    status = 1
+    try:
+        function(*args)
+        status = 0
+    except KeyboardInterrupt:
+        status = 0
+    except BaseException:
+        LOG.exception("uncaught exception in process %d", os.getpid())
+    finally:
+        logging.shutdown()
+        os._exit(status) #pylint: disable=W0212
+
+def _wait_for(pid):
+    """I wait for a child process, and return its exit status.
+    """
+    while True:
+        try:
+            return os.waitpid(pid, 0)[1]
+        except KeyboardInterrupt:
+            pass # the child process got the signal as well
+        except ChildProcessError:
+            return None
+
+def _init_repository(ktbs_config):
+    """I open (and initialize if needed) the repository of the kTBS.
+    """
+    apply_global_config(ktbs_config, logging=False)
+    ktbs_service = KtbsService(ktbs_config)
+    unregister_service(ktbs_service)
+    ktbs_service.store.close()
+
+def _reset_locks(ktbs_config):
+    """I reset the locks of the kTBS root and of all its bases.
+
+    This must only be called when no worker is running.
+    """
+    # NB: the store is opened directly, as creating a KtbsService
+    # would require to lock the kTBS root
+    repository = ktbs_config.get('rdf_database', 'repository', raw=1)
+    if repository[0] != ":":
+        if repository.endswith(".sqlite"):
+            repository = ":SQLite:%s" % repository
+        else:
+            repository = ":Sleepycat:%s" % repository
+    _, store_type, config_str = repository.split(":", 2)
+    graph = ConjunctiveGraph(store_type)
+    graph.open(config_str, create=False)
+    try:
+        reset_lock(build_service_root_uri(ktbs_config))
+        for base_uri in set(graph.objects(None, KTBS.hasBase)):
+            reset_lock(base_uri)
+    finally:
+        graph.close()
+
+def _run_worker(ktbs_config, sockets):
+    """I serve kTBS in a worker process, on the given shared sockets.
+    """
+    apply_global_config(ktbs_config, logging=False)
+    LOG.info("worker PID: %d", os.getpid())
+    serve_ktbs(ktbs_config, sockets=sockets)
+
 def parse_configuration_options(options=None):
     """I get kTBS default configuration options and override them with
     command line options.
@@ -113,6 +343,9 @@ def parse_configuration_options(options=None):
         if options.threads is not None:
             config.set('server', 'threads', str(options.threads))
 
+        if options.workers is not None:
+            config.set('server', 'workers', str(options.workers))
+
         if options.base_path is not None:
             config.set('server', 'base-path', options.base_path)
 
@@ -194,6 +427,9 @@ def build_cmdline_options():
                    help="disable Cache-Control header (equivalent to -C \"\")")
     ogr.add_option("-t", "--threads",
                    help="sets the number of worker threads for the server")
+    ogr.add_option("-w", "--workers",
+                   help="sets the number of worker processes for the server "
+                        "(requires a persistent repository)")
     ogr.add_option("-T", "--max-triples",
                    help="sets the maximum number of bytes of payloads"
                    "(no limit if unset)")
@@ -51,3 +51,8 @@ import rdflib
 assert rdflib.__version__[0] == "4"
 
 import rdfrest.util.compat
+
+import rdflib.plugin
+import rdflib.store
+rdflib.plugin.register("SQLite", rdflib.store.Store,
+                       "rdfrest.util.sqlite_store", "SQLiteStore")
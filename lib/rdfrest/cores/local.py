@@ -40,7 +40,10 @@ implement the concerns of the server.
 * Subclasses of :class:`ILocalCore` can also benefit from a number of mix-in
   classes provided in the `~rdfrest.cores.mixins`:mod: module.
 """
+from collections import OrderedDict
 from contextlib import contextmanager
+from logging import getLogger
+from threading import Lock
 import traceback
 from weakref import WeakValueDictionary
 
@@ -59,6 +62,9 @@ from ..util import coerce_to_uri, Diagnosis, make_fresh_uri, ReadOnlyGraph, \
     urisplit
 from ..util.config import get_service_configuration, build_service_root_uri
 from ..util.config import apply_logging_config
+from ..util.overlay_graph import OverlayGraph
+
+LOG = getLogger(__name__)
 
 
 NS = Namespace("tag:silex.liris.cnrs.fr.2012.08.06.rdfrest:")
@@ -89,6 +95,13 @@ class Service(object):
     The classes passed to this service should all be subclasses of
     :class:`ILocalCore`, and all have an attribute `RDF_MAIN_TYPE`
     indicating the RDF type they implement.
+
+    The most recently used resources are kept in memory
+    (see `get`:meth: and `get_resource_cache_stats`:meth:);
+    their number is set by the ``resource-cache-size`` option
+    of the ``rdf_database`` configuration section.
+    Every time a kept resource is returned, its existence is checked
+    against the store, as it may have been deleted by another process.
     """
     # too few public methods (1/2) #pylint: disable=R0903
 
@@ -112,14 +125,17 @@ class Service(object):
             repository = ":IOMemory:"
         elif repository[0] != ":":
             init_repo = not exists(repository)
-            repository = ":Sleepycat:%s" % repository
+            if repository.endswith(".sqlite"):
+                repository = ":SQLite:%s" % repository
+            else:
+                repository = ":Sleepycat:%s" % repository
 
         # Whether we should force data repository initialization
         if service_config.getboolean('rdf_database', 'force-init'):
             init_repo = True
 
         _, store_type, config_str = repository.split(":", 2)
-        store = rdflib_plugin.get(store_type, Store)(config_str)
+        store = self.make_store(store_type, config_str)
 
         self.store_config_str = config_str
         self.store = store
@@ -134,7 +150,21 @@ class Service(object):
         # but ensures that we will not generate multiple instances for the
         # same resource.
         self._resource_cache = WeakValueDictionary()
+        # self._resource_lru, on the other hand, *is* a cache:
+        # it keeps strong references to the most recently used resources,
+        # so that they (and their cached attributes) are not rebuilt
+        # every time they are requested.
+        self._resource_lru = OrderedDict()
+        self._resource_lru_lock = Lock()
+        if service_config.has_option('rdf_database', 'resource-cache-size'):
+            self._resource_lru_size = service_config.getint(
+                'rdf_database', 'resource-cache-size')
+        else:
+            self._resource_lru_size = 0
+        self.resource_cache_hits = 0
+        self.resource_cache_misses = 0
         self._context_level = 0
+        self._on_commit = OrderedDict()
 
         metadata_graph = self.get_metadata_graph(root_uri)
         initialized = list(metadata_graph.triples((self.root_uri,
@@ -156,6 +186,17 @@ class Service(object):
         except BaseException:
             pass
 
+    def make_store(self, store_type, config_str):
+        """Create the RDF store used by this service.
+
+        :param store_type: the name of a registered `rdflib.store.Store`:class:
+        :param config_str: the configuration string passed to the store
+
+        Subclasses may override this method, e.g. to wrap the store;
+        `self.config` is already set when this method is called.
+        """
+        return rdflib_plugin.get(store_type, Store)(config_str)
+
     @HostedCore.handle_fragments
     def get(self, uri, rdf_types=None, _no_spawn=False):
         """Get a resource from this service.
@@ -190,7 +231,17 @@ class Service(object):
             # fragid is managed by the decorator HostedCore.handle_fragment
             return None
         resource = self._resource_cache.get(uri)
-        if resource is None  and  not _no_spawn:
+        if resource is not None:
+            # the resource may have been deleted by another process
+            # sharing the same store, so check that it still exists
+            if (uri, NS.hasImplementation, None) \
+            not in self.get_metadata_graph(uri):
+                self._forget_resource(uri)
+                return None
+            self.resource_cache_hits += 1
+            self._keep_resource(resource)
+        elif not _no_spawn:
+            self.resource_cache_misses += 1
             # find base rdf:type
             metadata = self.get_metadata_graph(uri)
             if len(metadata) == 0:
@@ -211,8 +262,44 @@ class Service(object):
             # make resource and store it in "cache"
             resource = py_class(self, uri)
             self._resource_cache[uri] = resource
+            self._keep_resource(resource)
         return resource
 
+    def get_resource_cache_stats(self):
+        """Return statistics about the cache of resources used by `get`:meth:.
+
+        :rtype: dict
+        """
+        return {
+            "size": len(self._resource_lru),
+            "max_size": self._resource_lru_size,
+            "hits": self.resource_cache_hits,
+            "misses": self.resource_cache_misses,
+        }
+
+    def _keep_resource(self, resource):
+        """Keep a strong reference to resource, as the most recently used.
+
+        The least recently used resource may be evicted.
+        """
+        max_size = self._resource_lru_size
+        if max_size <= 0:
+            return
+        lru = self._resource_lru
+        uri = resource.uri
+        with self._resource_lru_lock:
+            lru[uri] = resource
+            lru.move_to_end(uri)
+            if len(lru) > max_size:
+                lru.popitem(last=False)
+
+    def _forget_resource(self, uri):
+        """Forget the resource with the given URI, as it has been deleted.
+        """
+        with self._resource_lru_lock:
+            self._resource_lru.pop(uri, None)
+        self._resource_cache.pop(uri, None)
+
     def get_metadata_graph(self, uri):
         """Return the metadata graph for the resource identified by uri
 
@@ -263,8 +350,15 @@ class Service(object):
         level = self._context_level - 1
         self._context_level = level
         if level == 0:
+            on_commit = self._on_commit
+            self._on_commit = OrderedDict()
             if typ is None:
                 self.store.commit()
+                for func in on_commit.values():
+                    try:
+                        func()
+                    except BaseException:
+                        LOG.exception("Error in on-commit callback")
             else:
                 self.store.rollback()
                 # we rollback *in case* the store supports it,
@@ -276,6 +370,24 @@ class Service(object):
                 # (at least, until all stores support rollback).
                 return False
 
+    def call_on_commit(self, key, func):
+        """I register `func` to be called when the current changes are commited.
+
+        :param key: a hashable value identifying the callback;
+                    if another callback was already registered with the same
+                    key, it is replaced (so that a given notification is only
+                    sent once per transaction)
+        :param func: a callable accepting no argument
+
+        If the changes are rolled back, `func` is never called.
+        If this service is not currently used as a context
+        (see `__enter__`:meth:), `func` is called immediately.
+        """
+        if self._context_level == 0:
+            func()
+        else:
+            self._on_commit[key] = func
+
 
 ################################################################
 #
@@ -383,10 +495,13 @@ class ILocalCore(ICore):
         :param resource:  the resource to be updated
 
         The following parameters only make sense when updating an existing
-        resource. They are *not* automatically set by `edit`:meth:, as they may
-        not be used. However, any implementation may set them by using
+        resource. They are set by `edit`:meth: when they are available at no
+        cost (see `~rdfrest.util.overlay_graph.OverlayGraph`:class:);
+        otherwise, any implementation may set them by using
         :func:`compute_added_and_removed` and should therefore pass them along
-        the `super` calls.
+        the `super` calls. Implementations should use
+        :func:`check_delta_only` to decide whether they can only check the
+        triples that were added or removed.
 
         :param added:     if not None, an RDF graph containg triples to be
                           added
@@ -866,42 +981,28 @@ class EditableCore(LocalCore):
         if self._graph.store.transaction_aware:
             editable = self._graph
         else:
-            editable = Graph(identifier=self.uri)
-            if not clear:
-                editable_add = editable.add
-                for triple in self._graph: 
-                    editable_add(triple)
+            # changes are recorded by the overlay, and only applied to
+            # self._graph once they have been checked
+            editable = OverlayGraph(self._graph)
 
         with self.service:
             try:
-                if clear and editable is self._graph:
+                if clear:
                     editable.remove((None, None, None))
                 yield editable
                 self.complete_new_graph(self.service, self.uri, parameters,
                                         editable, self)
+                if editable is self._graph:
+                    added = removed = None
+                else:
+                    added, removed = editable.added, editable.removed
                 diag = self.check_new_graph(self.service, self.uri, parameters,
-                                            editable, self)
+                                            editable, self, added, removed)
                 if not diag:
                     raise InvalidDataError(str(diag))
 
                 if not editable is self._graph:
-                    # we replace self._graph by editable
-                    # We assume that
-                    # * most triples between the two graphs are the same
-                    # * testing that a graph contains a triple is less
-                    #   costly than adding it or removing it (which involves
-                    #   updating several indexes -- this is verified by
-                    #   IOMemory, and roughly so by Sleepycat)
-                    # so the following should more efficient than simply
-                    # emptying self_graph and then filling it with
-                    # editable_graph
-                    g = self._graph
-                    g_remove = g.remove
-                    e_contains = editable.__contains__
-                    for triple in g:
-                        if not e_contains(triple):
-                            g_remove(triple)
-                    g.addN( (s, p, o, g) for s, p, o in editable )
+                    editable.apply()
                 # alter _edit_context so that ack_edit can embed an edit ctxt:
                 self._edit_context = (True, parameters)
                 self.ack_edit(parameters, prepared)
@@ -910,6 +1011,25 @@ class EditableCore(LocalCore):
 
 
 
+#: If True, :func:`check_delta_only` always returns False,
+#: so that implementations of `ILocalCore.check_new_graph`:meth:
+#: check the whole new graph, even when only a few triples have changed.
+#: This is slower, but may be useful for debugging.
+CHECK_WHOLE_GRAPH = False
+
+def check_delta_only(resource, added, removed):
+    """I tell whether `ILocalCore.check_new_graph`:meth: can check only the
+    triples that were added or removed, rather than the whole new graph.
+
+    This assumes that the current state of `resource` is valid, so
+    constraints involving no added or removed triple do not need to be
+    checked again.
+
+    See also `CHECK_WHOLE_GRAPH`:data:.
+    """
+    return (resource is not None  and  added is not None
+            and  removed is not None  and  not CHECK_WHOLE_GRAPH)
+
 def compute_added_and_removed(new_graph, old_graph, added=None, removed=None):
     """I compute the graphs of added triples and of removed triples.
 
@@ -1003,9 +1123,8 @@ def _mark_as_deleted(resource):
     If `__debug__` is set, I will further memorize the stack when this method
     was called, so that debugging is made easier.
     """
-    srvc_rsrc_cache = resource.service._resource_cache #pylint: disable=W0212
-    del srvc_rsrc_cache[resource.uri]
-    
+    resource.service._forget_resource(resource.uri) #pylint: disable=W0212
+
     resource.__dict__.clear()
     resource.__class__ = _DeletedCore
     if __debug__:
@@ -30,7 +30,8 @@ from rdflib import BNode, Graph, Literal, RDF, URIRef, XSD
 
 from ..exceptions import InvalidDataError
 from ..util import cache_result, check_new, Diagnosis, parent_uri, replace_node_dense
-from .local import compute_added_and_removed, ILocalCore, NS as RDFREST
+from .local import check_delta_only, compute_added_and_removed, ILocalCore, \
+    NS as RDFREST
 
 
 LOG = getLogger(__name__)
@@ -63,6 +64,24 @@ class BookkeepingMixin(ILocalCore):
         # unused arg `parameter` #pylint: disable=W0613
         yield str(self.metadata.value(self.uri, RDFREST.etag))
 
+    def get_representation_etag(self, parameters=None):
+        """I return an etag identifying my representations for `parameters`.
+
+        This is used by `rdfrest.http_server.RepresentationCache`:class:.
+        The returned etag must change whenever the representation of this
+        resource with the given parameters changes.
+        If no such etag can be determined without computing the
+        representation, None is returned and the representation is not cached.
+
+        This implementation returns my (first) etag when no parameter is given,
+        and None otherwise, as parameters may change the representation in
+        ways that my etag does not account for.
+        Subclasses may override this.
+        """
+        if parameters:
+            return None
+        return next(iter(self.iter_etags(None)), None)
+
     @property
     def last_modified(self):
         """I return the time when this resource was last modified.
@@ -594,12 +613,27 @@ class WithCardinalityMixin(ILocalCore):
                         resource=None, added=None, removed=None):
         """I overrides :meth:`.local.ILocalCore.check_new_graph` to
         check the cardinality constraints.
+
+        When updating a resource, only the constraints on properties
+        that were added or removed are checked
+        (see :func:`.local.check_delta_only`).
         """
         diag = super(WithCardinalityMixin, cls).check_new_graph(
             service, uri, parameters, new_graph, resource, added, removed)
 
+        if check_delta_only(resource, added, removed):
+            touched_in = set()
+            touched_out = set()
+            for graph in (added, removed):
+                touched_in.update(p for _, p in graph.subject_predicates(uri))
+                touched_out.update(p for p, _ in graph.predicate_objects(uri))
+        else:
+            touched_in = touched_out = None
+
         new_graph_subjects = new_graph.subjects
         for p, minc, maxc in cls.__get_cardinality_in():
+            if touched_in is not None and p not in touched_in:
+                continue
             nbp = len(list(new_graph_subjects(p, uri)))
             if minc is not None and nbp < minc:
                 diag.append("Property <%s> to <%s> should have at least %s "
@@ -612,6 +646,8 @@ class WithCardinalityMixin(ILocalCore):
 
         new_graph_objects = new_graph.objects
         for p, minc, maxc in cls.__get_cardinality_out():
+            if touched_out is not None and p not in touched_out:
+                continue
             nbp = len(list(new_graph_objects(uri, p)))
             if minc is not None and nbp < minc:
                 diag.append("Property <%s> of <%s> should have at least "
@@ -680,16 +716,33 @@ class WithTypedPropertiesMixin(ILocalCore):
     def check_new_graph(cls, service, uri, parameters, new_graph,
                         resource=None, added=None, removed=None):
         """I overrides :meth:`.local.ILocalCore.check_new_graph` to
-        check the cardinality constraints.
+        check the type constraints.
+
+        When updating a resource, only the added values are checked,
+        as well as the values that lost their required ``rdf:type``
+        (see :func:`.local.check_delta_only`).
         """
         diag = super(WithTypedPropertiesMixin, cls).check_new_graph(
             service, uri, parameters, new_graph, resource, added, removed)
 
-        new_graph_objects = new_graph.objects
+        if check_delta_only(resource, added, removed):
+            def new_graph_objects(subj, prop, vtype=None):
+                "iter over the added values, and those whose type was removed"
+                ret = set(added.objects(subj, prop))
+                if vtype:
+                    ret.update(
+                        obj for obj in removed.subjects(RDF.type, vtype)
+                        if (subj, prop, obj) in new_graph
+                    )
+                return ret
+        else:
+            def new_graph_objects(subj, prop, _vtype=None):
+                "iter over all values"
+                return new_graph.objects(subj, prop)
         in_new_graph = new_graph.__contains__
         for prop, ntype, vtype in cls.__get_typed_prop():
             if ntype == "uri":
-                for obj in new_graph_objects(uri, prop):
+                for obj in new_graph_objects(uri, prop, vtype):
                     if not (isinstance(obj, URIRef) or isinstance(obj, BNode)):
                         diag.append("Propery <%s> of <%s> expects resources, "
                                     "got literal %s"
@@ -19,8 +19,10 @@
 I implement a WSGI-based HTTP server
 wrapping a given :class:`.cores.local.Service`.
 """
-from bisect import insort
+from bisect import bisect_right, insort
+from collections import OrderedDict
 from contextlib import closing
+from threading import RLock
 from time import time
 
 from pyparsing import ParseException
@@ -96,6 +98,9 @@ class HttpFrontend(object):
           accepts to serve or to consume.
         - max_triples (int): the maximum number of triples that this server
           accepts to serve or to consume.
+        - representation_cache_size (int): the maximum number of bytes of
+          serialized representations kept in memory
+          (see `RepresentationCache`:class:); 0 disables the cache.
         """
         # __init__ not called in mixin #pylint: disable=W0231
         # NB: strange, pylint should recognized it is a mixin...
@@ -124,6 +129,13 @@ class HttpFrontend(object):
         else:
             self.max_triples = None
 
+        cache_size = service_config.getint('server',
+                                           'representation-cache-size')
+        if cache_size > 0:
+            self.representation_cache = RepresentationCache(cache_size)
+        else:
+            self.representation_cache = None
+
         self.reset_connection = \
             service_config.getboolean('server', 'reset-connection')
 
@@ -240,9 +252,48 @@ class HttpFrontend(object):
             # else we can be certain that the serializer exists, so:
             serializer, ext = get_serializer_by_content_type(ctype, rdf_type)
 
-        # get graph and redirect if needed
         cache_bypass = params.pop("_", None) # dummy param used by JQuery to invalidate cache
-        graph = resource.get_state(params or None)
+
+        # answer conditional requests without computing the state, if possible
+        if request.if_none_match:
+            response = self._check_if_none_match(request, resource, params,
+                                                 ctype, headerlist)
+            if response is not None:
+                self._set_cache_control(response, cache_bypass)
+                return response
+
+        # serve cached representation if available
+        cache = self.representation_cache
+        cache_key = None
+        if cache is not None:
+            get_representation_etag = getattr(resource,
+                                              "get_representation_etag", None)
+            if get_representation_etag is not None:
+                etag = get_representation_etag(params or None)
+                if etag is not None:
+                    cache_key = RepresentationCache.make_key(resource.uri,
+                                                             params, ctype,
+                                                             etag)
+                    cached = cache.get(cache_key)
+                    if cached is not None:
+                        cached_headerlist, body = cached
+                        response = MyResponse(headerlist=cached_headerlist,
+                                              body=body)
+                        self._set_cache_control(response, cache_bypass)
+                        return response
+
+        # get graph and redirect if needed
+        get_streamed_state = getattr(resource, "get_streamed_state", None)
+        if (get_streamed_state is not None
+            and getattr(serializer, "streaming", False)
+            and self.max_triples is None
+            and not self.reset_connection):
+            # the number of triples can not be checked on streamed graphs;
+            # with reset_connection, the store is closed before the body
+            # is produced, so it can not be streamed
+            graph = get_streamed_state(params or None)
+        else:
+            graph = resource.get_state(params or None)
         redirect = getattr(graph, "redirected_to", None)
         if redirect is not None:
             return self.issue_error(303, request, None,
@@ -291,23 +342,74 @@ class HttpFrontend(object):
         app_iter = serializer(graph, resource)
         if self.max_bytes is not None:
             # TODO LATER find a better way to guess the number of bytes?
-            payload = b"".join(app_iter)
-            if len(payload) >  self.max_bytes:
-                return self.issue_error(403, request, resource,
-                                        "max_bytes (%s) was exceeded"
-                                        % self.max_bytes )
-            app_iter = [payload]
+            # we stop serializing as soon as the limit is exceeded,
+            # so at most max_bytes are kept in memory
+            payload = []
+            size = 0
+            for chunk in app_iter:
+                size += len(chunk)
+                if size > self.max_bytes:
+                    close = getattr(app_iter, "close", None)
+                    if close is not None:
+                        close()
+                    return self.issue_error(403, request, resource,
+                                            "max_bytes (%s) was exceeded"
+                                            % self.max_bytes )
+                payload.append(chunk)
+            app_iter = payload
+            if cache_key is not None:
+                cache.put(cache_key, list(headerlist), b"".join(payload))
+        elif cache_key is not None:
+            app_iter = cache.caching_iter(cache_key, list(headerlist),
+                                          app_iter)
 
         response = MyResponse(headerlist=headerlist, app_iter=app_iter)
+        self._set_cache_control(response, cache_bypass)
+        return response
 
+    def _check_if_none_match(self, request, resource, params, ctype,
+                             headerlist):
+        """I return a 304 response if `request` has an ``If-None-Match``
+        header field matching the current etags of `resource`, else None.
+
+        The current etags are obtained with the ``iter_etags`` method of
+        `resource`, if any, which is usually much cheaper than computing its
+        state. Note that, for some parameters, ``iter_etags`` may not provide
+        all the etags of the representation; in that case, the state is
+        computed anyway, and the ``If-None-Match`` header field is checked
+        afterwards against the etags of the actual representation.
+        """
+        iter_etags = getattr(resource, "iter_etags", None)
+        if iter_etags is None:
+            return None
+        if params:
+            # check parameters on a copy, as checking may convert them
+            check_parameters = getattr(resource, "check_parameters", None)
+            if check_parameters is None:
+                return None
+            params = dict(params)
+            check_parameters(list(params), params, "get_state")
+        etag_list = [ taint_etag(i, ctype) for i in iter_etags(params or None) ]
+        for etag in etag_list:
+            if etag in request.if_none_match:
+                break
+        else:
+            return None
+        headerlist = list(headerlist)
+        headerlist.append(("etag", 'W/"%s"' % etag))
+        headerlist.append(("x-etags",
+                           " ".join('W/"%s"' % i for i in etag_list)))
+        return MyResponse(status=304, headerlist=headerlist, request=request)
+
+    def _set_cache_control(self, response, cache_bypass):
+        """I set the cache-control header of a response to a GET request.
+        """
         if cache_bypass:
             response.cache_control = "no-cache"
         else:
             if self.cache_control:
                 response.cache_control = self.cache_control
 
-        return response
-
 
     def http_head(self, request, resource):
         """Process a HEAD request on the given resource.
@@ -473,6 +575,129 @@ Service info
         return res
 
 
+class RepresentationCache(object):
+    """I keep recently served representations in memory,
+    so that repeated GET requests can be answered without serializing
+    (nor even retrieving) the state of the resource again.
+
+    Entries are keyed by the URI of the resource, the query parameters,
+    the content-type and the etag returned by the resource's
+    ``get_representation_etag`` method.
+    As that etag changes whenever the representation changes,
+    outdated entries are never served;
+    they are eventually evicted in least-recently-used order.
+
+    :param max_bytes: the maximum number of bytes of representations
+                      that I keep in memory.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        # larger representations would evict too many other entries
+        self.max_entry_bytes = max_bytes // 4
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def make_key(uri, params, ctype, etag):
+        """I build a cache key from the given elements of a GET request.
+        """
+        if params:
+            params = frozenset(
+                (key, tuple(val) if isinstance(val, list) else val)
+                for key, val in params.items()
+            )
+        else:
+            params = None
+        return (str(uri), params, ctype, etag)
+
+    def get(self, key):
+        """I return the (headerlist, body) cached for key, or None.
+        """
+        with self._lock:
+            ret = self._entries.get(key)
+            if ret is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(key)
+            return ret
+
+    def put(self, key, headerlist, body):
+        """I store a representation (headerlist and body) for key.
+
+        Representations larger than `max_entry_bytes` are ignored.
+        """
+        size = len(body)
+        if size > self.max_entry_bytes:
+            return
+        entries = self._entries
+        with self._lock:
+            old = entries.pop(key, None)
+            if old is not None:
+                self.size -= len(old[1])
+            entries[key] = (headerlist, body)
+            self.size += size
+            while self.size > self.max_bytes:
+                _, (_, evicted) = entries.popitem(last=False)
+                self.size -= len(evicted)
+
+    def caching_iter(self, key, headerlist, app_iter):
+        """I iter over app_iter,
+        and store the representation for key once it is complete.
+
+        I give up caching (but keep iterating) as soon as the representation
+        exceeds `max_entry_bytes`.
+        """
+        chunks = []
+        size = 0
+        for chunk in app_iter:
+            if chunks is not None:
+                size += len(chunk)
+                if size > self.max_entry_bytes:
+                    chunks = None
+                else:
+                    chunks.append(chunk)
+            yield chunk
+        if chunks is not None:
+            self.put(key, headerlist, b"".join(chunks))
+
+    def clear(self):
+        """I empty this cache and reset its statistics.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.size = 0
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """I return a dict of statistics about this cache.
+
+        The keys are ``entries``, ``size``, ``max_bytes``, ``hits``,
+        ``misses`` and ``hit_rate``
+        (between 0 and 1, or None if no lookup was performed yet).
+        """
+        with self._lock:
+            hits = self.hits
+            misses = self.misses
+            total = hits + misses
+            return {
+                "entries": len(self._entries),
+                "size": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": float(hits) / total if total else None,
+            }
+
+
 def taint_etag(etag, ctype):
     """I taint etag with the given content-type.
 
@@ -489,6 +714,7 @@ def etag_variants(etags):
     """
     for etag in etags:
         yield "%s-gzip" % etag # Apache with gzip encoding
+        yield "%s-br" % etag # Apache with brotli encoding
 
 class _TooManyTriples(Exception):
     """This exception class is used to abort edit context during PUT.
@@ -532,7 +758,10 @@ def register_middleware(level, middleware, quiet=False):
             raise ValueError("middleware already registered")
         else:
             return
-    insort(_MIDDLEWARE_REGISTRY, (level, middleware))
+    # middlewares with the same level are kept in registration order
+    levels = [ i[0] for i in _MIDDLEWARE_REGISTRY ]
+    _MIDDLEWARE_REGISTRY.insert(bisect_right(levels, level),
+                                (level, middleware))
     global _MIDDLEWARE_STACK_VERSION
     _MIDDLEWARE_STACK_VERSION += 1
 
@@ -30,6 +30,8 @@ Finally, a numer of default `namespace prefixes <bind_prefix>`:func` can be set.
 They will be shared with all registered serializers (but some third-party
 serializers may not honnor them).
 """
+from itertools import chain
+
 from rdflib import Graph, RDF, RDFS, URIRef
 from rdflib.plugins.serializers.nt import _nt_row
 
@@ -127,6 +129,32 @@ def get_serializer_by_extension(extension, rdf_type=None):
                 return ret
     return _SREGISRIES[None].get_by_extension(extension)
 
+def streaming_serializer(func):
+    """I decorate a serializer to declare that it supports streamed graphs.
+
+    A streamed graph is a graph with an additional ``iter_chunks`` method,
+    iterating over other graphs (the chunks). The represented graph is the
+    union of the streamed graph and all its chunks.
+    Streaming serializers are expected to process one chunk at a time,
+    so that the whole graph never has to be held in memory.
+
+    :see-also: `iter_graph_chunks`:func:
+    """
+    func.streaming = True
+    return func
+
+def iter_graph_chunks(graph):
+    """I iter over the chunks of a (possibly streamed) graph.
+
+    The graph itself is yielded first, followed by its chunks if it is a
+    streamed graph (see `streaming_serializer`:func:).
+    """
+    yield graph
+    iter_chunks = getattr(graph, "iter_chunks", None)
+    if iter_chunks is not None:
+        for chunk in iter_chunks():
+            yield chunk
+
 def bind_prefix(prefix, namespace_uri):
     """I associate a namespace with a prefix for all registered serializers.
     """
@@ -177,13 +205,20 @@ def serialize_rdf_xml(graph, resource, bindings=None):
 @register_serializer("text/x-turtle",        None,   20)
 @register_serializer("application/turtle",   None,   20)
 @register_serializer("application/x-turtle", None,   20)
+@streaming_serializer
 def serialize_turtle(graph, uri, bindings=None):
     """I serialize an RDF graph as Turtle.
 
     See `serialize_rdf_xml` for prototype documentation.
+
+    Streamed graphs are serialized one chunk at a time,
+    each chunk repeating the prefix declarations
+    (which is allowed by the Turtle syntax).
     """
     bindings = bindings or dict(_NAMESPACES)
-    return _serialize_with_rdflib("n3", graph, bindings, uri)
+    return chain.from_iterable(
+        _serialize_with_rdflib("n3", chunk, bindings, uri)
+        for chunk in iter_graph_chunks(graph))
 
 @wrap_generator_exceptions(SerializeError)
 def _serialize_with_rdflib(rdflib_format, graph, bindings, base_uri):
@@ -203,6 +238,7 @@ def _serialize_with_rdflib(rdflib_format, graph, bindings, base_uri):
 
 @register_serializer("text/nt",    "nt",  40)
 @register_serializer("text/plain", "txt", 20)
+@streaming_serializer
 @wrap_generator_exceptions(SerializeError)
 def serialize_ntriples(graph, uri, bindings=None):
     """I serialize an RDF graph as N-Triples.
@@ -215,8 +251,9 @@ def serialize_ntriples(graph, uri, bindings=None):
     # individually; this allows WSGI host to send chuncked content.
 
     # We use yield to prevent the serialization to happen if a 304 is returned
-    for triple in graph:
-        yield _nt_row(triple).encode("ascii", "replace")
+    for chunk in iter_graph_chunks(graph):
+        for triple in chunk:
+            yield _nt_row(triple).encode("ascii", "replace")
 
 @register_serializer("application/ld+json",  "jsonld", 30)
 @register_serializer("application/json",     "json",   20)
@@ -314,6 +314,8 @@ def wrap_generator_exceptions(extype):
             try:
                 for i in func(*args, **kw):
                     yield i
+            except GeneratorExit:
+                raise # the generator is being closed, not failing
             except BaseException as ex:
                 raise extype(ex)
         return wrapped
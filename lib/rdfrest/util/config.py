@@ -55,6 +55,7 @@ def get_service_configuration(configfile_handler=None):
     config.set('server', 'force-ipv4', 'false')
     config.set('server', 'max-bytes', '-1')
     config.set('server', 'max-triples', '-1')
+    config.set('server', 'representation-cache-size', '16777216')
     config.set('server', 'cors-allow-origin', '')
     config.set('server', 'reset-connection', 'false')
     config.set('server', 'send-traceback', 'false')
@@ -74,6 +75,7 @@ def get_service_configuration(configfile_handler=None):
     config.add_section('rdf_database')
     config.set('rdf_database', 'repository', '')
     config.set('rdf_database', 'force-init', 'false')
+    config.set('rdf_database', 'resource-cache-size', '256')
 
     config.add_section('logging')
     config.set('logging', 'loggers', '')
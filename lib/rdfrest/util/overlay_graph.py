@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+#    This file is part of RDF-REST <http://champin.net/2012/rdfrest>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    RDF-REST is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RDF-REST is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with RDF-REST.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I implement OverlayGraph,
+a copy-on-write view of another graph.
+
+All changes made to an `OverlayGraph`:class: are recorded
+as two graphs of `~OverlayGraph.added`:attr: and `~OverlayGraph.removed`:attr:
+triples, while the underlying graph is left untouched,
+until `~OverlayGraph.apply`:meth: is called.
+Reading the overlay graph returns the triples of the underlying graph,
+minus the removed triples, plus the added triples.
+
+This allows to edit a copy of a large graph without actually copying it,
+and to know exactly what has changed, without comparing the two graphs.
+"""
+from rdflib import Graph
+from rdflib.store import Store
+
+class OverlayGraph(Graph):
+    """A copy-on-write view of `base`.
+
+    :param base: the underlying graph
+    :type  base: rdflib.Graph
+    """
+
+    def __init__(self, base):
+        super(OverlayGraph, self).__init__(_OverlayStore(base),
+                                           identifier=base.identifier)
+
+    @property
+    def added(self):
+        """The triples that are in this graph but not in the underlying graph.
+        """
+        return self.store.added
+
+    @property
+    def removed(self):
+        """The triples that are in the underlying graph but not in this graph.
+        """
+        return self.store.removed
+
+    def apply(self):
+        """Apply the changes made to this graph to the underlying graph.
+
+        Afterwards, this graph is still usable,
+        and its `added`:attr: and `removed`:attr: graphs are empty.
+        """
+        self.store.apply()
+
+
+class _OverlayStore(Store):
+    """The store used by `OverlayGraph`:class:.
+    """
+    # pylint: disable=W0221
+    #   arguments number differ from overridden method
+
+    # required by the N3 parser; contexts are actually ignored,
+    # and quoted graphs are not supported
+    context_aware = True
+    formula_aware = True
+
+    def __init__(self, base):
+        super(_OverlayStore, self).__init__()
+        self.base = base
+        self.added = Graph()
+        self.removed = Graph()
+        self.namespaces_graph = Graph()
+
+    def add(self, triple, context, quoted=False):
+        if quoted:
+            raise ValueError("OverlayGraph does not support quoted graphs")
+        if triple in self.base:
+            self.removed.remove(triple)
+        else:
+            self.added.add(triple)
+
+    def remove(self, triple_pattern, context=None):
+        added = self.added
+        removed_add = self.removed.add
+        for triple in list(self.base.triples(triple_pattern)):
+            removed_add(triple)
+        added.remove(triple_pattern)
+
+    def triples(self, triple_pattern, context=None):
+        removed = self.removed
+        if len(removed) == 0:
+            for triple in self.base.triples(triple_pattern):
+                yield triple, iter(())
+        else:
+            for triple in self.base.triples(triple_pattern):
+                if triple not in removed:
+                    yield triple, iter(())
+        for triple in self.added.triples(triple_pattern):
+            yield triple, iter(())
+
+    def __len__(self, context=None):
+        return len(self.base) - len(self.removed) + len(self.added)
+
+    def apply(self):
+        """I apply the recorded changes to the underlying graph.
+        """
+        base = self.base
+        base_remove = base.remove
+        for triple in self.removed:
+            base_remove(triple)
+        base.addN( (s, p, o, base) for s, p, o in self.added )
+        self.added = Graph()
+        self.removed = Graph()
+
+    # namespace bindings are kept in a separate graph,
+    # so that they are not altered in the underlying graph
+
+    def bind(self, prefix, namespace):
+        self.namespaces_graph.store.bind(prefix, namespace)
+
+    def prefix(self, namespace):
+        return self.namespaces_graph.store.prefix(namespace)
+
+    def namespace(self, prefix):
+        return self.namespaces_graph.store.namespace(prefix)
+
+    def namespaces(self):
+        return self.namespaces_graph.store.namespaces()
@@ -0,0 +1,120 @@
+#    This file is part of RDF-REST <http://champin.net/2012/rdfrest>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    RDF-REST is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RDF-REST is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with RDF-REST.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I provide a cache of prepared SPARQL queries.
+
+Parsing and translating a SPARQL query into the algebra used by rdflib
+is costly, and can dominate the time spent evaluating a query,
+especially when the same query is evaluated many times on small graphs.
+`prepare_query`:func: returns the same prepared query for the same query
+string, so that this work is done only once.
+
+In order to benefit from the cache,
+variable parts of a query (URIs, timestamps...)
+should not be included in the query string,
+but passed as ``initBindings`` to `rdflib.Graph.query`:meth:.
+"""
+from collections import OrderedDict
+from threading import RLock
+
+import rdflib.plugins.sparql.processor as sparql_processor
+
+DEFAULT_MAXSIZE = 512
+
+class QueryCache(object):
+    """I am a least-recently-used cache of prepared SPARQL queries.
+
+    :param maxsize: the maximum number of prepared queries that I keep
+    """
+
+    def __init__(self, maxsize=DEFAULT_MAXSIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._queries = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        return len(self._queries)
+
+    def prepare(self, query_str, init_ns=None, base=None):
+        """I return the prepared version of the given query string.
+
+        The parameters have the same meaning as in
+        `rdflib.plugins.sparql.processor.prepareQuery`:func:.
+        """
+        if init_ns:
+            key = (query_str, tuple(sorted(init_ns.items())), base)
+        else:
+            key = (query_str, (), base)
+        queries = self._queries
+        with self._lock:
+            ret = queries.get(key)
+            if ret is not None:
+                self.hits += 1
+                queries.move_to_end(key)
+                return ret
+            self.misses += 1
+        # prepare outside the lock, as it may take some time;
+        # we look up prepareQuery at each call,
+        # as it may have been monkey-patched (see ktbs.plugins.virtuoso_sparql)
+        ret = sparql_processor.prepareQuery(query_str, init_ns or {}, base)
+        with self._lock:
+            queries[key] = ret
+            while len(queries) > self.maxsize:
+                queries.popitem(last=False)
+        return ret
+
+    def clear(self):
+        """I empty this cache and reset its statistics.
+        """
+        with self._lock:
+            self._queries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self):
+        """I return a dict of statistics about this cache.
+
+        The keys are ``size``, ``maxsize``, ``hits``, ``misses`` and
+        ``hit_rate`` (between 0 and 1, or None if no query was prepared yet).
+        """
+        with self._lock:
+            hits = self.hits
+            misses = self.misses
+            total = hits + misses
+            return {
+                "size": len(self._queries),
+                "maxsize": self.maxsize,
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": float(hits) / total if total else None,
+            }
+
+_QUERY_CACHE = QueryCache()
+
+def get_query_cache():
+    """I return the process-wide `QueryCache`:class:.
+    """
+    return _QUERY_CACHE
+
+def prepare_query(query_str, init_ns=None, base=None):
+    """I return the prepared version of the given query string,
+    using the process-wide `QueryCache`:class:.
+    """
+    return _QUERY_CACHE.prepare(query_str, init_ns, base)
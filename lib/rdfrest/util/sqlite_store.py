@@ -0,0 +1,334 @@
+# -*- coding: utf-8 -*-
+
+#    This file is part of RDF-REST <http://champin.net/2012/rdfrest>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    RDF-REST is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RDF-REST is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with RDF-REST.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I implement an rdflib store based on SQLite.
+
+The store is registered in rdflib under the name ``SQLite``;
+its configuration string is the path of the database file.
+A repository ending with ``.sqlite`` is also interpreted as an SQLite store
+by `rdfrest.cores.local.Service`:class:.
+
+The database uses the WAL journal mode,
+so that several processes can read it while another one is writing it.
+Changes are only visible to other processes once they are commited,
+which `rdfrest.cores.local.Service`:class: does when exiting its outermost
+context.
+
+Every term is stored once in the ``terms`` table,
+and quads are stored as four term ids in the ``quads`` table,
+indexed by (graph, subject, predicate, object)
+and by (graph, predicate, object, subject).
+The latter supports the most frequent access patterns of kTBS,
+such as looking up obsels by their end timestamp.
+
+Note that namespace bindings are not persisted, but kept in memory.
+"""
+from sqlite3 import connect
+from threading import RLock
+
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.store import Store, VALID_STORE
+
+_SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS terms ("
+    " id INTEGER PRIMARY KEY,"
+    " kind TEXT NOT NULL," # U: URI, B: bnode, L: literal
+    " value TEXT NOT NULL,"
+    " datatype TEXT NOT NULL," # '' if none
+    " lang TEXT NOT NULL," # '' if none
+    " UNIQUE (value, kind, datatype, lang))",
+    "CREATE TABLE IF NOT EXISTS quads ("
+    " g INTEGER NOT NULL,"
+    " s INTEGER NOT NULL,"
+    " p INTEGER NOT NULL,"
+    " o INTEGER NOT NULL,"
+    " PRIMARY KEY (g, s, p, o)) WITHOUT ROWID",
+    "CREATE INDEX IF NOT EXISTS quads_gpos ON quads (g, p, o, s)",
+    "CREATE INDEX IF NOT EXISTS quads_spog ON quads (s, p, o, g)",
+]
+
+#: The maximum number of terms kept in memory by each store
+TERM_CACHE_SIZE = 100000
+
+class SQLiteStore(Store):
+    """An rdflib store backed by an SQLite database.
+
+    :param configuration: the path of the database file
+    """
+    # pylint: disable=W0221
+    #   arguments number differ from overridden method
+
+    # formula_aware is required by the N3 parser,
+    # but quoted graphs are actually not supported
+    context_aware = True
+    formula_aware = True
+    graph_aware = False
+    # NB: although this store supports rollback,
+    # it does not claim to be transaction aware,
+    # as rdfrest uses that flag to edit resources in place,
+    # while it can check changes more efficiently otherwise.
+    transaction_aware = False
+
+    def __init__(self, configuration=None, identifier=None):
+        self._connection = None
+        self._lock = RLock()
+        self._ids = {}
+        self._terms = {}
+        self._namespaces = {}
+        self._prefixes = {}
+        super(SQLiteStore, self).__init__(configuration, identifier)
+
+    def open(self, configuration, create=False):
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+            connection = connect(configuration, timeout=60,
+                                 check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            for statement in _SCHEMA:
+                connection.execute(statement)
+            connection.commit()
+            self._connection = connection
+            self._clear_cache()
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction=False):
+        with self._lock:
+            if self._connection is not None:
+                if commit_pending_transaction:
+                    self._connection.commit()
+                else:
+                    self._connection.rollback()
+                self._connection.close()
+                self._connection = None
+
+    def commit(self):
+        with self._lock:
+            self._connection.commit()
+
+    def rollback(self):
+        with self._lock:
+            self._connection.rollback()
+            # some cached ids may not exist anymore
+            self._clear_cache()
+
+    # RDF API
+
+    def add(self, triple, context, quoted=False):
+        if quoted:
+            raise ValueError("SQLiteStore does not support quoted graphs")
+        self.addN([triple + (context,)])
+
+    def addN(self, quads):
+        with self._lock:
+            get_id = self._get_id
+            self._connection.executemany(
+                "INSERT OR IGNORE INTO quads (g, s, p, o) VALUES (?, ?, ?, ?)",
+                ( (get_id(_identifier(c), True), get_id(s, True),
+                   get_id(p, True), get_id(o, True))
+                  for s, p, o, c in quads )
+            )
+
+    def remove(self, triple_pattern, context=None):
+        with self._lock:
+            where, args = self._make_where(triple_pattern, context)
+            if where is not None:
+                self._connection.execute("DELETE FROM quads" + where, args)
+
+    def triples(self, triple_pattern, context=None):
+        with self._lock:
+            where, args = self._make_where(triple_pattern, context)
+            if where is None:
+                return
+            if context is not None:
+                rows = self._connection.execute(
+                    "SELECT s, p, o FROM quads" + where, args).fetchall()
+            else:
+                rows = self._connection.execute(
+                    "SELECT s, p, o, group_concat(g) FROM quads" + where
+                    + " GROUP BY s, p, o", args).fetchall()
+            get_term = self._get_term
+            if context is not None:
+                results = [ ((get_term(s), get_term(p), get_term(o)), None)
+                            for s, p, o in rows ]
+            else:
+                results = [ ((get_term(s), get_term(p), get_term(o)),
+                             [ int(g) for g in gids.split(",") ])
+                            for s, p, o, gids in rows ]
+        for triple, gids in results:
+            if gids is None:
+                yield triple, iter((context,))
+            else:
+                yield triple, self._iter_contexts(gids)
+
+    def __len__(self, context=None):
+        with self._lock:
+            if context is not None:
+                where, args = self._make_where((None, None, None), context)
+                if where is None:
+                    return 0
+                query = "SELECT COUNT(*) FROM quads" + where
+            else:
+                query = "SELECT COUNT(*) FROM " \
+                        "(SELECT DISTINCT s, p, o FROM quads)"
+                args = ()
+            return self._connection.execute(query, args).fetchone()[0]
+
+    def contexts(self, triple=None):
+        with self._lock:
+            where, args = self._make_where(triple or (None, None, None), None)
+            if where is None:
+                return
+            gids = [ row[0] for row in self._connection.execute(
+                "SELECT DISTINCT g FROM quads" + where, args) ]
+        for graph in self._iter_contexts(gids):
+            yield graph
+
+    # namespace bindings (in memory only)
+
+    def bind(self, prefix, namespace):
+        old_namespace = self._namespaces.get(prefix)
+        if old_namespace is not None:
+            self._prefixes.pop(old_namespace, None)
+        old_prefix = self._prefixes.get(namespace)
+        if old_prefix is not None:
+            self._namespaces.pop(old_prefix, None)
+        self._namespaces[prefix] = namespace
+        self._prefixes[namespace] = prefix
+
+    def prefix(self, namespace):
+        return self._prefixes.get(namespace)
+
+    def namespace(self, prefix):
+        return self._namespaces.get(prefix)
+
+    def namespaces(self):
+        for prefix, namespace in list(self._namespaces.items()):
+            yield prefix, namespace
+
+    # private methods
+
+    def _make_where(self, triple_pattern, context):
+        """I return the WHERE clause and its arguments for a quad pattern.
+
+        If one of the terms of the pattern is not in the database,
+        the pattern can not match, and I return (None, None).
+        """
+        conditions = []
+        args = []
+        s, p, o = triple_pattern
+        for column, term in (("g", _identifier(context)),
+                             ("s", s), ("p", p), ("o", o)):
+            if term is not None:
+                term_id = self._get_id(term)
+                if term_id is None:
+                    return None, None
+                conditions.append("%s = ?" % column)
+                args.append(term_id)
+        if conditions:
+            return " WHERE " + " AND ".join(conditions), args
+        else:
+            return "", args
+
+    def _get_id(self, term, create=False):
+        """I return the id of a term, or None if it is not in the database.
+
+        If `create` is True, the term is added to the database if needed.
+        """
+        ret = self._ids.get(term)
+        if ret is None:
+            key = _term_to_row(term)
+            row = self._connection.execute(
+                "SELECT id FROM terms WHERE value = ? AND kind = ? "
+                "AND datatype = ? AND lang = ?", key).fetchone()
+            if row is not None:
+                ret = row[0]
+            elif create:
+                ret = self._connection.execute(
+                    "INSERT INTO terms (value, kind, datatype, lang) "
+                    "VALUES (?, ?, ?, ?)", key).lastrowid
+            else:
+                return None
+            self._cache(term, ret)
+        return ret
+
+    def _get_term(self, term_id):
+        """I return the term with the given id.
+        """
+        ret = self._terms.get(term_id)
+        if ret is None:
+            row = self._connection.execute(
+                "SELECT value, kind, datatype, lang FROM terms WHERE id = ?",
+                (term_id,)).fetchone()
+            ret = _row_to_term(row)
+            self._cache(ret, term_id)
+        return ret
+
+    def _iter_contexts(self, gids):
+        """I iter over the graphs with the given ids.
+        """
+        for gid in gids:
+            with self._lock:
+                identifier = self._get_term(gid)
+            yield Graph(self, identifier)
+
+    def _cache(self, term, term_id):
+        """I keep the id of a term in memory.
+        """
+        if len(self._ids) >= TERM_CACHE_SIZE:
+            self._clear_cache()
+        self._ids[term] = term_id
+        self._terms[term_id] = term
+
+    def _clear_cache(self):
+        """I forget all the term ids kept in memory.
+        """
+        self._ids.clear()
+        self._terms.clear()
+
+
+def _identifier(context):
+    """I return the identifier of a context (graph or identifier).
+    """
+    return getattr(context, "identifier", context)
+
+def _term_to_row(term):
+    """I convert a term to a (value, kind, datatype, lang) tuple.
+    """
+    if isinstance(term, Literal):
+        return (str(term), "L", str(term.datatype or ""), term.language or "")
+    elif isinstance(term, BNode):
+        return (str(term), "B", "", "")
+    else:
+        assert isinstance(term, URIRef), repr(term)
+        return (str(term), "U", "", "")
+
+def _row_to_term(row):
+    """I convert a (value, kind, datatype, lang) tuple to a term.
+    """
+    value, kind, datatype, lang = row
+    if kind == "L":
+        return Literal(value, lang=lang or None,
+                       datatype=datatype and URIRef(datatype) or None)
+    elif kind == "B":
+        return BNode(value)
+    else:
+        return URIRef(value)
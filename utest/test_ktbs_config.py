@@ -69,6 +69,16 @@ class TestkTBSCmdlineConfig(object):
         ktbs_config = parse_configuration_options(options)
         assert ktbs_config.getint('server', 'port') == 4567
 
+    def test_server_workers(self):
+        options, args = self.opt.parse_args(['ktbs'])
+        ktbs_config = parse_configuration_options(options)
+        assert ktbs_config.getint('server', 'workers') == 1
+
+        options, args = self.opt.parse_args(['ktbs',
+                                             '--workers=4'])
+        ktbs_config = parse_configuration_options(options)
+        assert ktbs_config.getint('server', 'workers') == 4
+
     def test_server_basepath(self):
         options, args = self.opt.parse_args(['ktbs',
                                              '--base-path=myktbsroot/'])
@@ -247,6 +257,15 @@ class TestkTBSFileConfig(object):
         ktbs_config = get_ktbs_configuration(fhandler)
         assert ktbs_config.getint('server', 'port') == 4444
 
+    def test_server_workers(self):
+        fhandler = StringIO()
+        fhandler.writelines(["[server]\n",
+                             "workers = 3\n"])
+        fhandler.seek(0)
+
+        ktbs_config = get_ktbs_configuration(fhandler)
+        assert ktbs_config.getint('server', 'workers') == 3
+
     def test_server_basepath(self):
         fhandler = StringIO()
         fhandler.writelines(["[server]\n",
@@ -57,9 +57,14 @@ class KtbsTestCase(object):
     def setup(self):
         ktbs_config = get_ktbs_configuration()
         ktbs_config.set('server', 'port', '12345')
+        self.configure(ktbs_config)
         self.service = KtbsService(ktbs_config)
         self.my_ktbs = self.service.get(self.service.root_uri, [KTBS.KtbsRoot])
 
+    def configure(self, ktbs_config):
+        """Override this to alter the configuration of the tested kTBS."""
+        pass
+
     def teardown(self):
         if self.service is not None:
             unregister_service(self.service)
@@ -420,6 +425,108 @@ class TestKtbs(KtbsTestCase):
         with assert_raises(InvalidDataError):
             created_homonymic = trace.post_graph(graph2)
 
+    def test_post_obsels_bulk(self):
+        base = self.my_ktbs.create_base()
+        model = base.create_model()
+        otype = model.create_obsel_type("#MyObsel")
+        rtype = model.create_relation_type("#MyRel", otype, otype)
+        trace = base.create_stored_trace(None, model, "1970-01-01T00:00:00Z",
+                                         "alice")
+        trace.create_obsel("o0", otype, 0)
+        graph = Graph()
+        graph.bulk = True # as set by ktbs.serpar.bulk_parser
+        obsels = [ BNode() for i in range(5) ]
+        obsels.append(URIRef("named", trace.uri))
+        # purposefully mix obsel order,
+        # to check whether bulk post is enforcing the monotonic order
+        for i in [3, 1, 5, 0, 4, 2]:
+            obs = obsels[i]
+            graph.add((obs, KTBS.hasTrace, trace.uri))
+            graph.add((obs, RDF.type, otype.uri))
+            graph.add((obs, KTBS.hasBegin, Literal(i+1)))
+            graph.add((obs, RDF.value, Literal("obs%s" % i)))
+            if i > 0:
+                graph.add((obs, rtype.uri, obsels[i-1]))
+        graph.add((obsels[2], KTBS.hasSubject, Literal("bob")))
+
+        created = trace.post_graph(graph)
+
+        assert len(created) == 6
+        assert created[5] == obsels[5]
+        assert len(set(created)) == 6
+        got = [ trace.get_obsel(uri) for uri in created ]
+        for i, obs in enumerate(got):
+            assert obs.begin == i+1
+            assert obs.end == i+1
+            assert obs.obsel_type == otype
+            assert obs.get_attribute_value(RDF.value) == "obs%s" % i
+            if i > 0:
+                assert obs.list_related_obsels(rtype) == [got[i-1]]
+        assert got[2].subject == Literal("bob")
+        assert got[3].subject == Literal("alice")
+        assert len(trace.obsels) == 7
+
+    def test_post_obsels_bulk_non_monotonic(self):
+        base = self.my_ktbs.create_base()
+        model = base.create_model()
+        otype = model.create_obsel_type("#MyObsel")
+        trace = base.create_stored_trace(None, model, "1970-01-01T00:00:00Z",
+                                         "alice")
+        trace.create_obsel("o0", otype, 10)
+        def make_graph(*begins):
+            graph = Graph()
+            for i in begins:
+                obs = BNode()
+                graph.add((obs, KTBS.hasTrace, trace.uri))
+                graph.add((obs, RDF.type, otype.uri))
+                graph.add((obs, KTBS.hasBegin, Literal(i)))
+            return graph
+
+        old_tag = trace.obsel_collection.str_mon_tag
+        created = trace.post_obsels_bulk(make_graph(12, 11))
+        new_tag = trace.obsel_collection.str_mon_tag
+        assert len(created) == 2
+        assert old_tag == new_tag
+
+        old_tag = new_tag
+        created = trace.post_obsels_bulk(make_graph(13, 5))
+        new_tag = trace.obsel_collection.str_mon_tag
+        assert len(created) == 2
+        assert old_tag != new_tag
+        assert [ o.begin for o in trace.obsels ] == [5, 10, 11, 12, 13]
+
+    def test_post_obsels_bulk_invalid(self):
+        base = self.my_ktbs.create_base()
+        model = base.create_model()
+        otype = model.create_obsel_type("#MyObsel")
+        trace = base.create_stored_trace(None, model, "1970-01-01T00:00:00Z",
+                                         "alice")
+        trace.create_obsel("o0", otype, 0)
+        graph = Graph()
+        for i in range(3):
+            obs = BNode()
+            graph.add((obs, KTBS.hasTrace, trace.uri))
+            graph.add((obs, RDF.type, otype.uri))
+            graph.add((obs, KTBS.hasBegin, Literal(i+1)))
+        # an obsel with two different ends
+        graph.add((obs, KTBS.hasEnd, Literal(4)))
+        graph.add((obs, KTBS.hasEnd, Literal(5)))
+
+        old_etag = trace.obsel_collection.etag
+        with assert_raises(InvalidDataError):
+            trace.post_obsels_bulk(graph)
+        assert trace.obsel_collection.etag == old_etag
+        assert len(trace.obsels) == 1
+
+        # obsel already existing in the trace
+        graph = Graph()
+        obs = URIRef("o0", trace.uri)
+        graph.add((obs, KTBS.hasTrace, trace.uri))
+        graph.add((obs, RDF.type, otype.uri))
+        with assert_raises(InvalidDataError):
+            trace.post_obsels_bulk(graph)
+        assert len(trace.obsels) == 1
+
     def test_lineage(self):
         b = self.my_ktbs.create_base()
         model = b.create_model()
@@ -1,10 +1,22 @@
 from .test_ktbs_engine import KtbsTestCase
+from json import loads
+from multiprocessing import Process
+from os import _exit, stat
+from threading import Event, Thread
+from time import sleep
 from unittest import skipUnless
 from pytest import raises as assert_raises
+from webob import Request
 
-from ktbs.engine.lock import WithLockMixin
-from ktbs.engine.lock import get_semaphore_name
+from rdfrest.http_server import HttpFrontend
+from ktbs.config import get_ktbs_configuration
+
+from ktbs.engine import lock as lock_module
+from ktbs.engine.lock import SHARED_LOCKS_SUPPORTED, WithLockMixin
+from ktbs.engine.lock import get_lock_stats, get_lock_times, reset_lock_times
+from ktbs.engine.lock import get_semaphore_name, reset_lock
 from ktbs.namespace import KTBS
+from ktbs.plugins import lock_stats
 
 import posix_ipc
 
@@ -383,3 +395,310 @@ class TestKtbsTraceLocking(KtbsTraceTestCase):
         new_trace.delete()
 
         assert semaphore.value == 1
+
+
+# Tests for shared locks
+SKIP_MSG_SHARED_LOCKS = "Platform doesn't support shared locks"
+
+def _hold_lock_in_thread(resource, shared):
+    """Acquire a lock on resource in another thread, and hold it until the
+    returned event is set.
+    """
+    locked = Event()
+    release = Event()
+    def hold():
+        with resource.lock(resource, 10, shared=shared):
+            locked.set()
+            release.wait(10)
+    thread = Thread(target=hold)
+    thread.start()
+    assert locked.wait(10)
+    return release, thread
+
+
+@skipUnless(SHARED_LOCKS_SUPPORTED, SKIP_MSG_SHARED_LOCKS)
+class TestKtbsSharedLocking(KtbsBaseTestCase):
+    """Test shared (reader) locks."""
+
+    def test_shared_locks_concurrent(self):
+        """Test that several threads can hold a shared lock at the same time."""
+        release, thread = _hold_lock_in_thread(self.tmp_base, True)
+        try:
+            with self.tmp_base.lock(self.tmp_base, shared=True):
+                # the main semaphore is only held while entering
+                assert self.tmp_base._get_semaphore().value == 1
+                room, mutex, readers = self.tmp_base._get_rw_semaphores()
+                assert readers.value == 2
+                assert room.value == 0
+        finally:
+            release.set()
+            thread.join()
+        assert readers.value == 0
+        assert room.value == 1
+
+    def test_shared_blocks_exclusive(self):
+        """Test that an exclusive lock can not be acquired while a shared lock is held."""
+        release, thread = _hold_lock_in_thread(self.tmp_base, True)
+        try:
+            with assert_raises(posix_ipc.BusyError):
+                with self.tmp_base.lock(self.tmp_base):
+                    pass
+        finally:
+            release.set()
+            thread.join()
+        # the failed attempt left everything in place
+        assert self.tmp_base._get_semaphore().value == 1
+        with self.tmp_base.lock(self.tmp_base):
+            pass
+
+    def test_exclusive_blocks_shared(self):
+        """Test that a shared lock can not be acquired while an exclusive lock is held."""
+        release, thread = _hold_lock_in_thread(self.tmp_base, False)
+        try:
+            with assert_raises(posix_ipc.BusyError):
+                with self.tmp_base.lock(self.tmp_base, shared=True):
+                    pass
+        finally:
+            release.set()
+            thread.join()
+        with self.tmp_base.lock(self.tmp_base, shared=True):
+            pass
+
+    def test_shared_reentrant(self):
+        """Test that a thread can lock again a resource it already holds."""
+        with self.tmp_base.lock(self.tmp_base, shared=True):
+            assert self.tmp_base.holds_shared_lock()
+            with self.tmp_base.lock(self.tmp_base, shared=True):
+                pass
+            with assert_raises(ValueError):
+                with self.tmp_base.lock(self.tmp_base):
+                    pass
+        assert not self.tmp_base.holds_shared_lock()
+        with self.tmp_base.lock(self.tmp_base):
+            with self.tmp_base.lock(self.tmp_base, shared=True):
+                pass
+
+    def test_delete_removes_rw_semaphores(self):
+        """Test that the semaphores of shared locks are removed with the resource."""
+        new_base = self.my_ktbs.create_base('new_base/')
+        with new_base.lock(new_base, shared=True):
+            pass
+        names = [ sem.name for sem in new_base._get_rw_semaphores() ]
+        new_base.delete()
+        for name in names:
+            with assert_raises(posix_ipc.ExistentialError):
+                posix_ipc.Semaphore(name=name)
+
+    def test_reset_after_crash(self):
+        """Test that reset_lock repairs a shared lock held by a killed process."""
+        resource = self.tmp_base
+        def crash():
+            with resource.lock(resource, shared=True):
+                _exit(1)
+        process = Process(target=crash)
+        process.start()
+        process.join()
+        room, mutex, readers = resource._get_rw_semaphores()
+        assert (room.value, mutex.value, readers.value) == (0, 1, 1)
+        with assert_raises(posix_ipc.BusyError):
+            with resource.lock(resource):
+                pass
+        assert reset_lock(resource.uri)
+        assert resource._get_semaphore().value == 1
+        assert (room.value, mutex.value, readers.value) == (1, 1, 0)
+        with resource.lock(resource):
+            pass
+        with resource.lock(resource, shared=True):
+            pass
+        assert not reset_lock(resource.uri)
+
+
+@skipUnless(posix_ipc.SEMAPHORE_VALUE_SUPPORTED, SKIP_MSG_SEMAPHORE_VALUE)
+class TestKtbsSemaphorePool(KtbsBaseTestCase):
+    """Test that semaphore handles are pooled, and lock times measured."""
+
+    def test_handle_reused(self):
+        semaphore = self.tmp_base._get_semaphore()
+        with self.tmp_base.lock(self.tmp_base):
+            assert self.tmp_base._get_semaphore() is semaphore
+        assert self.tmp_base._get_semaphore() is semaphore
+        assert self.tmp_base._get_rw_semaphores() == \
+            self.tmp_base._get_rw_semaphores()
+
+    def test_handle_discarded_on_delete(self):
+        new_base = self.my_ktbs.create_base('new_base/')
+        semaphore = new_base._get_semaphore()
+        new_base.delete()
+        new_base = self.my_ktbs.create_base('new_base/')
+        try:
+            assert new_base._get_semaphore() is not semaphore
+            assert new_base._get_semaphore().value == 1
+            with new_base.lock(new_base):
+                assert new_base._get_semaphore().value == 0
+        finally:
+            new_base.delete()
+
+    def test_stale_handle(self):
+        new_base = self.my_ktbs.create_base('new_base/')
+        try:
+            semaphore = new_base._get_semaphore()
+            # simulate another process deleting and re-creating the resource,
+            # without the pool of this process being notified
+            semaphore.unlink()
+            other = posix_ipc.Semaphore(name=semaphore.name,
+                                        flags=posix_ipc.O_CREAT,
+                                        initial_value=1)
+            assert new_base._get_semaphore() is not semaphore
+            with new_base.lock(new_base):
+                assert other.value == 0
+            assert other.value == 1
+        finally:
+            new_base.delete()
+
+    @skipUnless(SHARED_LOCKS_SUPPORTED, SKIP_MSG_SHARED_LOCKS)
+    def test_stale_rw_handles(self):
+        new_base = self.my_ktbs.create_base('new_base/')
+        try:
+            semaphore = new_base._get_semaphore()
+            room, mutex, readers = new_base._get_rw_semaphores()
+            # simulate another process deleting and re-creating the resource
+            semaphore.unlink()
+            WithLockMixin.unlink_rw_semaphores(new_base.uri)
+            posix_ipc.Semaphore(name=semaphore.name, flags=posix_ipc.O_CREAT,
+                                initial_value=1)
+            # the auxiliary semaphores are re-opened with the main one
+            new_room, _, _ = new_base._get_rw_semaphores()
+            assert new_room is not room
+            with new_base.lock(new_base, shared=True):
+                assert new_room.value == 0
+                assert room.value == 1
+        finally:
+            new_base.delete()
+
+    def test_single_stat_per_lock(self, monkeypatch):
+        stats = []
+        def counting_stat(path):
+            stats.append(path)
+            return stat(path)
+        monkeypatch.setattr(lock_module, "stat", counting_stat)
+        self.tmp_base._get_rw_semaphores() # make sure all handles are pooled
+        del stats[:]
+        with self.tmp_base.lock(self.tmp_base):
+            pass
+        assert len(stats) == 1
+        with self.tmp_base.lock(self.tmp_base, shared=True):
+            pass
+        assert len(stats) == 2
+
+    def test_lock_times(self):
+        lock_times = get_lock_times()
+        lock_times.reset()
+        with self.tmp_base.lock(self.tmp_base):
+            sleep(0.01)
+            with self.tmp_base.lock(self.tmp_base): # re-entrant, not counted
+                pass
+        with self.tmp_base.lock(self.tmp_base, shared=True):
+            pass
+        stats = lock_times.as_dict()
+        assert stats["acquisitions"] == 2
+        assert stats["max_hold"] >= 0.01
+        assert stats["total_hold"] >= stats["max_hold"]
+        assert stats["total_wait"] >= stats["max_wait"] >= 0
+        lock_times.reset()
+        assert lock_times.as_dict()["acquisitions"] == 0
+
+    def test_lock_stats(self):
+        reset_lock_times()
+        base = self.tmp_base
+        errors = []
+        def try_lock():
+            try:
+                with base.lock(base, 0):
+                    pass
+            except posix_ipc.BusyError as ex:
+                errors.append(ex)
+        with base.lock(base):
+            # the base is busy for other threads
+            thread = Thread(target=try_lock)
+            thread.start()
+            thread.join()
+        assert len(errors) == 1
+        with base.lock(base, shared=True):
+            pass
+        stats = get_lock_stats()
+        assert stats[base.uri]["acquisitions"] == 2
+        assert stats[base.uri]["busy"] == 1
+        assert get_lock_times().busy == 1
+        assert base.service.root_uri not in stats
+        with self.my_ktbs.lock(self.my_ktbs):
+            pass
+        stats = get_lock_stats()
+        assert stats[self.my_ktbs.uri]["acquisitions"] == 1
+        assert stats[base.uri]["acquisitions"] == 2
+        reset_lock_times()
+        assert get_lock_stats() == {}
+        assert get_lock_times().acquisitions == 0
+
+    def test_lock_stats_forgotten_on_delete(self):
+        reset_lock_times()
+        new_base = self.my_ktbs.create_base('new_base/')
+        with new_base.lock(new_base):
+            pass
+        uri = new_base.uri
+        assert uri in get_lock_stats()
+        new_base.delete()
+        assert uri not in get_lock_stats()
+
+    def test_lock_stats_plugin(self):
+        reset_lock_times()
+        with self.tmp_base.lock(self.tmp_base):
+            pass
+        lock_stats.start_plugin(None)
+        try:
+            app = HttpFrontend(self.service, get_ktbs_configuration())
+            resp = Request.blank(self.my_ktbs.uri + "?lock-stats&reset") \
+                .get_response(app)
+            assert resp.status_int == 200
+            assert resp.content_type == "application/json"
+            stats = loads(resp.body.decode("utf-8"))
+            assert stats["resources"][str(self.tmp_base.uri)]["acquisitions"] == 1
+            assert stats["process"]["acquisitions"] >= 1
+            assert get_lock_stats() == {}
+            # other resources do not accept this parameter
+            resp = Request.blank(self.tmp_base.uri + "?lock-stats") \
+                .get_response(app)
+            assert resp.status_int == 404 # invalid parameter
+        finally:
+            lock_stats.stop_plugin()
+
+
+@skipUnless(SHARED_LOCKS_SUPPORTED, SKIP_MSG_SHARED_LOCKS)
+class TestKtbsLockContention(KtbsBaseTestCase):
+    """Several processes concurrently lock the same resource.
+
+    See examples/stress/bench-lock-contention.py for the timings.
+    """
+
+    PROCESSES = 4
+    ITERATIONS = 5
+
+    def run_processes(self, shared):
+        resource = self.tmp_base
+        def work():
+            for _ in range(self.ITERATIONS):
+                with resource.lock(resource, 30, shared=shared):
+                    sleep(0.001)
+        processes = [ Process(target=work) for _ in range(self.PROCESSES) ]
+        for process in processes:
+            process.start()
+        for process in processes:
+            process.join()
+        assert all( process.exitcode == 0 for process in processes )
+
+    def test_contention(self):
+        self.run_processes(False)
+        self.run_processes(True)
+        # the locks are left in a consistent state
+        assert self.tmp_base._get_semaphore().value == 1
+        room, mutex, readers = self.tmp_base._get_rw_semaphores()
+        assert (room.value, mutex.value, readers.value) == (1, 1, 0)
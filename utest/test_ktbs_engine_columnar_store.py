@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+from pytest import raises as assert_raises
+
+from rdflib import ConjunctiveGraph, Graph, Literal, Namespace, RDF
+
+from ktbs.config import get_ktbs_configuration
+from ktbs.engine.columnar_store import ColumnarObselStore, ObselColumns
+from ktbs.engine.service import KtbsService
+from ktbs.namespace import KTBS
+
+# NB: importing the module rather than the classes,
+# so that the original test classes are not collected twice
+from . import test_ktbs_engine as engine_tests
+
+EX = Namespace("http://example.org/")
+
+class TestObselColumns(object):
+
+    def setup(self):
+        self.columns = c = ObselColumns()
+        for triple in [
+            (EX.o1, RDF.type, EX.OT1),
+            (EX.o1, KTBS.hasBegin, Literal(1)),
+            (EX.o1, KTBS.hasEnd, Literal(2)),
+            (EX.o1, EX.attr, Literal("foo")),
+            (EX.o1, EX.attr, Literal("bar")),
+            (EX.o2, RDF.type, EX.OT2),
+            (EX.o2, KTBS.hasBegin, Literal(3)),
+            (EX.o2, KTBS.hasEnd, Literal(3)),
+            (EX.o2, KTBS.hasSourceObsel, EX.o1),
+        ]:
+            c.add(triple)
+
+    def test_len(self):
+        assert len(self.columns) == 9
+        self.columns.add((EX.o1, RDF.type, EX.OT1)) # already there
+        assert len(self.columns) == 9
+
+    def test_triples(self):
+        c = self.columns
+        assert set(c.triples((EX.o1, EX.attr, None))) == {
+            (EX.o1, EX.attr, Literal("foo")),
+            (EX.o1, EX.attr, Literal("bar")),
+        }
+        assert set(c.triples((None, RDF.type, EX.OT2))) == {
+            (EX.o2, RDF.type, EX.OT2),
+        }
+        assert set(c.triples((None, None, EX.o1))) == {
+            (EX.o2, KTBS.hasSourceObsel, EX.o1),
+        }
+        assert len(set(c.triples((None, None, None)))) == 9
+        assert list(c.triples((EX.o3, None, None))) == []
+        assert list(c.triples((None, None, EX.o3))) == []
+
+    def test_multiple_values_in_dense_column(self):
+        c = self.columns
+        c.add((EX.o1, RDF.type, EX.OT3))
+        assert len(c) == 10
+        assert set(c.triples((EX.o1, RDF.type, None))) == {
+            (EX.o1, RDF.type, EX.OT1),
+            (EX.o1, RDF.type, EX.OT3),
+        }
+        c.remove((EX.o1, RDF.type, EX.OT1))
+        assert set(c.triples((None, RDF.type, None))) == {
+            (EX.o1, RDF.type, EX.OT3),
+            (EX.o2, RDF.type, EX.OT2),
+        }
+
+    def test_readd_after_dense_slot_freed(self):
+        c = self.columns
+        c.add((EX.o1, RDF.type, EX.OT3)) # goes to the sparse column
+        c.remove((EX.o1, RDF.type, EX.OT1)) # frees the dense slot
+        c.add((EX.o1, RDF.type, EX.OT3)) # already there
+        assert len(c) == 9
+        assert list(c.triples((EX.o1, RDF.type, None))) == [
+            (EX.o1, RDF.type, EX.OT3),
+        ]
+
+    def test_incoming_arcs(self):
+        c = ObselColumns()
+        prev = None
+        for i in range(1000):
+            obs = EX["o%s" % i]
+            c.add((obs, RDF.type, EX.OT1))
+            if prev is not None:
+                c.add((obs, EX.previous, prev))
+            prev = obs
+        visited = []
+        row_triples = c._row_triples
+        def counting_row_triples(row, *args):
+            visited.append(row)
+            return row_triples(row, *args)
+        c._row_triples = counting_row_triples
+        # only the row of the subject is visited, not the whole collection
+        assert list(c.triples((None, None, EX.o500))) == [
+            (EX.o501, EX.previous, EX.o500),
+        ]
+        assert len(visited) == 1
+        assert list(c.triples((None, EX.previous, EX.o10))) == [
+            (EX.o11, EX.previous, EX.o10),
+        ]
+        assert len(visited) == 2
+        # the index is kept up to date on removal
+        c.remove((EX.o501, None, None))
+        assert list(c.triples((None, None, EX.o500))) == []
+        assert EX.o500 in c._terms
+        assert c._ids[EX.o500] not in c._object_rows
+
+    def test_remove(self):
+        c = self.columns
+        c.remove((EX.o1, None, None))
+        assert len(c) == 4
+        assert list(c.triples((EX.o1, None, None))) == []
+        c.add((EX.o1, KTBS.hasBegin, Literal(5)))
+        assert list(c.triples((EX.o1, None, None))) == [
+            (EX.o1, KTBS.hasBegin, Literal(5)),
+        ]
+        c.remove((None, None, None))
+        assert len(c) == 0
+        assert list(c.triples((None, None, None))) == []
+
+
+class TestColumnarObselStore(object):
+
+    def setup(self):
+        self.store = ColumnarObselStore(Graph().store)
+        self.obsels = Graph(self.store, EX["t/@obsels"])
+        self.other = Graph(self.store, EX["t/"])
+        self.obsels.add((EX["t/o1"], KTBS.hasBegin, Literal(1)))
+        self.obsels.add((EX["t/o1"], EX.attr, Literal("foo")))
+        self.other.add((EX["t/"], KTBS.hasObselCollection, EX["t/@obsels"]))
+
+    def test_routing(self):
+        assert len(self.obsels) == 2
+        assert len(self.other) == 1
+        assert len(self.store.delegate) == 1
+        assert len(self.store) == 3
+
+    def test_conjunctive_graph(self):
+        cg = ConjunctiveGraph(self.store)
+        assert len(list(cg.quads((None, None, None)))) == 3
+        assert { g.identifier for g in cg.contexts() } \
+            == { EX["t/"], EX["t/@obsels"] }
+        assert { g.identifier for g in cg.contexts(
+            (EX["t/o1"], EX.attr, Literal("foo"))) } == { EX["t/@obsels"] }
+
+    def test_query(self):
+        res = list(self.obsels.query(
+            "SELECT ?o ?b { ?o <%s> ?b }" % KTBS.hasBegin))
+        assert res == [(EX["t/o1"], Literal(1))]
+
+    def test_remove_graph(self):
+        self.obsels.remove((None, None, None))
+        assert len(self.obsels) == 0
+        assert len(self.store) == 1
+        assert { g.identifier for g in ConjunctiveGraph(self.store).contexts() } \
+            == { EX["t/"] }
+
+
+def test_columnar_requires_memory(tmpdir):
+    ktbs_config = get_ktbs_configuration()
+    ktbs_config.set('rdf_database', 'repository', str(tmpdir.join("db")))
+    ktbs_config.set('rdf_database', 'obsel-store', 'columnar')
+    with assert_raises(ValueError):
+        KtbsService(ktbs_config)
+
+
+class ColumnarConfigMixin(object):
+    """Run the tests of the superclass with a columnar obsel store."""
+
+    def configure(self, ktbs_config):
+        super(ColumnarConfigMixin, self).configure(ktbs_config)
+        ktbs_config.set('rdf_database', 'obsel-store', 'columnar')
+
+    def teardown(self):
+        if self.service is not None:
+            assert isinstance(self.service.store, ColumnarObselStore)
+        super(ColumnarConfigMixin, self).teardown()
+
+class TestColumnarKtbs(ColumnarConfigMixin, engine_tests.TestKtbs):
+    pass
+
+class TestColumnarObsels(ColumnarConfigMixin, engine_tests.TestObsels):
+    pass
+
+class TestColumnarKtbsSynthetic(ColumnarConfigMixin,
+                                engine_tests.TestKtbsSynthetic):
+    pass
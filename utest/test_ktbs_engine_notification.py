@@ -0,0 +1,117 @@
+from .test_ktbs_engine import KtbsTestCase
+from os import getpid
+from pytest import raises as assert_raises, skip
+
+import posix_ipc
+
+from ktbs.config import get_ktbs_configuration
+from ktbs.engine.notification import add_listener, remove_listener
+from ktbs.namespace import KTBS
+from ktbs.plugins import notification_queue
+
+
+class TestNotification(KtbsTestCase):
+    """Test the notification of dirty computed traces."""
+
+    def setup(self):
+        super(TestNotification, self).setup()
+        self.base = b = self.my_ktbs.create_base("b/")
+        self.model = m = b.create_model("m")
+        self.ot1 = ot1 = m.create_obsel_type("#OT1")
+        self.trace = t = b.create_stored_trace("t/", m,
+                                               origin="1970-01-01T00:00:00Z")
+        self.filtered = f = b.create_computed_trace("f/", KTBS.filter,
+                                                    {"otypes": ot1.uri },
+                                                    [t],)
+        self.filtered2 = b.create_computed_trace("f2/", KTBS.filter,
+                                                {"after": 1 },
+                                                [f],)
+        self.notified = []
+        add_listener(self.notified.append)
+
+    def teardown(self):
+        remove_listener(self.notified.append)
+        super(TestNotification, self).teardown()
+
+    def test_notify_new_obsel(self):
+        self.trace.create_obsel("o01", self.ot1, 0)
+        assert self.notified == [self.filtered.obsel_collection.uri]
+        del self.notified[:]
+
+        # refreshing f notifies f2
+        self.filtered.obsel_collection.force_state_refresh()
+        assert self.notified == [self.filtered2.obsel_collection.uri]
+
+    def test_notify_once_per_transaction(self):
+        service = self.my_ktbs.service
+        with service:
+            self.trace.create_obsel("o01", self.ot1, 0)
+            self.trace.create_obsel("o02", self.ot1, 1)
+            assert self.notified == [] # not commited yet
+        assert self.notified == [self.filtered.obsel_collection.uri]
+
+    def test_no_notification_on_rollback(self):
+        service = self.my_ktbs.service
+        with assert_raises(ValueError):
+            with service:
+                self.trace.create_obsel("o01", self.ot1, 0)
+                raise ValueError()
+        assert self.notified == []
+
+
+class TestNotificationQueue(KtbsTestCase):
+    """Test the notification_queue plugin."""
+
+    def setup(self):
+        if not posix_ipc.MESSAGE_QUEUES_SUPPORTED:
+            skip("POSIX message queues not supported")
+        super(TestNotificationQueue, self).setup()
+        self.config = cfg = get_ktbs_configuration()
+        cfg.add_section('notification_queue')
+        cfg.set('notification_queue', 'name',
+                '/ktbs-test-notification-%s' % getpid())
+        notification_queue.start_plugin(cfg)
+        self.queue = notification_queue.open_queue(cfg)
+
+    def teardown(self):
+        notification_queue.stop_plugin()
+        self.queue.unlink()
+        self.queue.close()
+        super(TestNotificationQueue, self).teardown()
+
+    def test_queue(self):
+        b = self.my_ktbs.create_base("b/")
+        m = b.create_model("m")
+        ot1 = m.create_obsel_type("#OT1")
+        t = b.create_stored_trace("t/", m, origin="1970-01-01T00:00:00Z")
+        f = b.create_computed_trace("f/", KTBS.filter, {"otypes": ot1.uri },
+                                    [t],)
+        g = b.create_computed_trace("g/", KTBS.filter, {"after": 1 }, [t],)
+        # drain notifications caused by the creation of the computed traces
+        notifications = notification_queue.iter_notifications(self.queue, 0)
+        while next(notifications) is not None:
+            pass
+
+        t.create_obsel("o01", ot1, 0)
+        t.create_obsel("o02", ot1, 1)
+        received = []
+        for uri in notifications:
+            if uri is None:
+                break
+            received.append(uri)
+        # notifications are coalesced
+        assert sorted(received) == sorted([
+            str(f.obsel_collection.uri),
+            str(g.obsel_collection.uri),
+        ])
+
+    def test_queue_full(self, caplog):
+        for i in range(self.queue.max_messages):
+            notification_queue.send_notification("http://example.org/%s" % i)
+        notification_queue.send_notification("http://example.org/dropped")
+        # the dropped notification is logged as a warning
+        assert [ record.levelname for record in caplog.records
+                 if "dropped" in record.getMessage() ] == ["WARNING"]
+        received = notification_queue.receive_notifications(self.queue, 0)
+        assert len(received) == self.queue.max_messages
+        assert "http://example.org/dropped" not in received
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+from rdfrest.util.sqlite_store import SQLiteStore
+
+# NB: importing the module rather than the classes,
+# so that the original test classes are not collected twice
+from . import test_ktbs_engine as engine_tests
+
+
+class SQLiteConfigMixin(object):
+    """Run the tests of the superclass with an SQLite repository."""
+
+    tmpdir = None
+
+    def configure(self, ktbs_config):
+        super(SQLiteConfigMixin, self).configure(ktbs_config)
+        self.tmpdir = mkdtemp()
+        ktbs_config.set('rdf_database', 'repository',
+                        join(self.tmpdir, "ktbs.sqlite"))
+
+    def teardown(self):
+        if self.service is not None:
+            assert isinstance(self.service.store, SQLiteStore)
+            self.service.store.close()
+        super(SQLiteConfigMixin, self).teardown()
+        if self.tmpdir is not None:
+            rmtree(self.tmpdir)
+            self.tmpdir = None
+
+class TestSQLiteKtbs(SQLiteConfigMixin, engine_tests.TestKtbs):
+    pass
+
+class TestSQLiteObsels(SQLiteConfigMixin, engine_tests.TestObsels):
+    pass
@@ -1,10 +1,25 @@
 from .test_ktbs_engine import KtbsTestCase
+from threading import Thread
+from time import sleep, time
 from unittest import skipUnless
 from pytest import raises as assert_raises
+from rdflib import BNode, Graph, Literal, URIRef
+from rdflib.compare import isomorphic
+from webob import Request
+from rdfrest.exceptions import InvalidParametersError
+from rdfrest.http_server import HttpFrontend
+from rdfrest.util.query_cache import prepare_query
+from rdfrest.serializers import get_serializer_by_content_type, \
+    iter_graph_chunks
 
+from ktbs.config import get_ktbs_configuration
+from ktbs.engine import trace_obsels
 from ktbs.engine.lock import WithLockMixin
 from ktbs.engine.lock import get_semaphore_name
+from ktbs.engine.obsel_index import parse_type_test
 from ktbs.engine.service import make_ktbs
+from ktbs.namespace import KTBS, KTBS_NS_URI
+import ktbs.serpar # ensures kTBS serializers are registered
 
 
 class TestKtbsTraceObsels(KtbsTestCase):
@@ -55,3 +70,289 @@ class TestKtbsTraceObsels(KtbsTestCase):
         assert get_etags(before=self.obsels[3]) == [etag, mstag,]
         assert get_etags(before=self.obsels[4]) == [etag, mstag,]
         assert get_etags(after=self.obsels[-1]) == [etag,]
+
+    def test_conditional_get(self):
+        app = HttpFrontend(self.service, get_ktbs_configuration())
+        oc = self.trace.obsel_collection
+        url = oc.uri + "?maxe=1000"
+        reqhead = { "accept": "text/turtle" }
+        resp1 = Request.blank(url, headers=reqhead).get_response(app)
+        assert resp1.status_int == 200
+        # the most stable etag of the slice is sent by clients
+        reqhead["if-none-match"] = resp1.headers["etag"]
+        resp2 = Request.blank(url, headers=reqhead).get_response(app)
+        assert resp2.status_int == 304
+        # adding an obsel after the slice does not invalidate it
+        self.trace.create_obsel('o5', self.ot, 5000)
+        resp3 = Request.blank(url, headers=reqhead).get_response(app)
+        assert resp3.status_int == 304
+        # adding an obsel in the slice does
+        self.trace.create_obsel('o6', self.ot, 500)
+        resp4 = Request.blank(url, headers=reqhead).get_response(app)
+        assert resp4.status_int == 200
+
+    def test_wait(self):
+        oc = self.trace.obsel_collection
+        last = self.obsels[-1]
+        # not waiting if the slice is not empty
+        start = time()
+        graph = oc.get_state({"after": self.obsels[-2].uri, "wait": "5"})
+        assert time() - start < 1
+        assert (last.uri, KTBS.hasTrace, self.trace.uri) in graph
+        # waiting until timeout if the slice stays empty
+        start = time()
+        graph = oc.get_state({"after": last.uri, "wait": "0.3"})
+        assert time() - start >= 0.3
+        assert len(list(graph.subjects(KTBS.hasTrace, None))) == 0
+        # long-polling requests have no predictable etag
+        assert list(oc.iter_etags({"after": last.uri, "wait": "1"})) == []
+        assert oc.get_representation_etag({"wait": "1"}) is None
+        with assert_raises(InvalidParametersError):
+            oc.get_state({"wait": "foo"})
+
+    def test_wait_notified(self, monkeypatch):
+        # ensure that we are notified rather than polling
+        monkeypatch.setattr(trace_obsels, "WAIT_POLL_PERIOD", 30)
+        oc = self.trace.obsel_collection
+        last = self.obsels[-1]
+        def create_obsel():
+            sleep(0.2)
+            self.trace.create_obsel('o5', self.ot, 5000)
+        thread = Thread(target=create_obsel)
+        thread.start()
+        start = time()
+        graph = oc.get_state({"after": last.uri, "wait": "10"})
+        thread.join()
+        assert time() - start < 10
+        new_obsels = list(graph.subjects(KTBS.hasTrace, None))
+        assert new_obsels == [self.trace.get_obsel("o5").uri]
+
+    def test_wait_computed(self, monkeypatch):
+        monkeypatch.setattr(trace_obsels, "WAIT_POLL_PERIOD", 30)
+        ct = self.base.create_computed_trace("ct/", KTBS.filter,
+                                             {"after": "1000"}, [self.trace])
+        oc = ct.obsel_collection
+        oc.force_state_refresh()
+        last = ct.get_obsel("o4")
+        def create_obsel():
+            sleep(0.2)
+            self.trace.create_obsel('o5', self.ot, 5000)
+        thread = Thread(target=create_obsel)
+        thread.start()
+        start = time()
+        graph = oc.get_state({"after": last.uri, "wait": "10"})
+        thread.join()
+        assert time() - start < 10
+        new_obsels = list(graph.subjects(KTBS.hasTrace, None))
+        assert new_obsels == [ct.get_obsel("o5").uri]
+
+    def test_representation_etag(self):
+        t = self.trace
+        oc = t.obsel_collection
+        retag = oc.get_representation_etag()
+        assert oc.get_representation_etag({"limit": "1"}) == retag
+        t.create_obsel('o5', self.ot, 5000)
+        retag2 = oc.get_representation_etag()
+        assert retag2 != retag
+        # changing the trace description also changes the representations
+        t.label = "new label"
+        assert oc.get_representation_etag() != retag2
+
+    def test_representation_etag_computed(self):
+        t = self.trace
+        ct = self.base.create_computed_trace("ct/", KTBS.filter,
+                                             {"after": "1000"}, [t])
+        oc = ct.obsel_collection
+        retag = oc.get_representation_etag()
+        t.create_obsel('o5', self.ot, 5000)
+        # the etag is computed *after* the obsels are refreshed
+        assert oc.get_representation_etag() != retag
+        assert oc.get_representation_etag({"refresh": "force"}) is None
+
+    def test_select_obsels(self):
+        oc = self.trace.obsel_collection
+        uris = [ o.uri for o in self.obsels ]
+
+        assert oc.select_obsels() == uris
+        assert oc.select_obsels(reverse=True) == uris[::-1]
+        assert oc.select_obsels(begin=1000, end=3000) == uris[1:4]
+        assert oc.select_obsels(after=uris[1]) == uris[2:]
+        assert oc.select_obsels(before=self.obsels[3]) == uris[:3]
+        assert oc.select_obsels(limit=2, offset=1) == uris[1:3]
+        assert oc.select_obsels(after=uris[3], reverse=True) == [uris[4]]
+        assert oc.select_obsels(maxb=1500, mine=500) == [uris[1]]
+
+    def test_build_select_template(self):
+        oc = self.trace.obsel_collection
+        uris = [ o.uri for o in self.obsels ]
+        prefix = "PREFIX ktbs: <%s#> " % KTBS_NS_URI
+        for kw, expected in [
+            ({}, uris),
+            ({"begin": 1000, "end": 3000}, uris[1:4]),
+            ({"after": uris[1]}, uris[2:]),
+            ({"before": self.obsels[3]}, uris[:3]),
+            ({"after": self.obsels[0], "before": uris[3],
+              "reverse": True}, uris[2:0:-1]),
+            ({"bgp": "?obs a <%s>." % self.ot.uri, "limit": 2}, uris[:2]),
+        ]:
+            query, bindings = oc.build_select_template(**kw)
+            results = oc.state.query(prepare_query(prefix + query),
+                                     initBindings=bindings)
+            assert [ row[0] for row in results ] == expected
+            # the inlined version gives the same results
+            results = oc.state.query(prefix + oc.build_select(**kw))
+            assert [ row[0] for row in results ] == expected
+
+        # the query does not depend on the values of the parameters
+        assert oc.build_select_template(begin=0, after=uris[0])[0] \
+            == oc.build_select_template(begin=1, after=uris[1])[0]
+
+        # select_obsels relies on SPARQL inside an edit context
+        with oc.edit({"add_obsels_only":1}, _trust=True):
+            assert oc.select_obsels(maxb=1500, mine=500) == [uris[1]]
+            assert oc.select_obsels(after=uris[3]) == [uris[4]]
+
+    def test_select_obsels_index_maintenance(self):
+        t = self.trace
+        oc = t.obsel_collection
+        uris = [ o.uri for o in self.obsels ]
+        assert oc.select_obsels() == uris
+
+        # monotonic addition: index is updated
+        new = t.create_obsel('o5', self.ot, 2500)
+        assert oc.select_obsels(begin=2000, end=3000) \
+            == [uris[2], new.uri, uris[3]]
+
+        # non-monotonic change: index is rebuilt
+        self.obsels[0].delete()
+        assert oc.select_obsels(end=1000) == [uris[1]]
+
+        # arbitrary edit: index is rebuilt
+        with oc.edit(_trust=True) as graph:
+            graph.remove((uris[4], None, None))
+        assert uris[4] not in oc.select_obsels()
+
+    def test_select_obsels_by_type(self):
+        t = self.trace
+        oc = t.obsel_collection
+        ot2 = self.model.create_obsel_type("#OT2")
+        ot3 = self.model.create_obsel_type("#OT3")
+        o5 = t.create_obsel('o5', ot2, 2500)
+        o6 = t.create_obsel('o6', ot3, 3500)
+        o7 = t.create_obsel('o7', ot2, 4500)
+        # the index was maintained incrementally
+        index = oc._get_index()
+        assert index.count_type(ot2.uri) == 2
+
+        bgp2 = "?obs a <%s>." % ot2.uri
+        bgp23 = "?obs a ?t. FILTER(?t in (<%s>, m:OT3))" % ot2.uri
+        assert oc.select_obsels(bgp=bgp2) == [o5.uri, o7.uri]
+        assert oc.select_obsels(bgp="?obs a m:OT2") == [o5.uri, o7.uri]
+        assert oc.select_obsels(bgp=bgp23) == [o5.uri, o6.uri, o7.uri]
+        assert oc.select_obsels(bgp=bgp23, after=o5.uri, reverse=True) \
+            == [o7.uri, o6.uri]
+        assert oc.select_obsels(bgp=bgp23, end=4000, limit=1, offset=1) \
+            == [o6.uri]
+        assert oc.select_obsels(bgp="?obs a m:Unknown") == []
+
+        # the same results are obtained with SPARQL (inside an edit context)
+        with oc.edit({"add_obsels_only":1}, _trust=True):
+            assert oc.select_obsels(bgp=bgp2) == [o5.uri, o7.uri]
+            assert oc.select_obsels(bgp=bgp23, after=o5.uri, reverse=True) \
+                == [o7.uri, o6.uri]
+
+        # other BGPs are evaluated by SPARQL
+        bgp = "?obs a <%s>; ktbs:hasBegin 3500." % ot3.uri
+        assert oc.select_obsels(bgp=bgp) == [o6.uri]
+
+        # deleting an obsel updates the type index
+        o5.delete()
+        assert oc.select_obsels(bgp=bgp2) == [o7.uri]
+        assert [ o.uri for o in t.iter_obsels(bgp=bgp2) ] == [o7.uri]
+
+    def test_parse_type_test(self):
+        m = "http://example.org/model#"
+        for bgp, expected in [
+            ("?obs a <http://ex/T>.", ["http://ex/T"]),
+            ("\n  ?obs rdf:type m:T1.1 .\n", [m + "T1.1"]),
+            ("?obs a ?t. FILTER(?t in (<http://ex/T>, m:T2))",
+             ["http://ex/T", m + "T2"]),
+            ("?obs a ?t. FILTER(?u in (<http://ex/T>))", None),
+            ("?obs a <http://ex/T>. ?obs m:at 42.", None),
+            ("?other a <http://ex/T>.", None),
+        ]:
+            if expected is not None:
+                expected = [ URIRef(i) for i in expected ]
+            assert parse_type_test(bgp, m) == expected
+        assert parse_type_test("?obs a m:T") is None # no model prefix
+
+    def test_slice_description(self):
+        t = self.trace
+        oc = t.obsel_collection
+        attr = self.model.create_attribute_type("#at")
+        rel = self.model.create_relation_type("#rt")
+        o0, o1, o2 = self.obsels[:3]
+        with oc.edit(_trust=True) as graph:
+            b1, b2 = BNode(), BNode()
+            graph.add((o1.uri, attr.uri, b1))
+            graph.add((b1, attr.uri, b2))
+            graph.add((b2, attr.uri, Literal("deep")))
+            graph.add((o1.uri, rel.uri, o2.uri))
+            graph.add((o0.uri, rel.uri, o1.uri))
+
+        sl = oc.get_state({"minb": 1000, "maxe": 1000})
+        assert (o1.uri, KTBS.hasBegin, Literal(1000)) in sl
+        assert (b2, attr.uri, Literal("deep")) in sl
+        assert (o1.uri, rel.uri, o2.uri) in sl
+        assert (o2.uri, KTBS.hasTrace, t.uri) in sl
+        assert (o0.uri, rel.uri, o1.uri) in sl
+        assert (o0.uri, KTBS.hasTrace, t.uri) in sl
+        assert (o2.uri, KTBS.hasBegin, None) not in sl
+
+    def test_streamed_state(self):
+        oc = self.trace.obsel_collection
+        for params in [None, {"limit": "3"}, {"minb": "1000", "maxe": "3000"},
+                       {"reverse": "yes", "limit": "2", "offset": "1"},
+                       {"limit": "0"}, {"offset": "4", "limit": "3"}]:
+            expected = oc.get_state(params and dict(params))
+            streamed = oc.get_streamed_state(params and dict(params),
+                                             chunk_size=2)
+            assert getattr(streamed, "etags", None) \
+                == getattr(expected, "etags", None)
+            assert getattr(streamed, "links", None) \
+                == getattr(expected, "links", None)
+            union = Graph()
+            for chunk in iter_graph_chunks(streamed):
+                union += chunk
+            assert isomorphic(union, expected), params
+
+    def test_streamed_state_computed(self):
+        ct = self.base.create_computed_trace("ct/", KTBS.filter,
+                                             {"after": "1000"}, [self.trace])
+        oc = ct.obsel_collection
+        # computed obsels may be recomputed between two chunks,
+        # so they are not actually streamed
+        streamed = oc.get_streamed_state(chunk_size=2)
+        assert getattr(streamed, "iter_chunks", None) is None
+        assert isomorphic(streamed, oc.get_state())
+
+    def test_streamed_serializers(self):
+        oc = self.trace.obsel_collection
+        for ctype in ["application/json", "text/csv", "text/nt"]:
+            serializer, _ = get_serializer_by_content_type(ctype, oc.RDF_MAIN_TYPE)
+            assert serializer.streaming
+            expected = b"".join(serializer(oc.get_state(), oc))
+            streamed = b"".join(serializer(
+                oc.get_streamed_state(chunk_size=2), oc))
+            if ctype == "text/nt":
+                assert sorted(set(streamed.split(b"\n"))) \
+                    == sorted(set(expected.split(b"\n")))
+            else:
+                assert streamed == expected, ctype
+
+        serializer, _ = get_serializer_by_content_type("text/turtle")
+        assert serializer.streaming
+        parsed = Graph().parse(data=b"".join(serializer(
+            oc.get_streamed_state(chunk_size=2), oc)).decode("utf-8"),
+                               format="turtle", publicID=oc.uri)
+        assert isomorphic(parsed, oc.get_state())
@@ -21,6 +21,7 @@
 from json import loads
 
 from ktbs.engine.resource import METADATA
+from ktbs.methods import utils as methods_utils
 from ktbs.methods.filter import LOG as FILTER_LOG
 from ktbs.namespace import KTBS
 
@@ -299,6 +300,40 @@ class TestFilter(KtbsTestCase):
         assert len(ctr.obsels) == 6
         assert count_relations() == 2
 
+    def test_filter_relations_chunks(self):
+        base = self.my_ktbs.create_base("b/")
+        model = base.create_model("m")
+        otype = model.create_obsel_type("#ot")
+        rtype = model.create_relation_type("#rt")
+        src = base.create_stored_trace("s/", model, default_subject="alice")
+        o00 = src.create_obsel("o00", otype, 0)
+        o10 = src.create_obsel("o10", otype, 10, relations=[(rtype, o00)])
+        src.create_obsel("o11", otype, 11, relations=[(rtype, o10)])
+        o12 = src.create_obsel("o12", otype, 12)
+        src.create_obsel("o13", otype, 13, relations=[(rtype, o12)])
+        o14 = src.create_obsel("o14", otype, 14, inverse_relations=[(o10, rtype)])
+        src.create_obsel("o25", otype, 25, relations=[(rtype, o14)])
+
+        old_size = methods_utils.COPY_CHUNK_SIZE
+        methods_utils.COPY_CHUNK_SIZE = 2
+        try:
+            ctr = base.create_computed_trace("ctr/", KTBS.filter,
+                                             {"after": "10", "before": "20"},
+                                             [src],)
+            assert len(ctr.obsels) == 5
+        finally:
+            methods_utils.COPY_CHUNK_SIZE = old_size
+
+        relations = {
+            (s.rsplit("/", 1)[1], o.rsplit("/", 1)[1]) for s, _, o in
+            ctr.obsel_collection.state.triples((None, rtype.uri, None))
+        }
+        # relations with o00 and o25 are filtered out,
+        # relations within a chunk (o12, o13) or across chunks are kept
+        assert relations == {("o11", "o10"), ("o13", "o12"), ("o10", "o14")}
+        new_o14 = ctr.get_obsel(ctr.uri + "o14")
+        assert next(new_o14.iter_source_obsels()).uri == o14.uri
+
 
     def test_filter_otypes_inheritance(self):
         base = self.my_ktbs.create_base("b/")
@@ -25,9 +25,10 @@ from json import dumps, loads
 from rdflib import Literal, XSD
 
 from ktbs.engine.resource import METADATA
-from ktbs.methods.fsa import LOG as FSA_LOG
+from ktbs.methods.fsa import LOG as FSA_LOG, _uses_history
 from ktbs.namespace import KTBS, KTBS_NS_URI
 from rdfrest.exceptions import CanNotProceedError
+from rdfrest.util.query_cache import get_query_cache
 
 from .test_ktbs_engine import KtbsTestCase
 
@@ -366,6 +367,28 @@ class TestFSAAsk(KtbsTestCase):
         assert_obsel_type(ctr.obsels[0], self.otypeX)
         assert_source_obsels(ctr.obsels[0], [oD2, oD3, oD4, oA1])
 
+    def test_prepared_asks(self):
+        query_cache = get_query_cache()
+        ctr = self.base.create_computed_trace("ctr/", KTBS.fsa,
+                                         {"fsa": dumps(self.base_structure),
+                                          "model": self.model_dst.uri,},
+                                         [self.src],)
+        self.src.create_obsel("oA1", self.otypeA, 0, attributes={self.atypeV: Literal(41)})
+        self.src.create_obsel("oA2", self.otypeA, 1, attributes={self.atypeV: Literal(43)})
+        assert len(ctr.obsels) == 1
+        misses = query_cache.get_stats()["misses"]
+        self.src.create_obsel("oA3", self.otypeA, 2, attributes={self.atypeV: Literal(41)})
+        self.src.create_obsel("oA4", self.otypeA, 3, attributes={self.atypeV: Literal(43)})
+        assert len(ctr.obsels) == 2
+        assert_obsel_type(ctr.obsels[1], self.otypeY)
+        # conditions are parsed only once
+        assert query_cache.get_stats()["misses"] == misses
+        # and flagged if they depend on the token
+        assert not _uses_history('?obs m:atV 42')
+        assert _uses_history('?obs m:atV ?val. ?pred m:atV ?val')
+        assert _uses_history('?first m:atV ?valf')
+
+
 class TestFSAMaxDuration(KtbsTestCase):
 
     def setup(self):
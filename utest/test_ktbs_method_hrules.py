@@ -22,10 +22,10 @@ from unittest import skip
 import pytest
 from fsa4streams.fsa import FSA
 from json import dumps, loads
-from rdflib import Literal, XSD
+from rdflib import Literal, RDF, URIRef, XSD
 
 from ktbs.engine.resource import METADATA
-from ktbs.methods.hrules import LOG as HRULES_LOG
+from ktbs.methods.hrules import LOG as HRULES_LOG, compile_subrule
 from ktbs.namespace import KTBS, KTBS_NS_URI
 from rdfrest.exceptions import CanNotProceedError
 
@@ -381,3 +381,57 @@ class TestHRules(KtbsTestCase):
         obs = self.src.create_obsel(None, self.otypeA, 9,
                                     attributes={self.atypeU: Literal(400)})
         assert len(ctr.obsels) == 5 # no new obsel created
+
+    def test_subrules_in_cstate(self):
+        rules = [
+            {
+                'id': self.otypeX.uri,
+                'rules': [
+                    { 'type': self.otypeA.uri },
+                    {
+                        'attributes': [
+                            {
+                                'uri': self.atypeU.uri,
+                                'operator': '>=',
+                                'value': '10',
+                            },
+                        ],
+                    },
+                ],
+            },
+        ]
+        ctr = self.base.create_computed_trace("ctr/", KTBS.hrules,
+                                              {"rules": dumps(rules),
+                                               "model": self.model_dst.uri, },
+                                              [self.src], )
+        cstate = loads(ctr.metadata.value(ctr.uri, METADATA.computation_state))
+        assert cstate['custom']['subrules'] == [
+            [str(self.otypeX.uri), str(self.otypeA.uri), []],
+            [str(self.otypeX.uri), None,
+             [[str(self.atypeU.uri), '>=', '10', str(XSD.integer)]]],
+        ]
+
+
+def test_compile_subrule():
+    ex = "http://example.org/"
+    new_type, matches = compile_subrule(ex+"X", ex+"A", [
+        [ex+"u", ">", "5", str(XSD.integer)],
+        [ex+"s", "==", "foo", str(XSD.string)],
+    ])
+    assert new_type == URIRef(ex+"X")
+    values = {
+        RDF.type: [URIRef(ex+"A")],
+        URIRef(ex+"u"): [Literal(3), Literal(7.5)],
+        URIRef(ex+"s"): [Literal("foo")],
+    }
+    assert matches(values)
+    # wrong type
+    assert not matches(dict(values, **{RDF.type: [URIRef(ex+"B")]}))
+    # no value satisfying the constraint
+    assert not matches(dict(values, **{URIRef(ex+"u"): [Literal(5)]}))
+    # missing attribute
+    assert not matches({RDF.type: [URIRef(ex+"A")],
+                        URIRef(ex+"s"): [Literal("foo")]})
+    # values of incompatible types never match
+    assert not matches(dict(values, **{URIRef(ex+"u"): [Literal("7")]}))
+    assert not matches(dict(values, **{URIRef(ex+"s"): [URIRef(ex+"foo")]}))
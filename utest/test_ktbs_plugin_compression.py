@@ -0,0 +1,133 @@
+# -*- coding: utf-8 -*-
+
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+from gzip import decompress
+from webob import Request
+
+from rdfrest.http_server import HttpFrontend, TOP, \
+    register_middleware, unregister_middleware
+from ktbs.config import get_ktbs_configuration
+from ktbs.plugins import compression
+from ktbs.plugins.compression import CompressingIter, negotiate_encoding
+
+from .test_ktbs_engine import KtbsTestCase
+
+def test_negotiate_encoding():
+    assert negotiate_encoding(None) is None
+    assert negotiate_encoding("") is None
+    assert negotiate_encoding("identity") is None
+    assert negotiate_encoding("gzip") == "gzip"
+    assert negotiate_encoding("deflate, GZIP;q=0.5") == "gzip"
+    assert negotiate_encoding("gzip;q=0") is None
+    assert negotiate_encoding("*") is not None
+    assert negotiate_encoding("*, gzip;q=0") in (None, "br")
+
+def test_compressing_iter():
+    closed = []
+    class Chunks(object):
+        def __iter__(self):
+            for i in range(100):
+                yield b"chunk %d\n" % i
+        def close(self):
+            closed.append(True)
+    app_iter = CompressingIter(Chunks(), "gzip")
+    compressed = b"".join(app_iter)
+    app_iter.close()
+    assert decompress(compressed) == b"".join(Chunks())
+    assert closed
+
+
+class TestCompressionPlugin(KtbsTestCase):
+
+    def setup(self):
+        super(TestCompressionPlugin, self).setup()
+        base = self.my_ktbs.create_base("b1/")
+        model = base.create_model("m1")
+        trace = base.create_stored_trace("t1/", model, "alice")
+        otype = model.create_obsel_type("#OT")
+        for i in range(50):
+            trace.create_obsel("o%s" % i, otype, i, i)
+        self.trace = trace
+        compression.start_plugin(None)
+        self.app = HttpFrontend(self.service, get_ktbs_configuration())
+
+    def teardown(self):
+        compression.stop_plugin()
+        super(TestCompressionPlugin, self).teardown()
+
+    def get(self, uri, **headers):
+        req = Request.blank(uri, headers=headers)
+        return req.get_response(self.app)
+
+    def test_gzip(self):
+        uri = self.trace.obsel_collection.uri
+        plain = self.get(uri, accept="text/turtle")
+        assert plain.status_int == 200
+        assert plain.content_encoding is None
+        assert "accept-encoding" in plain.headers["vary"]
+
+        resp = self.get(uri, accept="text/turtle", accept_encoding="gzip")
+        assert resp.status_int == 200
+        assert resp.content_encoding == "gzip"
+        assert "accept-encoding" in resp.headers["vary"]
+        assert len(resp.body) < len(plain.body)
+        assert decompress(resp.body) == plain.body
+        assert resp.headers["etag"] == plain.headers["etag"][:-1] + '-gzip"'
+        assert resp.headers["etag"].startswith('W/"')
+
+        # conditional requests use the etag of the compressed representation
+        resp2 = self.get(uri, accept="text/turtle", accept_encoding="gzip",
+                         if_none_match=resp.headers["etag"])
+        assert resp2.status_int == 304
+        assert resp2.headers["etag"] == resp.headers["etag"]
+        resp3 = self.get(uri, accept="text/turtle",
+                         if_none_match=resp.headers["etag"])
+        assert resp3.status_int == 200
+        assert resp3.content_encoding is None
+
+    def test_small_responses_not_compressed(self):
+        resp = self.get(self.my_ktbs.uri + "unknown/", accept_encoding="gzip")
+        assert resp.status_int == 404
+        assert resp.content_encoding is None
+
+    def test_put_with_compressed_etag(self):
+        compression.MIN_SIZE = 0
+        uri = self.trace.base.uri
+        resp = self.get(uri, accept="text/turtle", accept_encoding="gzip")
+        assert resp.content_encoding == "gzip"
+        etag = resp.headers["etag"]
+        body = decompress(resp.body)
+        req = Request.blank(uri, method="PUT", body=body,
+                            headers={"content-type": "text/turtle",
+                                     "if-match": etag})
+        assert req.get_response(self.app).status_int == 200
+
+    def test_other_middleware_at_same_level(self):
+        class OtherMiddleware(object):
+            def __init__(self, app):
+                self.app = app
+            def __call__(self, environ, start_response):
+                return self.app(environ, start_response)
+        register_middleware(TOP, OtherMiddleware)
+        try:
+            resp = self.get(self.trace.obsel_collection.uri,
+                            accept_encoding="gzip")
+            assert resp.content_encoding == "gzip"
+        finally:
+            unregister_middleware(OtherMiddleware)
@@ -0,0 +1,142 @@
+# -*- coding: utf-8 -*-
+
+#    This file is part of KTBS <http://liris.cnrs.fr/sbt-dev/ktbs>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    KTBS is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    KTBS is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with KTBS.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+I test the multi-process mode of the standalone kTBS.
+"""
+from os import kill, listdir
+from os.path import exists, join
+from shutil import rmtree
+from signal import SIGINT, SIGKILL
+from socket import socket
+from tempfile import mkdtemp
+from time import sleep, time
+from urllib.error import URLError
+from urllib.request import Request, urlopen
+
+from pytest import skip
+
+import posix_ipc
+
+from ktbs.config import get_ktbs_configuration
+from ktbs.engine.lock import SHARED_LOCKS_SUPPORTED, WithLockMixin
+from ktbs.engine.lock import get_semaphore_name
+from ktbs.standalone import _fork, _wait_for, supervise_workers
+
+NEW_BASE = """@prefix : <http://liris.cnrs.fr/silex/2009/ktbs#> .
+<> :hasBase <b/> .
+<b/> a :Base .
+"""
+
+def get_free_port():
+    sock = socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return port
+
+def get_children(pid):
+    """Return the PIDs of the child processes of pid."""
+    ret = set()
+    for name in listdir("/proc"):
+        if not name.isdigit():
+            continue
+        try:
+            with open("/proc/%s/stat" % name) as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+        except IOError:
+            continue # process has terminated
+        if int(fields[1]) == pid and fields[0] != "Z":
+            ret.add(int(name))
+    return ret
+
+def wait_until(condition, timeout=20):
+    deadline = time() + timeout
+    while True:
+        ret = condition()
+        if ret or time() > deadline:
+            return ret
+        sleep(0.1)
+
+
+class TestWorkers(object):
+
+    supervisor = None
+    tmpdir = None
+
+    def setup(self):
+        if not exists("/proc") or not SHARED_LOCKS_SUPPORTED:
+            skip("requires /proc and shared locks")
+        self.tmpdir = mkdtemp()
+        self.port = port = get_free_port()
+        self.root_uri = "http://localhost:%s/" % port
+        cfg = get_ktbs_configuration()
+        cfg.set('server', 'host-name', 'localhost')
+        cfg.set('server', 'port', str(port))
+        cfg.set('server', 'force-ipv4', 'true')
+        cfg.set('server', 'workers', '2')
+        cfg.set('rdf_database', 'repository',
+                join(self.tmpdir, "ktbs.sqlite"))
+        self.supervisor = _fork(supervise_workers, cfg)
+
+    def teardown(self):
+        if self.supervisor is not None:
+            kill(self.supervisor, SIGINT)
+            _wait_for(self.supervisor)
+        if self.tmpdir is not None:
+            rmtree(self.tmpdir)
+        for uri in (self.root_uri, self.root_uri + "b/"):
+            WithLockMixin.unlink_rw_semaphores(uri)
+            try:
+                posix_ipc.unlink_semaphore(get_semaphore_name(uri))
+            except posix_ipc.ExistentialError:
+                pass
+
+    def get_status(self, data=None):
+        req = Request(self.root_uri, data)
+        if data is not None:
+            req.add_header("content-type", "text/turtle")
+        try:
+            with urlopen(req, timeout=5) as resp:
+                return resp.status
+        except URLError:
+            return None
+
+    def test_killed_worker(self):
+        assert wait_until(lambda: self.get_status() == 200)
+        workers = wait_until(lambda: len(get_children(self.supervisor)) == 2
+                                     and get_children(self.supervisor))
+        assert len(workers) == 2
+        killed = workers.pop()
+
+        # simulate a worker killed while holding the lock of the kTBS root
+        root_semaphore = posix_ipc.Semaphore(get_semaphore_name(self.root_uri))
+        root_semaphore.acquire(0)
+        root_semaphore.close()
+        kill(killed, SIGKILL)
+
+        # a new pool is started, the killed worker being replaced
+        new_workers = wait_until(
+            lambda: len(get_children(self.supervisor) - workers - {killed}) == 2
+                    and get_children(self.supervisor))
+        assert len(new_workers) == 2
+        assert killed not in new_workers
+        # the lock has been reset, so requests still succeed
+        assert wait_until(lambda: self.get_status() == 200)
+        assert self.get_status(NEW_BASE.encode("utf-8")) == 201
@@ -31,7 +31,8 @@ from .example2 import Group2Implementation, Item2Implementation, \
     make_example2_service
 from rdfrest.exceptions import SerializeError
 from rdfrest.cores.factory import unregister_service
-from rdfrest.http_server import HttpFrontend
+from rdfrest import http_server
+from rdfrest.http_server import HttpFrontend, RepresentationCache
 from rdfrest.serializers import register_serializer
 from rdfrest.util import urisplit
 from rdfrest.util.config import get_service_configuration
@@ -363,6 +364,24 @@ class TestHttpFront(object):
         resp, content = request(app, URL + "foo")
         assert resp.status_int == 403
 
+    def test_max_bytes_closes_serializer(self, app, monkeypatch):
+        app.max_bytes = 1000
+        foo = app._service.get(URIRef(URL + "foo"), [EXAMPLE.Item2])
+        with foo.edit(_trust=True) as editable:
+            editable.add((foo.uri, RDFS.label, Literal(1000*"x")))
+        closed = []
+        def serialize(graph, resource, bindings=None):
+            try:
+                for i in range(10):
+                    yield 200*b"x"
+            finally:
+                closed.append(True)
+        monkeypatch.setattr(http_server, "get_serializer_by_content_type",
+                            lambda *args: (serialize, "nt"))
+        resp, content = request(app, URL + "foo")
+        assert resp.status_int == 403
+        assert closed
+
     def test_max_bytes_put_ok(self, app):
         app.max_bytes = 1000
         self.test_put_idem(app)
@@ -476,6 +495,136 @@ class TestConfigNoCache:
         resp, _ = request(app, URL)
         assert 'cache-control' not in resp.headers
 
+class TestRepresentationCache:
+
+    def test_cache_hit(self, app):
+        cache = app.representation_cache
+        resp1, content1 = request(app, URL+"foo")
+        assert resp1.status_int == 200
+        assert cache.get_stats()["misses"] == 1
+        resp2, content2 = request(app, URL+"foo")
+        assert resp2.status_int == 200
+        assert cache.get_stats()["hits"] == 1
+        assert content2 == content1
+        assert resp2.etag == resp1.etag
+        assert resp2.content_type == resp1.content_type
+
+    def test_cache_per_content_type(self, app):
+        cache = app.representation_cache
+        resp1, content1 = request(app, URL+"foo", headers={"accept": "text/nt"})
+        resp2, content2 = request(app, URL+"foo",
+                                  headers={"accept": "text/turtle"})
+        assert cache.get_stats()["hits"] == 0
+        assert resp2.content_type != resp1.content_type
+        assert len(cache) == 2
+
+    def test_cache_invalidated_by_edit(self, app):
+        reqhead = { "accept": "text/nt" }
+        resp_get, content_get = request(app, URL+"foo", headers=reqhead)
+        graph = Graph()
+        graph.parse(data=content_get, publicID=URL+"foo", format="nt")
+        graph.set((URIRef(URL+"foo"), RDFS.label, Literal("changed label")))
+        new_content = graph.serialize(format="nt", encoding='utf-8')
+        reqhead = {
+            "if-match": resp_get.etag,
+            "content-type": "text/nt",
+            }
+        resp_put, _ = request(app, URL+"foo", "PUT", new_content, reqhead)
+        assert resp_put.status_int == 200
+        resp_get2, content_get2 = request(app, URL+"foo",
+                                          headers={ "accept": "text/nt" })
+        assert app.representation_cache.get_stats()["hits"] == 0
+        assert resp_get2.etag != resp_get.etag
+        assert b"changed label" in content_get2
+
+    def test_cache_params_not_cached(self, app):
+        # by default, parameters are not supported by the cache
+        request(app, URL+"foo?valid=a")
+        request(app, URL+"foo?valid=a")
+        assert len(app.representation_cache) == 0
+
+    def test_cache_size(self):
+        cache = RepresentationCache(40)
+        cache.put("a", [], b"0123456789")
+        cache.put("b", [], b"0123456789")
+        cache.put("c", [], b"0123456789"*2) # larger than max_entry_bytes
+        assert cache.get("c") is None
+        cache.put("c", [], b"0123456789")
+        cache.put("d", [], b"0123456789")
+        assert cache.size == 40
+        cache.put("e", [], b"0123456789")
+        assert cache.get("a") is None # evicted
+        assert cache.get("b") is not None
+        assert cache.size == 40
+
+    def test_caching_iter(self):
+        cache = RepresentationCache(40)
+        chunks = list(cache.caching_iter("a", [], iter([b"01234", b"56789"])))
+        assert chunks == [b"01234", b"56789"]
+        assert cache.get("a") == ([], b"0123456789")
+        it = cache.caching_iter("b", [], iter([b"01234", b"56789"]))
+        next(it) # incomplete iteration
+        assert cache.get("b") is None
+
+
+class TestConditionalGet:
+
+    def test_if_none_match(self, app, monkeypatch):
+        resp1, _ = request(app, URL+"foo")
+        assert resp1.status_int == 200
+        def get_state(*args, **kw):
+            assert False, "get_state should not be called"
+        monkeypatch.setattr(Item2Implementation, "get_state", get_state)
+        reqhead = { "if-none-match": resp1.headers["etag"] }
+        resp2, content2 = request(app, URL+"foo", headers=reqhead)
+        assert resp2.status_int == 304
+        assert content2 == b""
+        assert resp2.headers["etag"] == resp1.headers["etag"]
+
+    def test_if_none_match_changed(self, app):
+        reqhead = { "accept": "text/nt" }
+        resp1, content1 = request(app, URL+"foo", headers=reqhead)
+        graph = Graph()
+        graph.parse(data=content1, publicID=URL+"foo", format="nt")
+        graph.set((URIRef(URL+"foo"), RDFS.label, Literal("changed label")))
+        reqhead = {
+            "if-match": resp1.etag,
+            "content-type": "text/nt",
+            }
+        request(app, URL+"foo", "PUT",
+                graph.serialize(format="nt", encoding='utf-8'), reqhead)
+        reqhead = {
+            "accept": "text/nt",
+            "if-none-match": resp1.headers["etag"],
+            }
+        resp2, content2 = request(app, URL+"foo", headers=reqhead)
+        assert resp2.status_int == 200
+        assert b"changed label" in content2
+
+    def test_if_none_match_other_content_type(self, app):
+        resp1, _ = request(app, URL+"foo", headers={ "accept": "text/nt" })
+        reqhead = {
+            "accept": "text/turtle",
+            "if-none-match": resp1.headers["etag"],
+            }
+        resp2, _ = request(app, URL+"foo", headers=reqhead)
+        assert resp2.status_int == 200
+
+
+class TestConfigNoRepresentationCache:
+
+    CONFIG = {
+        'server': {
+            'representation-cache-size': "0"
+        }
+    }
+
+    def test_no_cache(self, app):
+        assert app.representation_cache is None
+        resp1, content1 = request(app, URL+"foo")
+        resp2, content2 = request(app, URL+"foo")
+        assert content1 == content2
+
 @register_serializer("text/errer", None, 0o1)
 def serialize_error(graph, uri, _bindings=None):
     """I always raise an exception.
@@ -79,3 +79,62 @@ class TestExample1:
         """I use the comprehensive test sequence defined in example1.py"""
         example1.do_tests(self.root)
 
+
+    def test_resource_cache(self):
+        item = self.root.create_new_simple_item("item1")
+        uri = item.uri
+        del item
+        stats = self.service.get_resource_cache_stats()
+        # the resource is kept although no one else references it
+        item = self.service.get(uri, [EXAMPLE.Item])
+        assert item is not None
+        new_stats = self.service.get_resource_cache_stats()
+        assert new_stats["hits"] == stats["hits"] + 1
+        assert new_stats["misses"] == stats["misses"]
+        # deleting the resource removes it from the cache
+        item.delete()
+        del item
+        assert uri not in self.service._resource_lru
+        assert self.service.get(uri, _no_spawn=True) is None
+
+    def test_resource_cache_external_delete(self):
+        item = self.root.create_new_simple_item("item1")
+        uri = item.uri
+        del item
+        # simulate the deletion of the resource by another process
+        self.service.get_metadata_graph(uri).remove((None, None, None))
+        assert self.service.get(uri, [EXAMPLE.Item]) is None
+        assert uri not in self.service._resource_lru
+
+
+class TestResourceCacheSize:
+
+    service = None
+
+    def setup(self):
+        service_config = get_service_configuration()
+        service_config.set('server', 'port', '11235')
+        service_config.set('server', 'base-path', '/foo')
+        service_config.set('rdf_database', 'resource-cache-size', '2')
+        self.service = make_example1_service(service_config)
+        self.root_uri = self.service.root_uri
+
+    def teardown(self):
+        if self.service is not None:
+            unregister_service(self.service)
+            del self.service
+
+    def test_eviction(self):
+        root = self.service.get(self.root_uri, [EXAMPLE.Group])
+        uris = [ root.create_new_simple_item("item%s" % i).uri
+                 for i in range(3) ]
+        del root
+        assert len(self.service._resource_lru) == 2
+        assert list(self.service._resource_lru) == uris[1:]
+        stats = self.service.get_resource_cache_stats()
+        assert stats["size"] == 2
+        assert stats["max_size"] == 2
+        misses = stats["misses"]
+        self.service.get(uris[2], [EXAMPLE.Item])
+        assert self.service.get_resource_cache_stats()["misses"] == misses
+        assert list(self.service._resource_lru)[-1] == uris[2]
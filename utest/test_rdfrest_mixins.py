@@ -26,6 +26,7 @@ from . import example2 # can not import do_tests directly, nose tries to run it.
 from .example2 import EXAMPLE, Group2Implementation, Item2Implementation, \
     make_example2_service
 from rdfrest.exceptions import InvalidDataError
+from rdfrest.cores import local
 from rdfrest.cores.factory import unregister_service
 from rdfrest.util.config import get_service_configuration
 
@@ -318,11 +319,48 @@ class TestMixins:
             else: # direction == "out"
                 graph.add((subject, prop, other))
 
+    def test_cardinality_edit(self):
+        item = self.make_test_item()
+        with assert_raises(InvalidDataError):
+            with item.edit() as editable:
+                editable.remove((None, CARD.card1_in, item.uri))
+        with assert_raises(InvalidDataError):
+            with item.edit() as editable:
+                editable.add((item.uri, CARD.card01_out, CARD.something1))
+                editable.add((item.uri, CARD.card01_out, CARD.something2))
+        with item.edit() as editable:
+            editable.add((item.uri, CARD.card01_out, CARD.something1))
+
+    def test_check_whole_graph(self):
+        item = self.make_test_item()
+        # corrupt the state, bypassing all checks
+        item._graph.remove((None, CARD.card1_in, item.uri))
+        # by default, only changes are checked
+        with item.edit() as editable:
+            editable.add((item.uri, EXAMPLE.label, Literal("foo")))
+        old_value = local.CHECK_WHOLE_GRAPH
+        local.CHECK_WHOLE_GRAPH = True
+        try:
+            with assert_raises(InvalidDataError):
+                with item.edit() as editable:
+                    editable.set((item.uri, EXAMPLE.label, Literal("bar")))
+        finally:
+            local.CHECK_WHOLE_GRAPH = old_value
+
     ################################################################
     #
     # WithTypedPropertiesMixin tests
     #
 
+    def test_typed_properties_type_removed(self):
+        item = self.make_test_item()
+        with item.edit() as editable:
+            editable.add((item.uri, TYPED.hasFoo, TYPED.other))
+            editable.add((TYPED.other, RDF.type, TYPED.Foo))
+        with assert_raises(InvalidDataError):
+            with item.edit() as editable:
+                editable.remove((TYPED.other, RDF.type, TYPED.Foo))
+
     def test_typed_properties(self):
         for typed_prop in (Item2Implementation.RDF_TYPED_PROP
                            + TstItem.RDF_TYPED_PROP):
@@ -21,6 +21,7 @@
 from rdfrest.util import add_uri_params, bounded_description, cache_result, \
     coerce_to_uri, Diagnosis, urisplit, uriunsplit, wrap_exceptions, \
     wrap_generator_exceptions
+from rdfrest.util.query_cache import QueryCache
 
 from rdflib import Graph, Namespace, URIRef
 from rdflib.compare import isomorphic
@@ -269,3 +270,40 @@ def test_wrap_generator_exceptions():
     except Exception as ex:
         assert isinstance(ex, MyException), \
             "a MyException was expected, got %s" % ex
+
+def test_wrap_generator_exceptions_close():
+    @wrap_generator_exceptions(MyException)
+    def g():
+        yield 1
+        yield 2
+
+    gen = g()
+    next(gen)
+    gen.close() # must not raise MyException
+
+def test_query_cache():
+    cache = QueryCache(2)
+    assert cache.get_stats()["hit_rate"] is None
+    q1 = cache.prepare("SELECT ?s { ?s ?p ?o }")
+    q2 = cache.prepare("SELECT ?s { ?s ns1:p ?o }", {"ns1": NS1})
+    assert cache.prepare("SELECT ?s { ?s ?p ?o }") is q1
+    assert cache.prepare("SELECT ?s { ?s ns1:p ?o }", {"ns1": NS1}) is q2
+    stats = cache.get_stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 2, 2)
+    assert stats["hit_rate"] == 0.5
+
+    # least recently used is q1
+    cache.prepare("ASK { ?s ?p ?o }")
+    assert len(cache) == 2
+    assert cache.prepare("SELECT ?s { ?s ns1:p ?o }", {"ns1": NS1}) is q2
+    assert cache.prepare("SELECT ?s { ?s ?p ?o }") is not q1
+
+    g = Graph()
+    g.add((NS1.a, NS1.p, NS2.b))
+    g.add((NS1.c, NS1.p, NS2.d))
+    results = g.query(q2, initBindings={"o": NS2.d})
+    assert [ row[0] for row in results ] == [NS1.c]
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.get_stats()["hits"] == 0
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+
+#    This file is part of RDF-REST <http://champin.net/2012/rdfrest>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    RDF-REST is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RDF-REST is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with RDF-REST.  If not, see <http://www.gnu.org/licenses/>.
+from rdfrest.util.overlay_graph import OverlayGraph
+
+from rdflib import Graph, Literal, Namespace
+
+EX = Namespace('http://localhost:1234/')
+
+class TestOverlayGraph(object):
+
+    def setup(self):
+        self.base = Graph(identifier=EX.g)
+        self.base.add((EX.x1, EX.p, EX.x2))
+        self.base.add((EX.x2, EX.p, EX.x3))
+        self.overlay = OverlayGraph(self.base)
+
+    def test_read_through(self):
+        assert set(self.overlay) == set(self.base)
+        assert len(self.overlay) == 2
+        assert (EX.x1, EX.p, EX.x2) in self.overlay
+        assert self.overlay.identifier == EX.g
+
+    def test_add_remove(self):
+        ovl = self.overlay
+        ovl.add((EX.x3, EX.p, EX.x4))
+        ovl.remove((EX.x1, None, None))
+        assert set(ovl) == {(EX.x2, EX.p, EX.x3), (EX.x3, EX.p, EX.x4)}
+        assert len(ovl) == 2
+        assert set(ovl.added) == {(EX.x3, EX.p, EX.x4)}
+        assert set(ovl.removed) == {(EX.x1, EX.p, EX.x2)}
+        # the underlying graph is unchanged
+        assert len(self.base) == 2
+        assert (EX.x1, EX.p, EX.x2) in self.base
+
+    def test_undo(self):
+        ovl = self.overlay
+        ovl.add((EX.x3, EX.p, EX.x4))
+        ovl.remove((EX.x3, EX.p, EX.x4))
+        ovl.remove((EX.x1, EX.p, EX.x2))
+        ovl.add((EX.x1, EX.p, EX.x2))
+        assert len(ovl.added) == 0
+        assert len(ovl.removed) == 0
+        assert set(ovl) == set(self.base)
+
+    def test_set(self):
+        ovl = self.overlay
+        ovl.set((EX.x1, EX.label, Literal("foo")))
+        ovl.set((EX.x1, EX.label, Literal("bar")))
+        assert ovl.value(EX.x1, EX.label) == Literal("bar")
+        assert set(ovl.added) == {(EX.x1, EX.label, Literal("bar"))}
+
+    def test_clear_and_parse(self):
+        ovl = self.overlay
+        ovl.remove((None, None, None))
+        assert len(ovl) == 0
+        ovl.parse(data="<x2> <p> <x3>. <x4> <p> <x5>.",
+                  format="n3", publicID=EX)
+        assert set(ovl.added) == {(EX.x4, EX.p, EX.x5)}
+        assert set(ovl.removed) == {(EX.x1, EX.p, EX.x2)}
+
+    def test_query(self):
+        ovl = self.overlay
+        ovl.add((EX.x3, EX.p, EX.x4))
+        ovl.remove((EX.x1, None, None))
+        result = ovl.query("SELECT ?s { ?s ?p ?o }")
+        assert { row[0] for row in result } == {EX.x2, EX.x3}
+        ovl.update("INSERT DATA { <%s> <%s> <%s> }" % (EX.x5, EX.p, EX.x6))
+        assert (EX.x5, EX.p, EX.x6) in ovl.added
+
+    def test_apply(self):
+        ovl = self.overlay
+        ovl.add((EX.x3, EX.p, EX.x4))
+        ovl.remove((EX.x1, None, None))
+        ovl.apply()
+        assert set(self.base) == {(EX.x2, EX.p, EX.x3), (EX.x3, EX.p, EX.x4)}
+        assert len(ovl.added) == 0
+        assert len(ovl.removed) == 0
+        assert set(ovl) == set(self.base)
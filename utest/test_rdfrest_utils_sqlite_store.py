@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+#    This file is part of RDF-REST <http://champin.net/2012/rdfrest>
+#    Copyright (C) 2011-2012 Pierre-Antoine Champin <pchampin@liris.cnrs.fr> /
+#    Universite de Lyon <http://www.universite-lyon.fr>
+#
+#    RDF-REST is free software: you can redistribute it and/or modify
+#    it under the terms of the GNU Lesser General Public License as published
+#    by the Free Software Foundation, either version 3 of the License, or
+#    (at your option) any later version.
+#
+#    RDF-REST is distributed in the hope that it will be useful,
+#    but WITHOUT ANY WARRANTY; without even the implied warranty of
+#    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#    GNU Lesser General Public License for more details.
+#
+#    You should have received a copy of the GNU Lesser General Public License
+#    along with RDF-REST.  If not, see <http://www.gnu.org/licenses/>.
+from os.path import join
+from shutil import rmtree
+from tempfile import mkdtemp
+
+import rdfrest # registers the SQLite store plugin
+from rdfrest.util.sqlite_store import SQLiteStore
+
+from rdflib import BNode, ConjunctiveGraph, Graph, Literal, Namespace, URIRef, XSD
+
+EX = Namespace('http://localhost:1234/')
+
+class TestSQLiteStore(object):
+
+    def setup(self):
+        self.tmpdir = mkdtemp()
+        self.filename = join(self.tmpdir, "test.sqlite")
+        self.store = SQLiteStore(self.filename)
+        self.g1 = Graph(self.store, EX.g1)
+        self.g2 = Graph(self.store, EX.g2)
+        self.g1.add((EX.x1, EX.p, EX.x2))
+        self.g1.add((EX.x2, EX.p, Literal(42)))
+        self.g2.add((EX.x1, EX.p, EX.x2))
+        self.g2.add((EX.x2, EX.label, Literal("foo", lang="en")))
+
+    def teardown(self):
+        self.store.close()
+        rmtree(self.tmpdir)
+
+    def test_plugin(self):
+        graph = ConjunctiveGraph("SQLite")
+        graph.open(self.filename)
+        assert isinstance(graph.store, SQLiteStore)
+        graph.close()
+
+    def test_triples(self):
+        assert set(self.g1) == {(EX.x1, EX.p, EX.x2),
+                                (EX.x2, EX.p, Literal(42))}
+        assert set(self.g1.objects(EX.x2, EX.p)) == {Literal(42)}
+        assert set(self.g2.subjects(EX.p, EX.x2)) == {EX.x1}
+        assert len(self.g1) == 2
+        assert len(Graph(self.store, EX.unknown)) == 0
+        assert not list(self.g1.triples((EX.unknown, None, None)))
+
+    def test_terms(self):
+        self.store.commit()
+        self.g1.add((EX.x3, EX.p, Literal("42")))
+        self.g1.add((EX.x3, EX.p, Literal("42", datatype=XSD.string)))
+        self.g1.add((EX.x3, EX.p, Literal("42", lang="fr")))
+        self.g1.add((EX.x3, EX.p, BNode("42")))
+        assert len(list(self.g1.objects(EX.x3, EX.p))) == 4
+        self.store.rollback() # also clears the term cache
+        assert len(list(self.g1.objects(EX.x3, EX.p))) == 0
+        assert self.g1.value(EX.x2, EX.p) == Literal(42)
+        assert self.g2.value(EX.x2, EX.label) == Literal("foo", lang="en")
+
+    def test_contexts(self):
+        conj = ConjunctiveGraph(self.store)
+        assert len(conj) == 3
+        assert { g.identifier for g in conj.contexts() } == {EX.g1, EX.g2}
+        assert { g.identifier for g in conj.contexts((EX.x1, EX.p, EX.x2)) } \
+            == {EX.g1, EX.g2}
+        quads = list(self.store.triples((EX.x1, None, None)))
+        assert len(quads) == 1
+        assert { g.identifier for g in quads[0][1] } == {EX.g1, EX.g2}
+
+    def test_remove(self):
+        self.g1.remove((EX.x1, None, None))
+        assert len(self.g1) == 1
+        assert (EX.x1, EX.p, EX.x2) in self.g2
+        ConjunctiveGraph(self.store).remove((None, EX.p, None))
+        assert len(self.g1) == 0
+        assert len(self.g2) == 1
+
+    def test_commit_rollback(self):
+        self.store.commit()
+        self.g1.add((EX.x3, EX.p, EX.x4))
+        self.g1.remove((EX.x1, None, None))
+        other = SQLiteStore(self.filename)
+        try:
+            # uncommited changes are not visible from other connections
+            assert len(Graph(other, EX.g1)) == 2
+            self.store.rollback()
+            assert set(self.g1) == {(EX.x1, EX.p, EX.x2),
+                                    (EX.x2, EX.p, Literal(42))}
+            self.g1.add((EX.x3, EX.p, EX.x4))
+            self.store.commit()
+            assert (EX.x3, EX.p, EX.x4) in Graph(other, EX.g1)
+        finally:
+            other.close()
+
+    def test_parse_and_query(self):
+        self.g1.parse(data='<x3> <p> [ <label> "bar" ].',
+                      format="n3", publicID=EX)
+        result = self.g1.query("SELECT ?l { ?s <%s> [ <%s> ?l ] }"
+                               % (EX.p, EX.label))
+        assert [ row[0] for row in result ] == [Literal("bar")]
+        self.g1.update("DELETE WHERE { ?s <%s> ?o }" % EX.label)
+        assert self.g1.value(None, EX.label) is None
+        assert self.g2.value(EX.x2, EX.label) is not None
+
+    def test_namespaces(self):
+        self.g1.bind("ex", EX)
+        assert self.store.namespace("ex") == URIRef(EX)
+        assert self.store.prefix(URIRef(EX)) == "ex"
+        assert ("ex", URIRef(EX)) in set(self.g2.namespaces())